@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Export study data as typed columnar files (Parquet or Arrow IPC) for analysis.
+
+Writes one file per table (sessions, iterations, likert, events) into the
+output directory, streaming from MongoDB in bounded-size batches.
+"""
+
+import argparse
+import os
+
+from services.export_service import COLUMNAR_FORMATS, COLUMNAR_TABLES, write_columnar_table
+
+def main():
+    parser = argparse.ArgumentParser(description="Export study data as Parquet/Arrow files.")
+    parser.add_argument("--out-dir", default="exports", help="Directory to write the files into")
+    parser.add_argument("--format", default="parquet", choices=list(COLUMNAR_FORMATS))
+    parser.add_argument("--tables", nargs="+", default=list(COLUMNAR_TABLES), choices=list(COLUMNAR_TABLES))
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    extension = COLUMNAR_FORMATS[args.format]["extension"]
+
+    for table in args.tables:
+        path = os.path.join(args.out_dir, f"research_{table}.{extension}")
+        rows = write_columnar_table(table, path, args.format)
+        print(f"Wrote {rows} rows to {path}")
+
+if __name__ == "__main__":
+    main()
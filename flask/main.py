@@ -12,7 +12,12 @@ from flask_pymongo import PyMongo
 from flask_cors import CORS
 from flask_login import LoginManager
 from models.admin_user import AdminUser
-from services.mongodb_service import initialize_default_prompts
+from services.mongodb_service import initialize_default_prompts, ensure_indexes, migrate_prompt_bodies
+from services.mongodb_service import db
+from services.mongo_monitor import command_monitor, monitor_enabled
+from services.export_snapshots import start_snapshot_refresher
+from services.profiling import init_profiling
+from utils.tracing import init_tracing
 
 mongo = PyMongo()
 login_manager = LoginManager()
@@ -33,16 +38,24 @@ def create_app():
 
     login_manager.init_app(app)
     login_manager.login_view = "admin.login"
+    init_tracing(app)
+    init_profiling(app)
 
     # Register Blueprints
     app.register_blueprint(letter_lab_bp, url_prefix="/lab")
     app.register_blueprint(test_bp)
     app.register_blueprint(admin_bp)
 
-    # Initialize default prompts on startup
+    # Initialize indexes and default prompts on startup
     with app.app_context():
+        ensure_indexes()
+        migrate_prompt_bodies()
         initialize_default_prompts()
 
+    if monitor_enabled():
+        command_monitor.start_explainer(db)
+    start_snapshot_refresher()
+
     return app
 
 app = create_app()
\ No newline at end of file
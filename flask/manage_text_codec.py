@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Manage the zstd dictionaries used to compress large session text fields.
+
+  train     Train a dictionary on recent sessions and texts (optionally activate it)
+  activate  Make a stored dictionary the one new values are compressed with
+  migrate   Re-compress every session and text with the active dictionary
+  stats     List stored dictionaries
+
+Set COMPRESS_SESSION_TEXT=true on the app so new writes are compressed too.
+A rotation is `train --activate` followed by `migrate`.
+"""
+
+import argparse
+
+from pymongo import UpdateOne
+
+from services.mongodb_service import collection, db, text_codec
+from services.text_codec import COMPRESSED_FIELDS, DICTIONARY_SIZE, iter_texts
+
+# Times a batch is re-read when sessions are written to while it is re-compressed
+MIGRATE_ATTEMPTS = 5
+
+def train(args):
+    samples = []
+    projection = {field: 1 for field in COMPRESSED_FIELDS}
+    for doc in collection.find({}, projection).sort("_id", -1).limit(args.sessions):
+        samples.extend(iter_texts(text_codec.decode_document(doc)))
+    for doc in db["texts"].find({}, {"content": 1}).sort("createdAt", -1).limit(args.sessions):
+        samples.append(text_codec.decode_document(doc)["content"])
+    if not samples:
+        print("No session text to train on")
+        return
+    dict_id = text_codec.train(samples, size=args.size, activate=args.activate)
+    state = "active" if args.activate else "inactive"
+    print(f"Trained dictionary {dict_id} on {len(samples)} samples ({state})")
+
+def activate(args):
+    text_codec.activate(args.dict_id)
+    print(f"Dictionary {args.dict_id} is now active")
+
+def _recompress_sessions(docs):
+    """Re-compress a batch of sessions read with COMPRESSED_FIELDS and updatedAt.
+
+    Whole subdocuments are rewritten, so each update only applies while the
+    session's updatedAt is still the one read; sessions written to in the
+    meantime are read again and retried. Returns (migrated, skipped).
+    """
+    projection = {field: 1 for field in COMPRESSED_FIELDS}
+    projection["updatedAt"] = 1
+    migrated = 0
+    for _ in range(MIGRATE_ATTEMPTS):
+        read_at = {doc["_id"]: doc.get("updatedAt") for doc in docs}
+        updates = []
+        for doc in docs:
+            content = {key: value for key, value in doc.items() if key not in ("_id", "updatedAt")}
+            fields = text_codec.encode_fields(text_codec.decode_document(content), force=True)
+            if fields:
+                # updatedAt is left alone: the content did not change
+                updates.append(UpdateOne({"_id": doc["_id"], "updatedAt": read_at[doc["_id"]]}, {"$set": fields}))
+        if not updates:
+            return migrated, 0
+        result = collection.bulk_write(updates, ordered=False)
+        migrated += result.modified_count
+        if result.matched_count == len(updates):
+            return migrated, 0
+        docs = [doc for doc in collection.find({"_id": {"$in": list(read_at)}}, projection)
+                if doc.get("updatedAt") != read_at[doc["_id"]]]
+    return migrated, len(docs)
+
+def migrate(args):
+    projection = {field: 1 for field in COMPRESSED_FIELDS}
+    projection["updatedAt"] = 1
+    migrated = 0
+    skipped = 0
+    batch = []
+    for doc in collection.find({}, projection, batch_size=args.batch_size):
+        batch.append(doc)
+        if len(batch) >= args.batch_size:
+            done, missed = _recompress_sessions(batch)
+            migrated, skipped = migrated + done, skipped + missed
+            batch = []
+    if batch:
+        done, missed = _recompress_sessions(batch)
+        migrated, skipped = migrated + done, skipped + missed
+    if skipped:
+        print(f"Skipped {skipped} sessions that kept changing; run migrate again to re-compress them")
+
+    texts = 0
+    for doc in db["texts"].find({}, {"content": 1}, batch_size=args.batch_size):
+        content = text_codec.decode_document(doc)["content"]
+        texts += db["texts"].update_one({"_id": doc["_id"]}, {"$set": {"content": text_codec.compress(content)}}).modified_count
+    print(f"Re-compressed {migrated} sessions and {texts} texts with dictionary {text_codec.active_dictionary_id()}")
+
+def stats(args):
+    for doc in text_codec.dictionaries.find({}, {"data": 0}).sort("createdAt", 1):
+        marker = " (active)" if doc.get("active") else ""
+        print(f"{doc['_id']}: {doc['size']} bytes, {doc['sampleCount']} samples, {doc['createdAt']:%Y-%m-%d %H:%M}{marker}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage session text compression dictionaries.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = subparsers.add_parser("train", help="Train a dictionary on recent sessions")
+    train_parser.add_argument("--sessions", type=int, default=1000, help="Number of recent sessions to sample")
+    train_parser.add_argument("--size", type=int, default=DICTIONARY_SIZE, help="Dictionary size in bytes")
+    train_parser.add_argument("--activate", action="store_true", help="Use the new dictionary for writes")
+    train_parser.set_defaults(func=train)
+
+    activate_parser = subparsers.add_parser("activate", help="Activate a stored dictionary")
+    activate_parser.add_argument("dict_id", type=int)
+    activate_parser.set_defaults(func=activate)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Re-compress existing sessions")
+    migrate_parser.add_argument("--batch-size", type=int, default=500)
+    migrate_parser.set_defaults(func=migrate)
+
+    stats_parser = subparsers.add_parser("stats", help="List stored dictionaries")
+    stats_parser.set_defaults(func=stats)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Move resumes and job descriptions out of session documents into the
+shared texts collection, replacing them with content-hash references.
+
+Safe to re-run: sessions that already hold references are skipped, and
+identical texts are stored once however many sessions use them.
+"""
+
+import argparse
+
+from pymongo import UpdateOne
+
+from services.mongodb_service import collection, store_text, text_codec, TEXT_REFERENCES
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicate session resumes and job descriptions.")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    inline = {"$or": [{field: {"$exists": True}} for field in TEXT_REFERENCES]}
+    projection = {field: 1 for field in TEXT_REFERENCES}
+
+    updates = []
+    migrated = 0
+    inline_bytes = 0
+    stored = set()
+    for doc in collection.find(inline, projection, batch_size=args.batch_size):
+        text_codec.decode_document(doc)
+        references = {}
+        for field, ref in TEXT_REFERENCES.items():
+            if isinstance(doc.get(field), str):
+                inline_bytes += len(doc[field].encode("utf-8"))
+                references[ref] = store_text(doc[field])
+                stored.add(references[ref])
+        if not references:
+            continue
+        # updatedAt is left alone: the content did not change
+        updates.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": references, "$unset": {field: "" for field in TEXT_REFERENCES}}
+        ))
+        if len(updates) >= args.batch_size:
+            migrated += collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        migrated += collection.bulk_write(updates, ordered=False).modified_count
+
+    print(f"Moved texts out of {migrated} sessions: {inline_bytes} inline bytes now {len(stored)} unique texts")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Refresh the materialized export snapshots served by /api/admin/sessions/export/snapshot.
+
+Run it with --loop as its own service (see docker-compose.yml) so refresh
+work never runs in the web workers, or once from cron. It must share
+EXPORT_SNAPSHOT_DIR with the app, which asks it for early refreshes by
+leaving a marker file there.
+"""
+
+import argparse
+
+from services.export_snapshots import refresh_snapshots, run_refresher, snapshot_dir
+
+# Default seconds between refreshes with --loop
+DEFAULT_INTERVAL = 60
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the on-disk research export snapshots.")
+    parser.add_argument("--full", action="store_true", help="Rebuild every row instead of only changed sessions")
+    parser.add_argument("--loop", action="store_true",
+                        help="Keep refreshing every --interval seconds, and whenever the app asks for it")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL)
+    args = parser.parse_args()
+
+    if args.loop:
+        run_refresher(args.interval, full=args.full)
+
+    status = refresh_snapshots(full=args.full)
+    if status is None:
+        print(f"Another refresh holds the lock in {snapshot_dir()}")
+    else:
+        print(f"{status['sessions']} sessions, {status['lastRefresh']['changed']} changed, "
+              f"watermark {status['watermark']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,70 @@
 import csv
 import io
-import zipfile
+import json
+import os
+import queue
+import time
 import requests
-import random
+import secrets
 import string
-from flask import make_response
+import tempfile
+from datetime import datetime, timezone
+from flask import send_file, Response
 from flask import Blueprint, request, jsonify
 from flask_login import login_user, logout_user, login_required
+from werkzeug.utils import secure_filename
+from bson.objectid import ObjectId
 
 from models.admin_user import AdminUser
 
 from services.mongodb_service import get_all_sessions
-from services.mongodb_service import create_token
+from services.mongodb_service import create_unique_token, create_tokens
 from services.mongodb_service import collection
 from services.mongodb_service import get_all_progress_events
-from services.mongodb_service import get_all_tokens
-from services.mongodb_service import invalidate_token
+from services.mongodb_service import token_filter, list_tokens, count_tokens_by_status
+from services.mongodb_service import invalidate_token, invalidate_tokens
 from services.mongodb_service import get_all_prompts, get_prompt_history, update_prompt, create_prompt, revert_prompt
+from services.mongodb_service import get_prompt_version
+from services.mongodb_service import get_progress_log_version, get_tokens_version
+from services.mongodb_service import get_prompts_version, get_prompt_history_version
 
-from services.openai_service import llmchat
+from services.export_service import COLUMNAR_FORMATS, COLUMNAR_TABLES, write_columnar_table
+from services.export_service import export_changes_since, format_watermark, parse_watermark
+from services.export_service import stream_bundle, to_json_safe
+from services.export_service import iter_plan_rows, stream_csv, stream_ndjson, wide_iteration_keys, wide_session_plan
+from services.export_service import LONG_ITERATION_PLAN, long_iteration_rows
+from services.export_snapshots import SNAPSHOT_FILES, request_refresh, snapshot_path, snapshot_status
+
+from services.prompt_templates import PromptTemplateError
+
+from services.change_feed import change_feed
+
+from services.openai_service import openai_breaker
 from services.openai_service import check_openai_health
+from services.llm_scheduler import llm_scheduler
+from services.mongo_monitor import command_monitor
+
+from services.profiling import get_profiling_settings, update_profiling_settings
+from services.profiling import list_profiles, get_profile, get_profile_stats, delete_profiles
+from services.profiling import DEFAULT_DURATION_MINUTES, DEFAULT_TOP_N
+
+from utils.http_cache import conditional_get
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
 
+# Upper bound on tokens generated by a single bulk request
+MAX_BULK_TOKENS = 1000
+
+# Page size of the token listing when no limit is given, and its upper bound
+DEFAULT_TOKEN_PAGE_SIZE = 50
+MAX_TOKEN_PAGE_SIZE = 500
+
+# Dashboard event stream: comment sent when idle so proxies keep the
+# connection open, and how long one stream lasts before the browser's
+# EventSource reconnects (releasing the worker thread in between)
+SSE_HEARTBEAT_INTERVAL = 15
+SSE_MAX_DURATION = 300
+
 @admin_bp.route("/login", methods=["POST"])
 def login():
     print("🔐 Admin login endpoint called")
@@ -48,138 +90,259 @@ def logout():
 @admin_bp.route("/sessions/export", methods=["GET"])
 @login_required
 def export_sessions_csv():
-    # Get raw sessions directly from MongoDB (not flattened)
-    from services.mongodb_service import collection
-    
+    """Export the research data as CSV or NDJSON.
+
+    layout=wide (default) gives one row per session; layout=long gives one
+    row per session, bullet and iteration, reshaped by an aggregation.
+    """
+    fmt = request.args.get("format", "csv")
+    layout = request.args.get("layout", "wide")
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "Unknown format. Expected one of: csv, ndjson"}), 400
+    if layout not in ("wide", "long"):
+        return jsonify({"error": "Unknown layout. Expected one of: wide, long"}), 400
+
     try:
-        sessions = list(collection.find())
-        if not sessions:
+        if collection.find_one({}, {"_id": 1}) is None:
             return jsonify({"error": "No sessions found"}), 404
-        
-        # Add document_id and timestamp to each session
-        for s in sessions:
-            s["document_id"] = str(s["_id"])
-            s["timestamp"] = s["_id"].generation_time.isoformat()
-            del s["_id"]
+
+        if layout == "long":
+            plan = LONG_ITERATION_PLAN
+            rows = long_iteration_rows()
+        else:
+            # The bullet iteration columns depend on the data, so the plan is
+            # compiled per export from the distinct keys Mongo reports
+            plan = wide_session_plan(wide_iteration_keys())
+            rows = iter_plan_rows("sessions", plan)
     except Exception as e:
         return jsonify({"error": f"Database error: {str(e)}"}), 500
 
-    # Create single wide format CSV with raw data only
-    csv_data = []
-    
-    for session in sessions:
-        session_id = session.get("document_id")
-        
-        # Start with basic session data
-        row = {
-            "session_id": session_id,
-            "timestamp": session.get("timestamp"),
-            "resume": session.get("resume"),
-            "job_desc": session.get("job_desc"),
-            "completed": session.get("completed", False),
-        }
-        
-        # Control profile data (v1.5 structure)
-        control_profile = session.get("controlProfile", {})
-        row["control_profile_text"] = control_profile.get("text")
-        
-        # Control profile Likert responses (1-7 scale)
-        control_likert = control_profile.get("likertResponses", {})
-        row["control_likert_accuracy"] = control_likert.get("accuracy")
-        row["control_likert_control"] = control_likert.get("control")
-        row["control_likert_expression"] = control_likert.get("expression")
-        row["control_likert_alignment"] = control_likert.get("alignment")
-        
-        # Control profile open-ended responses
-        control_open = control_profile.get("openResponses", {})
-        row["control_response_likes"] = control_open.get("likes")
-        row["control_response_dislikes"] = control_open.get("dislikes")
-        row["control_response_changes"] = control_open.get("changes")
-        
-        # Aligned profile data (v1.5 structure)
-        aligned_profile = session.get("alignedProfile", {})
-        row["aligned_profile_text"] = aligned_profile.get("text")
-        
-        # Aligned profile Likert responses (1-7 scale)
-        aligned_likert = aligned_profile.get("likertResponses", {})
-        row["aligned_likert_accuracy"] = aligned_likert.get("accuracy")
-        row["aligned_likert_control"] = aligned_likert.get("control")
-        row["aligned_likert_expression"] = aligned_likert.get("expression")
-        row["aligned_likert_alignment"] = aligned_likert.get("alignment")
-        
-        # Aligned profile open-ended responses
-        aligned_open = aligned_profile.get("openResponses", {})
-        row["aligned_response_likes"] = aligned_open.get("likes")
-        row["aligned_response_dislikes"] = aligned_open.get("dislikes")
-        row["aligned_response_changes"] = aligned_open.get("changes")
-        
-        # Bullet iterations - extract ALL iterations for each bullet using 1.1, 1.2, 1.3 format
-        bullet_iterations = session.get("bulletIterations", [])
-        
-        # Collect all iterations across all bullets to determine max iterations needed
-        all_iterations = []
-        for bullet in bullet_iterations:
-            bullet_idx = bullet.get("bulletIndex", 0)
-            iterations = bullet.get("iterations", [])
-            for iteration in iterations:
-                iteration_num = iteration.get("iterationNumber", 1)
-                all_iterations.append({
-                    "bullet_num": bullet_idx + 1,  # Convert to 1-based indexing
-                    "iteration_num": iteration_num,
-                    "key": f"bullet_{bullet_idx + 1}_{iteration_num}",
-                    "data": iteration
-                })
-        
-        # Add all iterations to the row
-        for iteration_data in all_iterations:
-            key = iteration_data["key"]
-            data = iteration_data["data"]
-            
-            row[f"{key}_text"] = data.get("bulletText")
-            row[f"{key}_rationale"] = data.get("rationale")
-            row[f"{key}_rating"] = data.get("userRating")
-            row[f"{key}_feedback"] = data.get("userFeedback")
-        
-        csv_data.append(row)
-    
-    # Create CSV content
-    csv_buffer = io.StringIO()
-    
-    # Collect all possible fieldnames from all rows (since iterations are dynamic)
-    all_fieldnames = set()
-    for row in csv_data:
-        all_fieldnames.update(row.keys())
-    
-    # Define base fieldnames in order
-    base_fieldnames = [
-        "session_id", "timestamp", "resume", "job_desc", "completed",
-        "control_profile_text", 
-        "control_likert_accuracy", "control_likert_control", "control_likert_expression", "control_likert_alignment",
-        "control_response_likes", "control_response_dislikes", "control_response_changes",
-        "aligned_profile_text",
-        "aligned_likert_accuracy", "aligned_likert_control", "aligned_likert_expression", "aligned_likert_alignment", 
-        "aligned_response_likes", "aligned_response_dislikes", "aligned_response_changes"
-    ]
-    
-    # Add bullet iteration fieldnames in sorted order
-    bullet_fieldnames = sorted([f for f in all_fieldnames if f.startswith("bullet_")])
-    
-    # Combine all fieldnames
-    fieldnames = base_fieldnames + bullet_fieldnames
-    
-    writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames, extrasaction="ignore", 
-                            quoting=csv.QUOTE_ALL, lineterminator='\n')
-    writer.writeheader()
-    writer.writerows(csv_data)
-    
-    # Return as CSV file
-    output = make_response(csv_buffer.getvalue())
-    output.headers["Content-Disposition"] = "attachment; filename=research_data.csv"
-    output.headers["Content-Type"] = "text/csv"
+    filename = "research_data" if layout == "wide" else "research_iterations"
+
+    if fmt == "ndjson":
+        output = Response(stream_ndjson(plan, rows), mimetype="application/x-ndjson")
+        output.headers["Content-Disposition"] = f"attachment; filename={filename}.ndjson"
+        return output
+
+    output = Response(stream_csv(plan, rows), mimetype="text/csv")
+    output.headers["Content-Disposition"] = f"attachment; filename={filename}.csv"
     return output
 
+@admin_bp.route("/sessions/export/snapshot", methods=["GET"])
+@login_required
+def export_snapshot():
+    """Serve the materialized CSV export (layout=wide or long) from disk.
+
+    Supports conditional and Range requests. Before the first refresh has
+    finished, asks the refresher process for one and returns 503.
+    """
+    layout = request.args.get("layout", "wide")
+    if layout not in SNAPSHOT_FILES:
+        return jsonify({"error": f"Unknown layout. Expected one of: {', '.join(SNAPSHOT_FILES)}"}), 400
+
+    status = snapshot_status()
+    if status is None or not os.path.exists(snapshot_path(layout)):
+        request_refresh()
+        response = jsonify({"error": "Export snapshot is being built. Please try again shortly."})
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    response = send_file(
+        snapshot_path(layout),
+        mimetype="text/csv",
+        as_attachment=True,
+        download_name=SNAPSHOT_FILES[layout],
+        etag=status["files"][layout]["etag"],
+        conditional=True,
+        max_age=0,
+    )
+    response.headers["X-Snapshot-Watermark"] = status["watermark"]
+    return response
+
+@admin_bp.route("/sessions/export/snapshot/status", methods=["GET"])
+@login_required
+def export_snapshot_status():
+    """When the snapshots were last refreshed and what they contain."""
+    return jsonify({"status": snapshot_status()}), 200
+
+@admin_bp.route("/sessions/export/snapshot/refresh", methods=["POST"])
+@login_required
+def refresh_export_snapshot():
+    """Ask the refresher process to refresh now rather than at its next interval."""
+    request_refresh()
+    return jsonify({"status": "refresh_requested"}), 202
+
+@admin_bp.route("/sessions/export/columnar/<table>", methods=["GET"])
+@login_required
+def export_columnar(table):
+    """Export one study table (sessions, iterations, likert, events) as Parquet or Arrow IPC."""
+    fmt = request.args.get("format", "parquet")
+    if table not in COLUMNAR_TABLES:
+        return jsonify({"error": f"Unknown table. Expected one of: {', '.join(COLUMNAR_TABLES)}"}), 400
+    if fmt not in COLUMNAR_FORMATS:
+        return jsonify({"error": f"Unknown format. Expected one of: {', '.join(COLUMNAR_FORMATS)}"}), 400
+
+    # Spool to a temp file rather than memory; send_file closes it when done
+    spool = tempfile.TemporaryFile()
+    try:
+        write_columnar_table(table, spool, fmt)
+    except Exception as e:
+        spool.close()
+        print(f"Columnar export of {table} failed:", e)
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
+    spool.seek(0)
+
+    return send_file(
+        spool,
+        mimetype=COLUMNAR_FORMATS[fmt]["mimetype"],
+        as_attachment=True,
+        download_name=f"research_{table}.{COLUMNAR_FORMATS[fmt]['extension']}",
+    )
+
 
+@admin_bp.route("/sessions/export/incremental", methods=["GET"])
+@login_required
+def export_incremental():
+    """Export sessions and progress events changed since the `since` watermark."""
+    try:
+        since = parse_watermark(request.args.get("since"))
+    except ValueError:
+        return jsonify({"error": "since must be an ISO 8601 timestamp or an ObjectId"}), 400
+
+    try:
+        changes = export_changes_since(since)
+    except Exception as e:
+        print("Incremental export failed:", e)
+        return jsonify({"error": f"Database error: {str(e)}"}), 500
 
+    return jsonify(changes), 200
+
+
+@admin_bp.route("/export/bundle", methods=["GET"])
+@login_required
+def export_bundle():
+    """Stream a ZIP snapshot of all study collections, one NDJSON file each."""
+    filename = f"study_snapshot_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.zip"
+    return Response(
+        stream_bundle(),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@admin_bp.route("/llm-scheduler", methods=["GET"])
+@login_required
+def llm_scheduler_stats():
+    """Queue depth and wait times in this worker, and the shared OpenAI budget for this minute."""
+    try:
+        return jsonify(llm_scheduler.snapshot()), 200
+    except Exception as e:
+        print("Error fetching LLM scheduler stats:", e)
+        return jsonify({"error": "Failed to fetch LLM scheduler stats"}), 500
+
+@admin_bp.route("/mongo-stats", methods=["GET"])
+@login_required
+def mongo_stats():
+    """Mongo command timings in this worker by collection and query shape, slowest first.
+
+    Pass explain=true to explain the top offenders now instead of waiting
+    for the periodic check.
+    """
+    try:
+        explain = _parse_bool_arg("explain")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        if explain:
+            command_monitor.explain_top()
+        limit = min(request.args.get("limit", default=50, type=int), 500)
+        return jsonify(to_json_safe(command_monitor.summary(limit))), 200
+    except Exception as e:
+        print("Error fetching Mongo stats:", e)
+        return jsonify({"error": "Failed to fetch Mongo stats"}), 500
+
+@admin_bp.route("/mongo-stats", methods=["DELETE"])
+@login_required
+def reset_mongo_stats():
+    command_monitor.reset()
+    return jsonify({"message": "Mongo stats reset"}), 200
+
+@admin_bp.route("/profiling", methods=["GET"])
+@login_required
+def get_profiling():
+    """Profiling settings and the most recent request profiles (without their function tables)."""
+    try:
+        limit = min(request.args.get("limit", default=50, type=int), 500)
+        return jsonify({
+            "settings": to_json_safe(get_profiling_settings()),
+            "profiles": to_json_safe(list_profiles(limit)),
+        }), 200
+    except Exception as e:
+        print("Error fetching profiles:", e)
+        return jsonify({"error": "Failed to fetch profiles"}), 500
+
+@admin_bp.route("/profiling", methods=["PUT"])
+@login_required
+def update_profiling():
+    """Turn request profiling on or off.
+
+    Body: enabled, and optionally sampleRate (0-1], endpoint (Flask endpoint
+    name or path prefix), topN and durationMinutes after which profiling
+    switches itself off.
+    """
+    data = request.get_json() or {}
+    if "enabled" not in data:
+        return jsonify({"error": "enabled is required"}), 400
+    try:
+        settings = update_profiling_settings(
+            data["enabled"],
+            sample_rate=float(data.get("sampleRate", 1.0)),
+            endpoint=data.get("endpoint"),
+            top_n=int(data.get("topN", DEFAULT_TOP_N)),
+            duration_minutes=float(data.get("durationMinutes", DEFAULT_DURATION_MINUTES)),
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("Error updating profiling settings:", e)
+        return jsonify({"error": "Failed to update profiling settings"}), 500
+    return jsonify({"settings": to_json_safe(settings)}), 200
+
+@admin_bp.route("/profiling", methods=["DELETE"])
+@login_required
+def delete_profiles_endpoint():
+    try:
+        return jsonify({"deleted": delete_profiles()}), 200
+    except Exception as e:
+        print("Error deleting profiles:", e)
+        return jsonify({"error": "Failed to delete profiles"}), 500
+
+@admin_bp.route("/profiling/<profile_id>", methods=["GET"])
+@login_required
+def get_profile_endpoint(profile_id):
+    """A request profile with its top functions by cumulative time."""
+    if not ObjectId.is_valid(profile_id):
+        return jsonify({"error": "Invalid profile ID"}), 400
+    profile = get_profile(ObjectId(profile_id))
+    if not profile:
+        return jsonify({"error": "Profile not found"}), 404
+    return jsonify({"profile": to_json_safe(profile)}), 200
+
+@admin_bp.route("/profiling/<profile_id>/download", methods=["GET"])
+@login_required
+def download_profile(profile_id):
+    """The full profile as a pstats file (open with pstats or snakeviz)."""
+    if not ObjectId.is_valid(profile_id):
+        return jsonify({"error": "Invalid profile ID"}), 400
+    data = get_profile_stats(ObjectId(profile_id))
+    if data is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(
+        io.BytesIO(data),
+        mimetype="application/octet-stream",
+        as_attachment=True,
+        download_name=f"profile_{profile_id}.prof",
+    )
 
 @admin_bp.route("/health", methods=["GET"])
 @login_required
@@ -198,14 +361,28 @@ def health_check():
         print("MongoDB health check failed:", e)
         health["database"] = "error"
 
+    # Generation circuit breaker; while open, skip the ping rather than wait on it
+    circuit = openai_breaker.snapshot()
+    if circuit["state"] == "closed":
+        health["openai_circuit"] = "ok"
+    else:
+        health["openai_circuit"] = (
+            f"{circuit['state']} (retry in {circuit['retryAfter']}s)" if circuit["retryAfter"] else circuit["state"]
+        )
+
     # Azure OpenAI
+    if circuit["state"] == "open":
+        health["openai"] = "error"
+    else:
+        # Lowest priority in the scheduler: waits behind participant generation
+        health["openai"] = check_openai_health()
+
     try:
-        response = llmchat.invoke("ping")
-        if not response.content.strip():
-            health["openai"] = "error"
+        queue_depth = llm_scheduler.snapshot()["queueDepth"]
+        health["openai_queue"] = f"{queue_depth} waiting" if queue_depth else "ok"
     except Exception as e:
-        print("Azure OpenAI health check failed:", e)
-        health["openai"] = "error"
+        print("LLM scheduler health check failed:", e)
+        health["openai_queue"] = "error"
 
     # Frontend - check based on environment
     try:
@@ -227,21 +404,58 @@ def health_check():
     return jsonify(health), 200
 
 def generate_token():
-    letters = ''.join(random.choices(string.ascii_lowercase, k=3))
-    digits = ''.join(random.choices(string.digits, k=3))
+    letters = ''.join(secrets.choice(string.ascii_lowercase) for _ in range(3))
+    digits = ''.join(secrets.choice(string.digits) for _ in range(3))
     return letters + digits
 
 @admin_bp.route("/tokens/create", methods=["POST"])
 @login_required
 def create_token_endpoint():
-    token = generate_token()
+    token = create_unique_token(generate_token)
     if not token:
-        return jsonify({"error": "Invalid token"}), 400
-    create_token(token)
+        return jsonify({"error": "Could not generate a unique token"}), 500
     return jsonify({"status": "created", "token": token})
 
+@admin_bp.route("/tokens/bulk-create", methods=["POST"])
+@login_required
+def bulk_create_tokens_endpoint():
+    """Create a batch of unique tokens, optionally tagged with a cohort, returned as CSV."""
+    data = request.get_json() or {}
+    count = data.get("count")
+    cohort = data.get("cohort")
+
+    if not isinstance(count, int) or isinstance(count, bool) or count < 1 or count > MAX_BULK_TOKENS:
+        return jsonify({"error": f"count must be an integer between 1 and {MAX_BULK_TOKENS}"}), 400
+    if cohort is not None and (not isinstance(cohort, str) or not cohort.strip()):
+        return jsonify({"error": "cohort must be a non-empty string"}), 400
+    if cohort is not None and not cohort.isprintable():
+        return jsonify({"error": "cohort must not contain control characters"}), 400
+
+    try:
+        created = create_tokens(count, generate_token, cohort=cohort.strip() if cohort else None)
+    except Exception as e:
+        print("Error bulk creating tokens:", e)
+        return jsonify({"error": "Failed to create tokens"}), 500
+
+    if len(created) < count:
+        print(f"Bulk token creation only produced {len(created)} of {count} tokens")
+
+    csv_buffer = io.StringIO()
+    writer = csv.writer(csv_buffer, lineterminator="\n")
+    writer.writerow(["token", "cohort", "created_at"])
+    for doc in created:
+        writer.writerow([doc["token"], doc.get("cohort", ""), doc["created_at"].isoformat()])
+
+    # The cohort is free text; only a filename-safe form goes in the header
+    filename_cohort = secure_filename(cohort.strip()) if cohort else ""
+    output = Response(csv_buffer.getvalue(), mimetype="text/csv")
+    output.headers["Content-Disposition"] = f"attachment; filename=tokens_{filename_cohort or 'batch'}.csv"
+    output.headers["X-Tokens-Created"] = str(len(created))
+    return output
+
 @admin_bp.route("/progress-log", methods=["GET"])
 @login_required
+@conditional_get(get_progress_log_version)
 def get_progress_log():
     try:
         events = get_all_progress_events()
@@ -251,12 +465,86 @@ def get_progress_log():
         print("Error fetching progress log:", e)
         return jsonify({"error": "Failed to fetch progress log"}), 500
 
+@admin_bp.route("/events/stream", methods=["GET"])
+@login_required
+def event_stream():
+    """Server-sent events for new progress events, session changes and token changes."""
+    subscriber = change_feed.subscribe()
+
+    def generate():
+        try:
+            yield "retry: 5000\n\n"
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=SSE_HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+                yield f"event: {event['collection']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            change_feed.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+def _parse_bool_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    if value.lower() in ("true", "1", "yes"):
+        return True
+    if value.lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+def _parse_token_cursor(raw):
+    created_at, _, token_id = raw.partition("_")
+    if not ObjectId.is_valid(token_id):
+        raise ValueError("Invalid cursor")
+    return parse_watermark(created_at), ObjectId(token_id)
+
 @admin_bp.route("/tokens", methods=["GET"])
 @login_required
+@conditional_get(get_tokens_version)
 def get_tokens():
+    """List tokens newest first with optional filters and keyset pagination.
+
+    Query parameters: status (used/unused), created_from, created_to,
+    has_session, prefix, cohort, limit (default DEFAULT_TOKEN_PAGE_SIZE, at
+    most MAX_TOKEN_PAGE_SIZE) and cursor (from next_cursor).
+    """
     try:
-        tokens = get_all_tokens()
-        return jsonify({"tokens": tokens}), 200
+        status = request.args.get("status")
+        if status not in (None, "used", "unused"):
+            raise ValueError("status must be used or unused")
+        limit = request.args.get("limit", DEFAULT_TOKEN_PAGE_SIZE, type=int)
+        if not 1 <= limit <= MAX_TOKEN_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_TOKEN_PAGE_SIZE}")
+        cursor = request.args.get("cursor")
+        after = _parse_token_cursor(cursor) if cursor else None
+
+        filters = {
+            "created_from": parse_watermark(request.args.get("created_from")),
+            "created_to": parse_watermark(request.args.get("created_to")),
+            "has_session": _parse_bool_arg("has_session"),
+            "prefix": request.args.get("prefix"),
+            "cohort": request.args.get("cohort"),
+        }
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        tokens, next_key = list_tokens(token_filter(status=status, **filters), limit=limit, after=after)
+        # Counts ignore the status filter so every status tab can show its total
+        counts = count_tokens_by_status(token_filter(**filters))
+
+        next_cursor = None
+        if next_key:
+            next_cursor = f"{format_watermark(next_key[0])}_{next_key[1]}"
+        return jsonify({"tokens": tokens, "next_cursor": next_cursor, "counts": counts}), 200
     except Exception as e:
         print("Error fetching tokens:", e)
         return jsonify({"error": "Failed to fetch tokens"}), 500
@@ -279,10 +567,34 @@ def invalidate_token_endpoint():
         print("Error invalidating token:", e)
         return jsonify({"error": "Failed to invalidate token"}), 500
 
+@admin_bp.route("/tokens/bulk-invalidate", methods=["POST"])
+@login_required
+def bulk_invalidate_tokens_endpoint():
+    """Invalidate many tokens at once, given a list of tokens and/or a cohort tag."""
+    try:
+        data = request.get_json() or {}
+        tokens = data.get("tokens")
+        cohort = data.get("cohort")
+
+        if tokens is not None and (not isinstance(tokens, list) or not all(isinstance(t, str) for t in tokens)):
+            return jsonify({"error": "tokens must be a list of strings"}), 400
+        # Anything but a string (e.g. {"$ne": null}) would be read as a query operator
+        if cohort is not None and (not isinstance(cohort, str) or not cohort.strip()):
+            return jsonify({"error": "cohort must be a non-empty string"}), 400
+        if not tokens and not cohort:
+            return jsonify({"error": "tokens or cohort required"}), 400
+
+        count = invalidate_tokens(tokens=tokens, cohort=cohort.strip() if cohort else None)
+        return jsonify({"status": "invalidated", "count": count}), 200
+    except Exception as e:
+        print("Error bulk invalidating tokens:", e)
+        return jsonify({"error": "Failed to invalidate tokens"}), 500
+
 # Prompt Management Endpoints
 
 @admin_bp.route("/prompts", methods=["GET"])
 @login_required
+@conditional_get(get_prompts_version)
 def get_prompts():
     """Get all prompts with version history."""
     try:
@@ -294,6 +606,7 @@ def get_prompts():
 
 @admin_bp.route("/prompts/<prompt_type>/history", methods=["GET"])
 @login_required
+@conditional_get(get_prompt_history_version)
 def get_prompt_history_endpoint(prompt_type):
     """Get version history for a specific prompt type."""
     try:
@@ -303,10 +616,19 @@ def get_prompt_history_endpoint(prompt_type):
         print(f"Error fetching prompt history for {prompt_type}:", e)
         return jsonify({"error": "Failed to fetch prompt history"}), 500
 
+@admin_bp.route("/prompts/<prompt_type>/versions/<int:version>", methods=["GET"])
+@login_required
+def get_prompt_version_endpoint(prompt_type, version):
+    """Get a single prompt version including its content."""
+    prompt = get_prompt_version(prompt_type, version)
+    if not prompt:
+        return jsonify({"error": "Prompt version not found"}), 404
+    return jsonify({"prompt": prompt}), 200
+
 @admin_bp.route("/prompts/<prompt_type>", methods=["PUT"])
 @login_required
 def update_prompt_endpoint(prompt_type):
-    """Update a prompt with new content."""
+    """Update a prompt with new content and, optionally, new model settings."""
     try:
         data = request.get_json()
         content = data.get("content")
@@ -314,13 +636,15 @@ def update_prompt_endpoint(prompt_type):
         if not content:
             return jsonify({"error": "Prompt content required"}), 400
         
-        result = update_prompt(prompt_type, content, modified_by="admin")
+        result = update_prompt(prompt_type, content, modified_by="admin", settings=data.get("settings"))
         
         if result:
             return jsonify({"status": "updated", "prompt_type": prompt_type}), 200
         else:
             return jsonify({"error": "Failed to update prompt"}), 500
             
+    except PromptTemplateError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error updating prompt {prompt_type}:", e)
         return jsonify({"error": "Failed to update prompt"}), 500
@@ -337,13 +661,15 @@ def create_prompt_endpoint():
         if not prompt_type or not content:
             return jsonify({"error": "prompt_type and content required"}), 400
         
-        result = create_prompt(prompt_type, content, modified_by="admin")
+        result = create_prompt(prompt_type, content, modified_by="admin", settings=data.get("settings"))
         
         if result:
             return jsonify({"status": "created", "prompt_type": prompt_type}), 201
         else:
             return jsonify({"error": "Failed to create prompt"}), 500
             
+    except PromptTemplateError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print("Error creating prompt:", e)
         return jsonify({"error": "Failed to create prompt"}), 500
@@ -366,6 +692,8 @@ def revert_prompt_endpoint(prompt_type):
         else:
             return jsonify({"error": "Failed to revert prompt"}), 500
             
+    except PromptTemplateError as e:
+        return jsonify({"error": f"Version {target_version} cannot be activated: {e}"}), 400
     except Exception as e:
         print(f"Error reverting prompt {prompt_type}:", e)
         return jsonify({"error": "Failed to revert prompt"}), 500
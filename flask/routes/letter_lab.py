@@ -18,12 +18,25 @@ from services.mongodb_service import is_valid_token, mark_token_used
 from services.mongodb_service import log_progress_event
 
 # UTILITIES
-from utils.generation_helpers import retry_generation
+from utils.generation_helpers import retry_generation, build_feedback_digest, split_bullet_history
+from utils.generation_helpers import merge_iteration, pending_iteration, session_state
 from utils.validation import is_valid_string_output
-from utils.auth_decorators import token_required
+from utils.auth_decorators import token_required, session_owner_required
+from utils.rate_limit import rate_limited
+from utils.circuit_breaker import CircuitOpenError
+from services.llm_scheduler import QueueTimeoutError
 
 letter_lab_bp = Blueprint("letter_lab_bp", __name__)
 
+def generation_unavailable(error):
+    """503 response for a generation refused by the circuit breaker or the OpenAI budget."""
+    response = jsonify({
+        "error": "Text generation is temporarily unavailable. Please try again shortly.",
+        "retry_after": error.retry_after
+    })
+    response.headers["Retry-After"] = str(error.retry_after)
+    return response, 503
+
 @letter_lab_bp.route("/validate-token", methods=["POST"])
 def validate_token():
     data = request.get_json()
@@ -45,8 +58,44 @@ def logout_participant():
     session.pop("token", None)
     return jsonify({"status": "logged_out"}), 200
 
+@letter_lab_bp.route("/session/<session_id>", methods=["GET"])
+@token_required
+@session_owner_required
+def get_session_state_endpoint(session_id):
+    """Current state of a session, so a reloaded page can resume without calling generation."""
+    try:
+        if not ObjectId.is_valid(session_id):
+            return jsonify({"error": "Invalid session_id format"}), 400
+
+        # Only what the participant views show; generation settings, the
+        # feedback digest and the inputs stay in the database
+        session_doc = get_session(session_id, {
+            "completed": 1,
+            "controlProfile.text": 1,
+            "controlProfile.likertResponses": 1,
+            "alignedProfile.text": 1,
+            "alignedProfile.likertResponses": 1,
+            "bulletIterations.bulletIndex": 1,
+            "bulletIterations.finalIteration": 1,
+            "bulletIterations.iterations.iterationNumber": 1,
+            "bulletIterations.iterations.bulletText": 1,
+            "bulletIterations.iterations.rationale": 1,
+            "bulletIterations.iterations.userRating": 1,
+            "bulletIterations.iterations.userFeedback": 1,
+        })
+        if not session_doc:
+            return jsonify({"error": "Session not found"}), 404
+
+        return jsonify({"success": True, "session_id": session_id, **session_state(session_doc)}), 200
+
+    except Exception as e:
+        print("Error fetching session state:", str(e))
+        return jsonify({"error": "Internal server error"}), 500
+
 @letter_lab_bp.route("/generate-control-profile", methods=["POST"])
 @token_required
+@session_owner_required
+@rate_limited(3, 60)
 def generate_control_profile_endpoint():
     """Generate control profile for collaborative alignment research."""
     try:
@@ -66,7 +115,17 @@ def generate_control_profile_endpoint():
         
         # Check if session_id is a valid ObjectId and session exists
         if session_id and ObjectId.is_valid(session_id):
-            session_doc = get_session(session_id)
+            session_doc = get_session(session_id, {"resume": 1, "job_desc": 1, "controlProfile.text": 1})
+        
+        # A profile already generated from these inputs (e.g. the page was
+        # reloaded) is returned instead of generating another
+        if (session_doc and session_doc.get("controlProfile", {}).get("text")
+                and session_doc.get("resume") == resume and session_doc.get("job_desc") == job_description):
+            return jsonify({
+                "success": True,
+                "profile_text": session_doc["controlProfile"]["text"],
+                "session_id": session_id
+            }), 200
         
         # If session doesn't exist, create a new one
         if not session_doc:
@@ -99,7 +158,8 @@ def generate_control_profile_endpoint():
             "controlProfile": {
                 "text": profile_result["content"],
                 "promptVersion": profile_result["prompt_version"],
-                "promptType": profile_result["prompt_type"]
+                "promptType": profile_result["prompt_type"],
+                "generationSettings": profile_result["generation_settings"]
             }
         }
         
@@ -115,34 +175,62 @@ def generate_control_profile_endpoint():
             "session_id": session_id
         }), 200
         
+    except (CircuitOpenError, QueueTimeoutError) as e:
+        return generation_unavailable(e)
     except Exception as e:
         print("Error generating control profile:", str(e))
         return jsonify({"error": "Internal server error"}), 500
 
 @letter_lab_bp.route("/generate-bse-bullets", methods=["POST"])
 @token_required
+@session_owner_required
+@rate_limited(3, 60)
 def generate_bse_bullets_endpoint():
     """Generate 3 BSE theory bullets for collaborative alignment research."""
     try:
         data = request.get_json()
         session_id = data.get("session_id")
-        resume = data.get("resume")
-        job_description = data.get("job_description")
         
         # Validate required fields
-        if not all([session_id, resume, job_description]):
-            return jsonify({
-                "error": "Missing required fields: session_id, resume, job_description"
-            }), 400
+        if not session_id:
+            return jsonify({"error": "Missing required field: session_id"}), 400
         
         # Validate session exists
         if not ObjectId.is_valid(session_id):
             return jsonify({"error": "Invalid session_id format"}), 400
             
-        session_doc = get_session(session_id)
+        session_doc = get_session(session_id, {"resume": 1, "job_desc": 1, "bulletIterations": 1})
         if not session_doc:
             return jsonify({"error": "Session not found"}), 404
         
+        # Inputs stored by generate-control-profile; the request body is only a
+        # fallback for older clients
+        resume = session_doc.get("resume") or data.get("resume")
+        job_description = session_doc.get("job_desc") or data.get("job_description")
+        
+        if not resume or not job_description:
+            return jsonify({"error": "Resume or job description not found in session"}), 400
+        
+        # Bullets already generated for this session are returned without a new LLM call
+        if session_doc.get("bulletIterations"):
+            existing_bullets = []
+            bullet_iterations_data = session_doc.get("bulletIterations", [])
+            for bullet_data in bullet_iterations_data:
+                if bullet_data.get("iterations") and len(bullet_data["iterations"]) > 0:
+                    # Get the first iteration as the "current" bullet
+                    first_iteration = bullet_data["iterations"][0]
+                    existing_bullets.append({
+                        "index": bullet_data.get("bulletIndex", len(existing_bullets)),
+                        "text": first_iteration.get("bulletText", ""),
+                        "rationale": first_iteration.get("rationale", "")
+                    })
+            
+            if existing_bullets:
+                return jsonify({
+                    "success": True,
+                    "bullets": existing_bullets
+                }), 200
+        
         # Generate BSE bullets using prompt management system
         bullets_result = retry_generation(
             generate_bse_bullets,
@@ -174,42 +262,17 @@ def generate_bse_bullets_endpoint():
                     "userFeedback": "",
                     "timestamp": None,
                     "promptVersion": bullets_result["prompt_version"],
-                    "promptType": bullets_result["prompt_type"]
+                    "promptType": bullets_result["prompt_type"],
+                    "generationSettings": bullets_result["generation_settings"]
                 }],
                 "finalIteration": None
             })
         
         update_fields = {
-            "bulletIterations": bullet_iterations
+            "bulletIterations": bullet_iterations,
+            "feedbackDigest": build_feedback_digest(bullet_iterations)
         }
         
-        # Check if session exists before updating
-        existing_session = get_session(session_id)
-        if not existing_session:
-            print(f"ERROR: Session {session_id} not found in database")
-            return jsonify({"error": "Session not found"}), 404
-            
-        # Check if bulletIterations already exists
-        if "bulletIterations" in existing_session and existing_session["bulletIterations"]:
-            # If bullets were already generated, retrieve them from the stored data
-            existing_bullets = []
-            bullet_iterations_data = existing_session.get("bulletIterations", [])
-            for bullet_data in bullet_iterations_data:
-                if bullet_data.get("iterations") and len(bullet_data["iterations"]) > 0:
-                    # Get the first iteration as the "current" bullet
-                    first_iteration = bullet_data["iterations"][0]
-                    existing_bullets.append({
-                        "index": bullet_data.get("bulletIndex", len(existing_bullets)),
-                        "text": first_iteration.get("bulletText", ""),
-                        "rationale": first_iteration.get("rationale", "")
-                    })
-            
-            if existing_bullets:
-                return jsonify({
-                    "success": True,
-                    "bullets": existing_bullets
-                }), 200
-        
         # Update session with new bulletIterations
         result = set_fields(session_id, update_fields)
         
@@ -223,27 +286,29 @@ def generate_bse_bullets_endpoint():
             "bullets": bullets
         }), 200
         
+    except (CircuitOpenError, QueueTimeoutError) as e:
+        return generation_unavailable(e)
     except Exception as e:
         print("Error generating BSE bullets:", str(e))
         return jsonify({"error": "Internal server error"}), 500
 
 @letter_lab_bp.route("/regenerate-bullet", methods=["POST"])
 @token_required
+@session_owner_required
+@rate_limited(10, 6)
 def regenerate_bullet_endpoint():
     """Regenerate a single bullet based on user feedback for collaborative alignment research."""
     try:
         data = request.get_json()
         session_id = data.get("session_id")
         bullet_index = data.get("bullet_index")
-        current_bullet = data.get("current_bullet")
         user_rating = data.get("user_rating")
         user_feedback = data.get("user_feedback")
-        iteration_history = data.get("iteration_history", [])
         
         # Validate required fields
-        if not all([session_id, bullet_index is not None, current_bullet, user_rating]):
+        if not all([session_id, bullet_index is not None, user_rating]):
             return jsonify({
-                "error": "Missing required fields: session_id, bullet_index, current_bullet, user_rating"
+                "error": "Missing required fields: session_id, bullet_index, user_rating"
             }), 400
         
         # Validate bullet_index range
@@ -258,13 +323,47 @@ def regenerate_bullet_endpoint():
         if not ObjectId.is_valid(session_id):
             return jsonify({"error": "Invalid session_id format"}), 400
             
-        session_doc = get_session(session_id)
+        session_doc = get_session(session_id, {"bulletIterations": 1})
         if not session_doc:
             return jsonify({"error": "Session not found"}), 404
         
+        # The latest saved iteration is the bullet being regenerated and the
+        # earlier ones are its history; the request body is only a fallback
+        # for older clients on sessions with nothing stored yet
+        bullet_iterations = session_doc.get("bulletIterations", [])
+        current_bullet, iteration_history = split_bullet_history(
+            bullet_iterations, bullet_index, skip_pending=True
+        )
+        source_iteration = None
+        if current_bullet is None:
+            current_bullet = data.get("current_bullet")
+            iteration_history = data.get("iteration_history") or []
+        else:
+            source_iteration = current_bullet.get("iterationNumber")
+            current_bullet = {
+                "text": current_bullet.get("bulletText", ""),
+                "rationale": current_bullet.get("rationale", "")
+            }
+            
+            # Already regenerated from this iteration (e.g. the page was
+            # reloaded before rating it): return the stored bullet
+            stored = pending_iteration(bullet_iterations, bullet_index, source_iteration)
+            if stored:
+                return jsonify({
+                    "success": True,
+                    "bullet": {
+                        "text": stored.get("bulletText", ""),
+                        "rationale": stored.get("rationale", ""),
+                        "promptVersion": stored.get("promptVersion"),
+                        "promptType": stored.get("promptType"),
+                        "generationSettings": stored.get("generationSettings")
+                    },
+                    "iteration_number": stored["iterationNumber"]
+                }), 200
+        
         # Validate current_bullet structure
         if not isinstance(current_bullet, dict) or "text" not in current_bullet or "rationale" not in current_bullet:
-            return jsonify({"error": "current_bullet must contain 'text' and 'rationale' fields"}), 400
+            return jsonify({"error": "No saved iteration found for this bullet"}), 400
         
         # Generate regenerated bullet using prompt management system
         regeneration_result = retry_generation(
@@ -289,23 +388,54 @@ def regenerate_bullet_endpoint():
             # Add version information to the regenerated bullet
             regenerated_bullet["promptVersion"] = regeneration_result["prompt_version"]
             regenerated_bullet["promptType"] = regeneration_result["prompt_type"]
+            regenerated_bullet["generationSettings"] = regeneration_result["generation_settings"]
         except ValueError as e:
             print("Error parsing regenerated bullet:", str(e))
             return jsonify({"error": "Failed to parse regenerated bullet response"}), 500
         
+        # Store the new iteration unrated straight away; save-iteration-data
+        # replaces it once the participant rates it
+        iteration_number = None
+        if source_iteration is not None:
+            iteration_number = source_iteration + 1
+            bullet_iterations = merge_iteration(bullet_iterations, bullet_index, {
+                "iterationNumber": iteration_number,
+                "bulletText": regenerated_bullet["text"],
+                "rationale": regenerated_bullet["rationale"],
+                "userRating": None,
+                "userFeedback": "",
+                "timestamp": None,
+                "promptVersion": regenerated_bullet["promptVersion"],
+                "promptType": regenerated_bullet["promptType"],
+                "generationSettings": regenerated_bullet["generationSettings"],
+                "pending": True,
+                "sourceIteration": source_iteration
+            })
+            result = set_fields(session_id, {
+                "bulletIterations": bullet_iterations,
+                "feedbackDigest": build_feedback_digest(bullet_iterations)
+            })
+            if not result or result.modified_count == 0:
+                return jsonify({"error": "Failed to save regenerated bullet"}), 500
+        
         log_progress_event("bullet_regenerated", session_id=session_id)
         
         return jsonify({
             "success": True,
-            "bullet": regenerated_bullet
+            "bullet": regenerated_bullet,
+            "iteration_number": iteration_number
         }), 200
         
+    except (CircuitOpenError, QueueTimeoutError) as e:
+        return generation_unavailable(e)
     except Exception as e:
         print("Error regenerating bullet:", str(e))
         return jsonify({"error": "Internal server error"}), 500
 
 @letter_lab_bp.route("/generate-aligned-profile", methods=["POST"])
 @token_required
+@session_owner_required
+@rate_limited(3, 60)
 def generate_aligned_profile_endpoint():
     """Generate aligned profile using bullet iterations data for collaborative alignment research."""
     try:
@@ -320,10 +450,21 @@ def generate_aligned_profile_endpoint():
         if not ObjectId.is_valid(session_id):
             return jsonify({"error": "Invalid session_id format"}), 400
             
-        session_doc = get_session(session_id)
+        # The pre-rendered feedback digest replaces walking the iteration history
+        session_doc = get_session(session_id, {
+            "resume": 1, "job_desc": 1, "controlProfile.text": 1, "feedbackDigest": 1, "alignedProfile.text": 1
+        })
         if not session_doc:
             return jsonify({"error": "Session not found"}), 404
         
+        # An aligned profile already generated is returned instead of generating another
+        if session_doc.get("alignedProfile", {}).get("text"):
+            return jsonify({
+                "success": True,
+                "profile_text": session_doc["alignedProfile"]["text"],
+                "session_id": session_id
+            }), 200
+        
         # Get resume and job description from session
         resume = session_doc.get("resume")
         job_description = session_doc.get("job_desc")
@@ -331,11 +472,13 @@ def generate_aligned_profile_endpoint():
         if not resume or not job_description:
             return jsonify({"error": "Resume or job description not found in session"}), 400
         
-        # Get bullet iterations data from session
-        bullet_iterations = session_doc.get("bulletIterations", [])
-        
-        if not bullet_iterations:
-            return jsonify({"error": "No bullet iterations found in session"}), 400
+        feedback_digest = session_doc.get("feedbackDigest")
+        if not feedback_digest:
+            # Sessions saved before the digest existed: build it from the history once
+            bullet_iterations = (get_session(session_id, {"bulletIterations": 1}) or {}).get("bulletIterations", [])
+            if not bullet_iterations:
+                return jsonify({"error": "No bullet iterations found in session"}), 400
+            feedback_digest = build_feedback_digest(bullet_iterations)
         
         # Get original control profile for context
         original_profile = session_doc.get("controlProfile", {}).get("text", "")
@@ -344,7 +487,7 @@ def generate_aligned_profile_endpoint():
         aligned_profile_result = retry_generation(
             generate_aligned_profile,
             validator_fn=lambda x: x is not None and isinstance(x, dict) and "content" in x,
-            args=(resume, job_description, bullet_iterations, original_profile),
+            args=(resume, job_description, feedback_digest, original_profile),
             debug_label="Aligned Profile"
         )
         
@@ -356,7 +499,8 @@ def generate_aligned_profile_endpoint():
             "alignedProfile": {
                 "text": aligned_profile_result["content"],
                 "promptVersion": aligned_profile_result["prompt_version"],
-                "promptType": aligned_profile_result["prompt_type"]
+                "promptType": aligned_profile_result["prompt_type"],
+                "generationSettings": aligned_profile_result["generation_settings"]
             }
         }
         
@@ -372,6 +516,8 @@ def generate_aligned_profile_endpoint():
             "session_id": session_id
         }), 200
         
+    except (CircuitOpenError, QueueTimeoutError) as e:
+        return generation_unavailable(e)
     except Exception as e:
         print("Error generating aligned profile:", str(e))
         return jsonify({"error": "Internal server error"}), 500
@@ -504,21 +650,10 @@ def save_iteration_data_endpoint():
         if not ObjectId.is_valid(session_id):
             return jsonify({"error": "Invalid session_id format"}), 400
             
-        session_doc = get_session(session_id)
+        session_doc = get_session(session_id, {"bulletIterations": 1})
         if not session_doc:
             return jsonify({"error": "Session not found"}), 404
         
-        # Get current bullet iterations
-        bullet_iterations = session_doc.get("bulletIterations", [])
-        
-        # Ensure we have the right structure
-        while len(bullet_iterations) <= bullet_index:
-            bullet_iterations.append({
-                "bulletIndex": len(bullet_iterations),
-                "iterations": [],
-                "finalIteration": None
-            })
-        
         # Create iteration data
         iteration_data = {
             "iterationNumber": iteration_number,
@@ -528,33 +663,18 @@ def save_iteration_data_endpoint():
             "userFeedback": user_feedback or "",
             "timestamp": data.get("timestamp") or None,
             "promptVersion": data.get("prompt_version"),
-            "promptType": data.get("prompt_type")
+            "promptType": data.get("prompt_type"),
+            "generationSettings": data.get("generation_settings")
         }
         
-        # Add or update iteration in the specific bullet
-        bullet_data = bullet_iterations[bullet_index]
-        
-        # Find if this iteration already exists
-        existing_iteration_index = None
-        for i, iteration in enumerate(bullet_data["iterations"]):
-            if iteration.get("iterationNumber") == iteration_number:
-                existing_iteration_index = i
-                break
-        
-        if existing_iteration_index is not None:
-            # Update existing iteration
-            bullet_data["iterations"][existing_iteration_index] = iteration_data
-        else:
-            # Add new iteration
-            bullet_data["iterations"].append(iteration_data)
-        
-        # If this is marked as final, set finalIteration
-        if is_final:
-            bullet_data["finalIteration"] = iteration_number
+        bullet_iterations = merge_iteration(
+            session_doc.get("bulletIterations", []), bullet_index, iteration_data, is_final
+        )
         
-        # Update session document
+        # Update session document, keeping the final synthesis digest in step
         update_fields = {
-            "bulletIterations": bullet_iterations
+            "bulletIterations": bullet_iterations,
+            "feedbackDigest": build_feedback_digest(bullet_iterations)
         }
         
         result = set_fields(session_id, update_fields)
@@ -0,0 +1,205 @@
+import queue
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import OperationFailure
+
+from services.mongodb_service import db
+from services.mongodb_service import get_progress_events_between, get_sessions_changed_between
+from services.mongodb_service import get_tokens_changed_between
+from services.export_service import to_json_safe
+
+WATCHED_COLLECTIONS = ("progress_log", "sessions", "tokens")
+
+# Mongo error code for change streams on a standalone server
+CHANGE_STREAM_NOT_SUPPORTED = 40573
+# Mongo error code when a resume token has fallen off the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+# Polling fallback: how often to look for changes, and how far behind "now"
+# the window stays so writes landing on the boundary are not skipped
+POLL_INTERVAL = 2
+POLL_SAFETY_LAG = timedelta(seconds=1)
+
+# Events buffered per client before it is told to resync instead
+SUBSCRIBER_QUEUE_SIZE = 200
+
+# Delay before re-opening a change stream after a transient error
+RETRY_DELAY = 5
+
+
+def _summarize_progress_event(doc):
+    timestamp = doc.get("timestamp")
+    if isinstance(timestamp, datetime):
+        # Same naive UTC format as the /progress-log listing
+        timestamp = timestamp.replace(tzinfo=None).isoformat()
+    return {
+        "collection": "progress_log",
+        "event_name": doc.get("event_name"),
+        "timestamp": timestamp,
+        "session_id": doc.get("session_id"),
+    }
+
+
+def _summarize_session(session_id, completed=None):
+    event = {"collection": "sessions", "id": session_id}
+    if completed is not None:
+        event["completed"] = completed
+    return event
+
+
+def _summarize_change(change):
+    """Reduce a change stream document to what the dashboard needs.
+
+    Session contents (resumes, job descriptions) never leave the server;
+    clients only learn which session changed and whether it completed.
+    """
+    collection_name = change["ns"]["coll"]
+    doc_id = change["documentKey"]["_id"]
+    full_document = change.get("fullDocument") or {}
+    updated = change.get("updateDescription", {}).get("updatedFields", {})
+
+    if collection_name == "progress_log":
+        return _summarize_progress_event(full_document)
+    if collection_name == "sessions":
+        return _summarize_session(doc_id, updated.get("completed", full_document.get("completed")))
+    return {"collection": "tokens", "id": doc_id, "operation": change["operationType"]}
+
+
+class ChangeFeed:
+    """Fan out changes on the watched collections to every connected admin client.
+
+    One watcher thread per worker process reads a change stream (or polls
+    when Mongo is standalone) and copies each event into the queue of every
+    subscriber, so database load does not grow with the number of open
+    dashboards. The watcher sleeps while nobody is subscribed.
+    """
+
+    def __init__(self, collections=WATCHED_COLLECTIONS):
+        self.collections = collections
+        self.mode = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._has_subscribers = threading.Event()
+        self._thread = None
+        # Where the change stream got to, and when, so a reopened stream
+        # carries on without a gap
+        self._resume_token = None
+        self._resume_time = None
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            self._has_subscribers.set()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._has_subscribers.clear()
+
+    def publish(self, event):
+        event = to_json_safe(event)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # A stalled client: drop its backlog and have it refetch
+                self._drain(subscriber)
+                subscriber.put_nowait({"collection": "resync"})
+
+    @staticmethod
+    def _drain(subscriber):
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+
+    def _run(self):
+        while True:
+            self._has_subscribers.wait()
+            try:
+                if self.mode != "poll":
+                    self.mode = "change_stream"
+                    self._watch()
+                else:
+                    self._poll()
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_NOT_SUPPORTED:
+                    print("Change streams unavailable, polling for dashboard updates")
+                    self.mode = "poll"
+                elif e.code == CHANGE_STREAM_HISTORY_LOST and self._resume_token is not None:
+                    print("Change stream resume point expired, catching up by polling")
+                    self._catch_up()
+                else:
+                    print("Change feed error:", e)
+                    time.sleep(RETRY_DELAY)
+            except Exception as e:
+                print("Change feed error:", e)
+                time.sleep(RETRY_DELAY)
+
+    def _watch(self):
+        pipeline = [
+            {"$match": {
+                "ns.coll": {"$in": list(self.collections)},
+                "operationType": {"$in": ["insert", "update", "replace"]},
+            }},
+            # Keep whole session documents on the database side
+            {"$project": {
+                "ns": 1,
+                "documentKey": 1,
+                "operationType": 1,
+                "updateDescription.updatedFields.completed": 1,
+                "fullDocument.event_name": 1,
+                "fullDocument.timestamp": 1,
+                "fullDocument.session_id": 1,
+                "fullDocument.completed": 1,
+            }},
+        ]
+        with db.watch(pipeline, max_await_time_ms=1000, resume_after=self._resume_token) as stream:
+            while self._has_subscribers.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self.publish(_summarize_change(change))
+                # Advances on idle batches too, so the token stays recent
+                self._resume_token = stream.resume_token
+                self._resume_time = datetime.now(timezone.utc)
+        # Clients that subscribe later load the current state themselves
+        self._resume_token = None
+
+    def _catch_up(self):
+        """Publish what changed since the expired resume token, then start a fresh stream."""
+        until = datetime.now(timezone.utc)
+        self._publish_changes_between(self._resume_time - POLL_SAFETY_LAG, until)
+        self._resume_token = None
+
+    def _publish_changes_between(self, since, until):
+        if "progress_log" in self.collections:
+            for doc in get_progress_events_between(since, until):
+                self.publish(_summarize_progress_event(doc))
+        if "sessions" in self.collections:
+            for doc in get_sessions_changed_between(since, until, {"completed": 1}):
+                self.publish(_summarize_session(doc["_id"], doc.get("completed")))
+        if "tokens" in self.collections:
+            for doc in get_tokens_changed_between(since, until):
+                self.publish({"collection": "tokens", "id": doc["_id"], "operation": "update"})
+
+    def _poll(self):
+        since = datetime.now(timezone.utc) - POLL_SAFETY_LAG
+        while self._has_subscribers.is_set():
+            time.sleep(POLL_INTERVAL)
+            until = datetime.now(timezone.utc) - POLL_SAFETY_LAG
+            self._publish_changes_between(since, until)
+            since = until
+
+
+change_feed = ChangeFeed()
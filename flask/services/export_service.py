@@ -0,0 +1,573 @@
+import csv
+import io
+import zipfile
+from collections import namedtuple
+from itertools import islice
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+import orjson
+import pyarrow as pa
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+from services.mongodb_service import db, text_codec
+from services.mongodb_service import hydrate_sessions, session_projection
+from services.mongodb_service import get_sessions_changed_between, get_progress_events_between
+
+# Number of rows buffered per record batch. Keeps memory bounded no matter
+# how many sessions the study accumulates.
+EXPORT_BATCH_SIZE = 2000
+
+COLUMNAR_FORMATS = {
+    "parquet": {"extension": "parquet", "mimetype": "application/vnd.apache.parquet"},
+    "arrow": {"extension": "arrow", "mimetype": "application/vnd.apache.arrow.file"},
+}
+
+# Collections included in the full NDJSON snapshot bundle
+BUNDLE_COLLECTIONS = ("sessions", "texts", "tokens", "prompts", "prompt_bodies", "progress_log")
+
+# Bytes buffered before the bundle stream hands a chunk to the WSGI server
+BUNDLE_CHUNK_SIZE = 64 * 1024
+
+# Incremental exports stop this far behind "now" so writes that were stamped
+# just before the query but committed just after it are not skipped.
+INCREMENTAL_SAFETY_LAG = timedelta(seconds=5)
+
+LIKERT_ITEMS = ("accuracy", "control", "expression", "alignment")
+OPEN_RESPONSE_ITEMS = ("likes", "dislikes", "changes")
+ITERATION_FIELDS = (("text", "bulletText"), ("rationale", "rationale"), ("rating", "userRating"), ("feedback", "userFeedback"))
+
+
+def _to_str(value):
+    if value is None:
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def _to_int(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_bool(value):
+    return bool(value) if value is not None else None
+
+
+def _to_utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+ARROW_TYPES = {
+    "string": (pa.string(), _to_str),
+    "int8": (pa.int8(), _to_int),
+    "int16": (pa.int16(), _to_int),
+    "int32": (pa.int32(), _to_int),
+    "bool": (pa.bool_(), _to_bool),
+    "timestamp": (pa.timestamp("us", tz="UTC"), _to_utc),
+}
+
+# An export column: output name, where to read it from and its Arrow type name.
+# `path` is a tuple of nested keys, or a callable taking the record.
+Column = namedtuple("Column", ["name", "path", "type"])
+
+
+def _compile_extractor(columns):
+    """Compile columns into one function returning a tuple of values.
+
+    Generates straight-line code that looks up each shared key prefix once
+    (e.g. controlProfile, controlProfile.likertResponses) and then reads
+    every column from its parent, instead of walking each path per column.
+    Missing or non-dict intermediates resolve to None.
+    """
+    namespace = {"_EMPTY": {}}
+    lines = ["def extract(record):"]
+    prefix_vars = {(): "record"}
+    values = []
+    for position, column in enumerate(columns):
+        if callable(column.path):
+            namespace[f"_fn{position}"] = column.path
+            values.append(f"_fn{position}(record)")
+            continue
+        for depth in range(1, len(column.path)):
+            prefix = column.path[:depth]
+            if prefix not in prefix_vars:
+                var = f"_p{len(prefix_vars)}"
+                lines.append(f"    {var} = {prefix_vars[prefix[:-1]]}.get({prefix[-1]!r})")
+                lines.append(f"    if not isinstance({var}, dict): {var} = _EMPTY")
+                prefix_vars[prefix] = var
+        values.append(f"{prefix_vars[column.path[:-1]]}.get({column.path[-1]!r})")
+    lines.append(f"    return ({''.join(value + ', ' for value in values)})")
+    exec(compile("\n".join(lines), "<ColumnPlan>", "exec"), namespace)
+    return namespace["extract"]
+
+
+class ColumnPlan:
+    """A column specification compiled once into a tuple-producing row extractor.
+
+    `prepare`, if given, is called on each record before extraction so
+    derived lookups (e.g. an iteration index) are built once per row instead
+    of once per column.
+    """
+
+    def __init__(self, columns, prepare=None):
+        self.columns = tuple(columns)
+        self.names = tuple(column.name for column in self.columns)
+        self._extract = _compile_extractor(self.columns)
+        self._prepare = prepare
+
+    def extract(self, record):
+        if self._prepare is not None:
+            self._prepare(record)
+        return self._extract(record)
+
+    def as_dict(self, row):
+        return dict(zip(self.names, row))
+
+    def arrow_schema(self):
+        return pa.schema([(column.name, ARROW_TYPES[column.type][0]) for column in self.columns])
+
+    def arrow_coercers(self):
+        return tuple(ARROW_TYPES[column.type][1] for column in self.columns)
+
+
+def _document_id(record):
+    return str(record["_id"])
+
+
+def _profile_columns(prefix, profile_key):
+    columns = [Column(f"{prefix}_profile_text", (profile_key, "text"), "string")]
+    columns += [Column(f"{prefix}_likert_{item}", (profile_key, "likertResponses", item), "int8") for item in LIKERT_ITEMS]
+    columns += [Column(f"{prefix}_response_{item}", (profile_key, "openResponses", item), "string") for item in OPEN_RESPONSE_ITEMS]
+    return columns
+
+
+WIDE_BASE_COLUMNS = [
+    Column("session_id", _document_id, "string"),
+    Column("timestamp", lambda record: record["_id"].generation_time.isoformat(), "string"),
+    Column("resume", ("resume",), "string"),
+    Column("job_desc", ("job_desc",), "string"),
+    Column("completed", lambda record: record.get("completed", False), "bool"),
+] + _profile_columns("control", "controlProfile") + _profile_columns("aligned", "alignedProfile")
+
+
+def _index_iterations(record):
+    """Index a session's iterations by their wide-export key, e.g. "bullet_1_2"."""
+    index = {}
+    for bullet in record.get("bulletIterations") or ():
+        bullet_num = bullet.get("bulletIndex", 0) + 1
+        for iteration in bullet.get("iterations") or ():
+            index[f"bullet_{bullet_num}_{iteration.get('iterationNumber', 1)}"] = iteration
+    record["_iterations"] = index
+
+
+def wide_iteration_keys(batch_size=EXPORT_BATCH_SIZE):
+    """Distinct "bullet_<n>_<iteration>" keys present across all sessions, computed in Mongo."""
+    pipeline = [
+        {"$project": {"bulletIterations.bulletIndex": 1, "bulletIterations.iterations.iterationNumber": 1}},
+        {"$unwind": "$bulletIterations"},
+        {"$unwind": "$bulletIterations.iterations"},
+        {"$group": {"_id": {
+            "bullet": {"$ifNull": ["$bulletIterations.bulletIndex", 0]},
+            "iteration": {"$ifNull": ["$bulletIterations.iterations.iterationNumber", 1]},
+        }}},
+    ]
+    return {
+        f"bullet_{group['_id']['bullet'] + 1}_{group['_id']['iteration']}"
+        for group in db["sessions"].aggregate(pipeline, batchSize=batch_size)
+    }
+
+
+def wide_session_plan(iteration_keys):
+    """Plan for the wide research CSV: base columns then bullet columns in sorted name order."""
+    iteration_columns = [
+        Column(f"{key}_{suffix}", ("_iterations", key, field), "int8" if suffix == "rating" else "string")
+        for key in iteration_keys
+        for suffix, field in ITERATION_FIELDS
+    ]
+    iteration_columns.sort(key=lambda column: column.name)
+    return ColumnPlan(WIDE_BASE_COLUMNS + iteration_columns, prepare=_index_iterations)
+
+
+WIDE_BASE_PLAN = ColumnPlan(WIDE_BASE_COLUMNS)
+
+
+def wide_session_values(record):
+    """One session's wide export values by column name, and the iteration keys it has.
+
+    Matches what wide_session_plan extracts for the session, so rows can be
+    stored per session and laid out against the full plan later.
+    """
+    values = WIDE_BASE_PLAN.as_dict(WIDE_BASE_PLAN.extract(record))
+    _index_iterations(record)
+    for key, iteration in record["_iterations"].items():
+        for suffix, field in ITERATION_FIELDS:
+            values[f"{key}_{suffix}"] = iteration.get(field)
+    return values, sorted(record["_iterations"])
+
+
+def iter_plan_rows(collection_name, plan, projection=None, records=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield tuple rows for every record in a collection.
+
+    `records`, if given, expands one document into several records (e.g. one
+    per bullet iteration) before the plan is applied.
+    """
+    extract = plan.extract
+    if collection_name == "sessions":
+        projection = session_projection(projection)
+    cursor = db[collection_name].find({}, projection, batch_size=batch_size)
+    while True:
+        batch = list(islice(cursor, batch_size))
+        if not batch:
+            break
+        if collection_name == "sessions":
+            # Resolves shared resume/job description texts once per batch
+            hydrate_sessions(batch)
+        else:
+            for doc in batch:
+                text_codec.decode_document(doc)
+        for doc in batch:
+            if records is None:
+                yield extract(doc)
+            else:
+                for record in records(doc):
+                    yield extract(record)
+
+
+def _final_iteration_flag():
+    final = "$bulletIterations.finalIteration"
+    return {"$and": [{"$ne": [final, None]}, {"$eq": [final, "$bulletIterations.iterations.iterationNumber"]}]}
+
+
+# Long (tidy) export: one row per session x bullet x iteration, reshaped in
+# Mongo. Each entry is the output column, its $project expression and type.
+LONG_ITERATION_COLUMNS = (
+    ("session_id", {"$toString": "$_id"}, "string"),
+    ("bullet_index", "$bulletIterations.bulletIndex", "int8"),
+    ("iteration_number", "$bulletIterations.iterations.iterationNumber", "int16"),
+    ("bullet_text", "$bulletIterations.iterations.bulletText", "string"),
+    ("rationale", "$bulletIterations.iterations.rationale", "string"),
+    ("user_rating", "$bulletIterations.iterations.userRating", "int8"),
+    ("user_feedback", "$bulletIterations.iterations.userFeedback", "string"),
+    ("prompt_version", "$bulletIterations.iterations.promptVersion", "int32"),
+    ("prompt_type", "$bulletIterations.iterations.promptType", "string"),
+    ("timestamp", "$bulletIterations.iterations.timestamp", "string"),
+    ("is_final", _final_iteration_flag(), "bool"),
+)
+
+LONG_ITERATION_PIPELINE = [
+    # Sorting before the unwinds walks the _id index instead of sorting rows
+    {"$sort": {"_id": 1}},
+    {"$project": {"bulletIterations.bulletIndex": 1, "bulletIterations.finalIteration": 1, **{
+        f"bulletIterations.iterations.{field}": 1
+        for field in ("iterationNumber", "bulletText", "rationale", "userRating", "userFeedback",
+                      "promptVersion", "promptType", "timestamp")
+    }}},
+    {"$unwind": "$bulletIterations"},
+    {"$unwind": "$bulletIterations.iterations"},
+    {"$project": {"_id": 0, **{name: expression for name, expression, _ in LONG_ITERATION_COLUMNS}}},
+]
+
+LONG_ITERATION_PLAN = ColumnPlan(Column(name, (name,), kind) for name, _, kind in LONG_ITERATION_COLUMNS)
+
+
+def iter_aggregate_rows(collection_name, pipeline, plan, batch_size=EXPORT_BATCH_SIZE):
+    """Yield tuple rows for the documents an aggregation pipeline produces.
+
+    Compressed text values in the output are decompressed before the plan
+    is applied.
+    """
+    extract = plan.extract
+    cursor = db[collection_name].aggregate(pipeline, batchSize=batch_size)
+    for doc in cursor:
+        yield extract(text_codec.decode_document(doc))
+
+
+def long_iteration_rows(match=None, batch_size=EXPORT_BATCH_SIZE):
+    """Rows of the long iteration export, in session order, optionally only for sessions matching `match`."""
+    pipeline = LONG_ITERATION_PIPELINE if match is None else [{"$match": match}] + LONG_ITERATION_PIPELINE
+    return iter_aggregate_rows("sessions", pipeline, LONG_ITERATION_PLAN, batch_size)
+
+
+def stream_csv(plan, rows, chunk_rows=500):
+    """Yield CSV text for a header plus rows, a chunk of rows at a time."""
+    rows = iter(rows)
+    chunk = [plan.names]
+    while chunk:
+        # A fresh buffer per chunk is cheaper than truncating and reusing one
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n").writerows(chunk)
+        yield buffer.getvalue()
+        chunk = list(islice(rows, chunk_rows))
+
+
+def stream_ndjson(plan, rows):
+    """Yield one NDJSON line per row, keyed by column name."""
+    names = plan.names
+    for row in rows:
+        yield to_ndjson_line(dict(zip(names, row)))
+
+
+def _iteration_records(doc):
+    session_id = str(doc["_id"])
+    for bullet in doc.get("bulletIterations") or ():
+        final_iteration = bullet.get("finalIteration")
+        bullet_index = bullet.get("bulletIndex")
+        for iteration in bullet.get("iterations") or ():
+            record = dict(iteration)
+            record["sessionId"] = session_id
+            record["bulletIndex"] = bullet_index
+            record["isFinal"] = final_iteration is not None and final_iteration == iteration.get("iterationNumber")
+            yield record
+
+
+def _likert_records(doc):
+    session_id = str(doc["_id"])
+    for profile_name, profile_key in (("control", "controlProfile"), ("aligned", "alignedProfile")):
+        profile = doc.get(profile_key) or {}
+        if not profile.get("likertResponses") and not profile.get("openResponses"):
+            continue
+        yield {
+            "sessionId": session_id,
+            "profile": profile_name,
+            "likertResponses": profile.get("likertResponses") or {},
+            "openResponses": profile.get("openResponses") or {},
+        }
+
+
+# Each table: source collection, Mongo projection, optional record expansion
+# and the typed column plan applied to each record.
+COLUMNAR_TABLES = {
+    "sessions": {
+        "collection": "sessions",
+        "projection": {
+            "resume": 1, "job_desc": 1, "completed": 1,
+            "controlProfile.text": 1, "controlProfile.promptVersion": 1,
+            "alignedProfile.text": 1, "alignedProfile.promptVersion": 1,
+        },
+        "records": None,
+        "plan": ColumnPlan([
+            Column("session_id", _document_id, "string"),
+            Column("created_at", lambda record: record["_id"].generation_time, "timestamp"),
+            Column("completed", lambda record: record.get("completed", False), "bool"),
+            Column("resume", ("resume",), "string"),
+            Column("job_desc", ("job_desc",), "string"),
+            Column("control_profile_text", ("controlProfile", "text"), "string"),
+            Column("control_prompt_version", ("controlProfile", "promptVersion"), "int32"),
+            Column("aligned_profile_text", ("alignedProfile", "text"), "string"),
+            Column("aligned_prompt_version", ("alignedProfile", "promptVersion"), "int32"),
+        ]),
+    },
+    "iterations": {
+        "collection": "sessions",
+        "projection": {"bulletIterations": 1},
+        "records": _iteration_records,
+        "plan": ColumnPlan([
+            Column("session_id", ("sessionId",), "string"),
+            Column("bullet_index", ("bulletIndex",), "int8"),
+            Column("iteration_number", ("iterationNumber",), "int16"),
+            Column("bullet_text", ("bulletText",), "string"),
+            Column("rationale", ("rationale",), "string"),
+            Column("user_rating", ("userRating",), "int8"),
+            Column("user_feedback", ("userFeedback",), "string"),
+            Column("timestamp", ("timestamp",), "string"),
+            Column("prompt_version", ("promptVersion",), "int32"),
+            Column("prompt_type", ("promptType",), "string"),
+            Column("is_final", ("isFinal",), "bool"),
+        ]),
+    },
+    "likert": {
+        "collection": "sessions",
+        "projection": {
+            "controlProfile.likertResponses": 1, "controlProfile.openResponses": 1,
+            "alignedProfile.likertResponses": 1, "alignedProfile.openResponses": 1,
+        },
+        "records": _likert_records,
+        "plan": ColumnPlan(
+            [Column("session_id", ("sessionId",), "string"), Column("profile", ("profile",), "string")]
+            + [Column(item, ("likertResponses", item), "int8") for item in LIKERT_ITEMS]
+            + [Column(f"response_{item}", ("openResponses", item), "string") for item in OPEN_RESPONSE_ITEMS]
+        ),
+    },
+    "events": {
+        "collection": "progress_log",
+        "projection": None,
+        "records": None,
+        "plan": ColumnPlan([
+            Column("event_id", _document_id, "string"),
+            Column("event_name", ("event_name",), "string"),
+            Column("session_id", ("session_id",), "string"),
+            Column("timestamp", ("timestamp",), "timestamp"),
+        ]),
+    },
+}
+
+
+def columnar_schema(table_name):
+    """Build the Arrow schema for one of the COLUMNAR_TABLES."""
+    return COLUMNAR_TABLES[table_name]["plan"].arrow_schema()
+
+
+def write_columnar_table(table_name, sink, fmt="parquet", batch_size=EXPORT_BATCH_SIZE):
+    """Stream a table from Mongo into a Parquet or Arrow IPC file.
+
+    Rows are accumulated column-wise and flushed as a record batch every
+    `batch_size` rows, so memory stays bounded regardless of table size.
+    Returns the number of rows written.
+    """
+    if table_name not in COLUMNAR_TABLES:
+        raise ValueError(f"Unknown export table: {table_name}")
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    spec = COLUMNAR_TABLES[table_name]
+    plan = spec["plan"]
+    rows = iter_plan_rows(spec["collection"], plan, spec["projection"], spec["records"], batch_size)
+    return write_columnar_rows(plan, rows, sink, fmt, batch_size)
+
+
+def write_columnar_rows(plan, rows, sink, fmt="parquet", batch_size=EXPORT_BATCH_SIZE):
+    """Write plan rows into a Parquet or Arrow IPC file in record batches of `batch_size`."""
+    schema = plan.arrow_schema()
+    coercers = plan.arrow_coercers()
+
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa_ipc.new_file(sink, schema, options=pa_ipc.IpcWriteOptions(compression="zstd"))
+
+    buffers = [[] for _ in coercers]
+    total = 0
+
+    def flush():
+        arrays = [pa.array(values, type=field.type) for values, field in zip(buffers, schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        for values in buffers:
+            values.clear()
+
+    try:
+        for row in rows:
+            for values, coerce, value in zip(buffers, coercers, row):
+                values.append(coerce(value))
+            total += 1
+            if len(buffers[0]) >= batch_size:
+                flush()
+        if buffers[0] or total == 0:
+            flush()
+    finally:
+        writer.close()
+
+    return total
+
+
+def to_json_safe(value):
+    """Convert BSON values (ObjectId, datetime) nested in a document to JSON-friendly ones."""
+    if isinstance(value, dict):
+        return {key: to_json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_json_safe(item) for item in value]
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return _to_utc(value).isoformat()
+    return value
+
+
+def format_watermark(value):
+    """Format a watermark as a URL-safe ISO 8601 UTC timestamp ("...Z")."""
+    return _to_utc(value).isoformat().replace("+00:00", "Z")
+
+
+def parse_watermark(raw):
+    """Parse a watermark given as an ISO 8601 timestamp or an ObjectId hex string."""
+    if not raw:
+        return None
+    if ObjectId.is_valid(raw):
+        return ObjectId(raw).generation_time
+    parsed = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    return _to_utc(parsed)
+
+
+def export_changes_since(since):
+    """Sessions and progress events created or modified after `since`.
+
+    Returns the changes plus the watermark to pass as `since` on the next
+    call, so each sync only reads what changed in between.
+    """
+    until = datetime.now(timezone.utc) - INCREMENTAL_SAFETY_LAG
+    if since is not None and since >= until:
+        return {"sessions": [], "events": [], "watermark": format_watermark(since)}
+
+    sessions = []
+    for doc in hydrate_sessions(list(get_sessions_changed_between(since, until))):
+        doc["document_id"] = str(doc["_id"])
+        doc["timestamp"] = doc["_id"].generation_time.isoformat()
+        del doc["_id"]
+        sessions.append(to_json_safe(doc))
+
+    events = [to_json_safe(doc) for doc in get_progress_events_between(since, until)]
+
+    return {"sessions": sessions, "events": events, "watermark": format_watermark(until)}
+
+
+def _bson_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def to_ndjson_line(doc):
+    """Serialize one document as an NDJSON line.
+
+    ObjectIds become hex strings and datetimes ISO 8601 UTC strings, matching
+    to_json_safe so every export renders BSON types the same way.
+    """
+    return orjson.dumps(doc, default=_bson_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_APPEND_NEWLINE)
+
+
+class _ChunkSink:
+    """Write-only file object that collects the bytes zipfile produces until drained."""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def stream_bundle(collections=BUNDLE_COLLECTIONS, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a ZIP archive with one NDJSON file per collection, chunk by chunk.
+
+    Documents are read from Mongo cursors and written straight into the
+    archive, so memory use does not depend on collection size.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name in collections:
+            with archive.open(f"{name}.ndjson", "w", force_zip64=True) as entry:
+                for doc in db[name].find({}, batch_size=batch_size):
+                    # The bundle holds plain text so it is readable without the dictionaries
+                    entry.write(to_ndjson_line(text_codec.decode_document(doc)))
+                    if sink.size >= BUNDLE_CHUNK_SIZE:
+                        yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,272 @@
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+from itertools import islice
+
+import orjson
+
+from services.mongodb_service import collection, hydrate_sessions, get_sessions_changed_between
+from services.export_service import EXPORT_BATCH_SIZE, INCREMENTAL_SAFETY_LAG, LONG_ITERATION_PLAN
+from services.export_service import format_watermark, long_iteration_rows, parse_watermark
+from services.export_service import stream_csv, wide_session_plan, wide_session_values
+
+# Snapshot files by export layout, matching the live /sessions/export names
+SNAPSHOT_FILES = {
+    "wide": "research_data.csv",
+    "long": "research_iterations.csv",
+}
+
+ROW_CACHE = "rows.sqlite"
+STATUS_FILE = "status.json"
+LOCK_FILE = "refresh.lock"
+# Left by the web app to ask the refresher for an early refresh
+REQUEST_FILE = "refresh.requested"
+
+# How often the refresher checks for a requested refresh while it waits
+REQUEST_POLL_INTERVAL = 1
+
+_refresher = None
+
+
+def snapshot_dir():
+    return os.getenv("EXPORT_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "letterlab_exports"))
+
+
+def refresh_interval():
+    """Seconds between refreshes from a thread in the web app; 0 (the default) leaves them to the refresher process."""
+    return float(os.getenv("EXPORT_SNAPSHOT_INTERVAL", "0"))
+
+
+def snapshot_path(layout):
+    return os.path.join(snapshot_dir(), SNAPSHOT_FILES[layout])
+
+
+def snapshot_status():
+    """What the last refresh wrote, or None before the first one."""
+    try:
+        with open(os.path.join(snapshot_dir(), STATUS_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _dumps(value):
+    return orjson.dumps(value, default=str)
+
+
+def _open_cache(path):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        "session_id TEXT PRIMARY KEY, iteration_keys BLOB NOT NULL, wide BLOB NOT NULL, long BLOB NOT NULL)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    return conn
+
+
+def _get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def _store_changed_sessions(conn, since, until, batch_size=EXPORT_BATCH_SIZE):
+    """Re-render the sessions changed in (since, until] into the row cache. Returns how many."""
+    cursor = get_sessions_changed_between(since, until)
+    changed = 0
+    while True:
+        batch = hydrate_sessions(list(islice(cursor, batch_size)))
+        if not batch:
+            break
+        long_rows = {}
+        for row in long_iteration_rows(match={"_id": {"$in": [doc["_id"] for doc in batch]}}):
+            long_rows.setdefault(row[0], []).append(row)
+        records = []
+        for doc in batch:
+            values, iteration_keys = wide_session_values(doc)
+            session_id = values["session_id"]
+            records.append((session_id, _dumps(iteration_keys), _dumps(values), _dumps(long_rows.get(session_id, []))))
+        conn.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)", records)
+        changed += len(records)
+    return changed
+
+
+def _remove_deleted_sessions(conn):
+    """Drop cached rows of sessions no longer in Mongo. Returns how many."""
+    cached = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+    if cached <= collection.count_documents({}):
+        return 0
+    existing = {str(doc["_id"]) for doc in collection.find({}, {"_id": 1})}
+    stale = [(session_id,) for (session_id,) in conn.execute("SELECT session_id FROM sessions")
+             if session_id not in existing]
+    conn.executemany("DELETE FROM sessions WHERE session_id = ?", stale)
+    return len(stale)
+
+
+def _write_atomically(path, chunks):
+    """Write text chunks to `path` via a temp file and rename. Returns size and a content hash."""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                size += len(data)
+                f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return {"size": size, "etag": digest.hexdigest()[:32]}
+
+
+def _write_snapshots(conn):
+    iteration_keys = set()
+    for (keys,) in conn.execute("SELECT iteration_keys FROM sessions"):
+        iteration_keys.update(orjson.loads(keys))
+    wide_plan = wide_session_plan(iteration_keys)
+    names = wide_plan.names
+
+    wide_rows = (
+        tuple(values.get(name) for name in names)
+        for values in (orjson.loads(wide) for (wide,) in conn.execute("SELECT wide FROM sessions ORDER BY session_id"))
+    )
+    long_rows = (
+        tuple(row)
+        for (rows,) in conn.execute("SELECT long FROM sessions ORDER BY session_id")
+        for row in orjson.loads(rows)
+    )
+    return {
+        "wide": _write_atomically(snapshot_path("wide"), stream_csv(wide_plan, wide_rows)),
+        "long": _write_atomically(snapshot_path("long"), stream_csv(LONG_ITERATION_PLAN, long_rows)),
+    }
+
+
+def _write_status(status):
+    path = os.path.join(snapshot_dir(), STATUS_FILE)
+    _write_atomically(path, [json.dumps(status, indent=2)])
+
+
+def _refresh(full):
+    until = datetime.now(timezone.utc) - INCREMENTAL_SAFETY_LAG
+    status = snapshot_status()
+    with closing(_open_cache(os.path.join(snapshot_dir(), ROW_CACHE))) as conn:
+        # One transaction, so a refresh that fails part way is redone in full
+        with conn:
+            if full:
+                conn.execute("DELETE FROM sessions")
+                since = None
+            else:
+                since = parse_watermark(_get_meta(conn, "watermark"))
+            changed = _store_changed_sessions(conn, since, until)
+            removed = _remove_deleted_sessions(conn)
+
+            files_missing = not all(os.path.exists(snapshot_path(layout)) for layout in SNAPSHOT_FILES)
+            if changed or removed or files_missing or status is None:
+                files = _write_snapshots(conn)
+                generated_at = format_watermark(datetime.now(timezone.utc))
+            else:
+                files = status["files"]
+                generated_at = status["generatedAt"]
+            _set_meta(conn, "watermark", format_watermark(until))
+
+        status = {
+            "watermark": format_watermark(until),
+            "generatedAt": generated_at,
+            "sessions": conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            "lastRefresh": {"changed": changed, "removed": removed, "full": full},
+            "files": files,
+        }
+    _write_status(status)
+    return status
+
+
+def refresh_snapshots(full=False):
+    """Bring the snapshot files up to date with the sessions collection.
+
+    Only sessions whose updatedAt moved past the stored watermark are read
+    from Mongo and re-rendered; their rows are kept in a SQLite cache next to
+    the files, and the files are rewritten from that cache when anything
+    changed. A lock file keeps to one refresh at a time across processes on
+    the host; returns None if another refresh holds it.
+
+    The Mongo side is incremental but the file side is not: one changed
+    session still rewrites both CSVs from every cached row, so a refresh
+    during an active study costs time proportional to all rows, read from
+    local SQLite rather than Mongo. Rows are not appended in place because
+    most changes update existing sessions, and a new iteration column
+    changes the wide header.
+    """
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    with open(os.path.join(snapshot_dir(), LOCK_FILE), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return None
+        return _refresh(full)
+
+
+def request_refresh():
+    """Ask the refresher process to run now instead of at its next interval.
+
+    Only leaves a marker file in the snapshot directory, so web workers never
+    do refresh work themselves.
+    """
+    os.makedirs(snapshot_dir(), exist_ok=True)
+    with open(os.path.join(snapshot_dir(), REQUEST_FILE), "w"):
+        pass
+
+
+def _wait_for_request(timeout):
+    """Sleep up to `timeout` seconds, returning early if a refresh was requested."""
+    marker = os.path.join(snapshot_dir(), REQUEST_FILE)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(marker):
+            try:
+                os.unlink(marker)
+            except FileNotFoundError:
+                pass
+            return True
+        time.sleep(REQUEST_POLL_INTERVAL)
+    return False
+
+
+def run_refresher(interval, full=False):
+    """Refresh every `interval` seconds, or sooner when requested. Never returns."""
+    while True:
+        try:
+            status = refresh_snapshots(full=full)
+            if status is not None:
+                print(f"Export snapshots: {status['sessions']} sessions, "
+                      f"{status['lastRefresh']['changed']} changed, watermark {status['watermark']}")
+        except Exception as e:
+            print("Error refreshing export snapshots:", e)
+        full = False
+        _wait_for_request(interval)
+
+
+def start_snapshot_refresher():
+    """Refresh from a thread of this process when EXPORT_SNAPSHOT_INTERVAL is set.
+
+    Off by default: refreshes belong in refresh_export_snapshots.py --loop,
+    run as its own service, so they never take worker time from participants.
+    """
+    global _refresher
+    interval = refresh_interval()
+    if interval <= 0 or _refresher is not None:
+        return
+    _refresher = threading.Thread(target=run_refresher, args=(interval,), name="export-snapshots", daemon=True)
+    _refresher.start()
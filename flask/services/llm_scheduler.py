@@ -0,0 +1,271 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+import openai
+import tiktoken
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from services.mongodb_service import db
+from utils.tracing import span
+
+# Lower runs first: participant-facing generation ahead of admin probes
+PARTICIPANT = 0
+ADMIN = 10
+
+# Output tokens reserved for a call whose prompt does not set maxTokens
+DEFAULT_OUTPUT_TOKENS = 1000
+
+# How long a call may wait for capacity before giving up
+QUEUE_TIMEOUT = 60
+
+# Recent waits kept for the stats endpoint
+RECENT_WAITS = 200
+
+
+def openai_limits():
+    """Account-wide (requests, tokens) per minute; 0 means no shared budget."""
+    return int(os.getenv("OPENAI_RPM_LIMIT", "0")), int(os.getenv("OPENAI_TPM_LIMIT", "0"))
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a call waited QUEUE_TIMEOUT without getting budget."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is at its rate limit; retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    """tiktoken encoding for a model, or None if its files cannot be loaded (e.g. offline)."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        print("Token counting unavailable, estimating from length:", e)
+        return None
+
+
+def estimate_tokens(prompt, model, max_tokens=None):
+    """Prompt tokens plus the output the call may produce."""
+    encoding = _encoding(model)
+    if encoding is not None:
+        prompt_tokens = len(encoding.encode(prompt, disallowed_special=()))
+    else:
+        # Roughly four characters a token for English text
+        prompt_tokens = len(prompt) // 4 + 1
+    return prompt_tokens + (max_tokens or DEFAULT_OUTPUT_TOKENS)
+
+
+def usage_tokens(response):
+    """Tokens a chat response actually used, when the provider reported it."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    return usage.get("total_tokens")
+
+
+def _minute(now):
+    return int(now // 60)
+
+
+class LLMScheduler:
+    """Queue LLM calls in this worker and reserve them from a budget shared by all workers.
+
+    Budgets are fixed one-minute windows in `windows`, one document per
+    model and minute holding the requests and estimated tokens reserved in
+    it. A call reserves atomically before running; the estimate is replaced
+    by the reported usage afterwards. When the window is full the call waits
+    for the next one. Waiting calls are served by priority, then arrival,
+    and only the head of the queue tries to reserve so a low-priority call
+    cannot take capacity a higher-priority one is waiting for. A 429 from
+    the provider marks the window as full for every worker.
+    """
+
+    def __init__(self, windows, timeout=QUEUE_TIMEOUT):
+        self.windows = windows
+        self.timeout = timeout
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._reserving = False
+        self._waits = deque(maxlen=RECENT_WAITS)
+        self._completed = 0
+        self._timeouts = 0
+
+    def _reserve(self, model, cost):
+        """Reserve budget for one call. Returns (window id, 0) or (None, seconds until the next window)."""
+        rpm_limit, tpm_limit = openai_limits()
+        if not (rpm_limit or tpm_limit):
+            return None, 0
+
+        now = time.time()
+        minute = _minute(now)
+        window_id = f"{model}|{minute}"
+        query = {"_id": window_id}
+        if rpm_limit:
+            query["requests"] = {"$lt": rpm_limit}
+        if tpm_limit:
+            # A call larger than the whole budget still runs, alone in its window
+            query["tokens"] = {"$lte": max(0, tpm_limit - cost)}
+        try:
+            self.windows.find_one_and_update(
+                query,
+                {
+                    "$inc": {"requests": 1, "tokens": cost},
+                    "$setOnInsert": {
+                        "model": model,
+                        "minute": minute,
+                        "expiresAt": datetime.now(timezone.utc) + timedelta(minutes=10),
+                    },
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            # The window exists but the call does not fit in it
+            return None, 60 - now % 60
+        except Exception as e:
+            print("Error reserving LLM budget:", e)
+            return None, 0
+        return window_id, 0
+
+    def _acquire(self, model, cost, priority, timeout):
+        ticket = (priority, next(self._order))
+        started = time.monotonic()
+        deadline = started + timeout
+        wait = 1
+        with self._cond:
+            heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                with self._cond:
+                    # Only the head of the queue reserves, one call at a time, so a
+                    # lower-priority call cannot take capacity the head is waiting for
+                    while self._reserving or self._queue[0] != ticket:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._timeouts += 1
+                            raise QueueTimeoutError("OpenAI", max(1, round(wait)))
+                        self._cond.wait(min(wait, remaining))
+                    heapq.heappop(self._queue)
+                    self._reserving = True
+
+                # The Mongo round trip runs without the lock, so the worker's
+                # other threads are not held up behind it
+                wait = 1
+                try:
+                    window_id, wait = self._reserve(model, cost)
+                finally:
+                    with self._cond:
+                        self._reserving = False
+                        if wait:
+                            heapq.heappush(self._queue, ticket)
+                        self._cond.notify_all()
+                if not wait:
+                    with self._cond:
+                        self._waits.append(time.monotonic() - started)
+                    return window_id
+
+                with self._cond:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise QueueTimeoutError("OpenAI", max(1, round(wait)))
+                    self._cond.wait(min(wait, remaining))
+        finally:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def _adjust(self, window_id, tokens, requests=0):
+        try:
+            self.windows.update_one({"_id": window_id}, {"$inc": {"requests": requests, "tokens": tokens}})
+        except Exception as e:
+            print("Error adjusting LLM budget:", e)
+
+    def _saturate(self, model):
+        rpm_limit, tpm_limit = openai_limits()
+        if not (rpm_limit or tpm_limit):
+            return
+        minute = _minute(time.time())
+        try:
+            self.windows.update_one(
+                {"_id": f"{model}|{minute}"},
+                {
+                    "$max": {"requests": rpm_limit, "tokens": tpm_limit},
+                    "$setOnInsert": {
+                        "model": model,
+                        "minute": minute,
+                        "expiresAt": datetime.now(timezone.utc) + timedelta(minutes=10),
+                    },
+                },
+                upsert=True,
+            )
+        except Exception as e:
+            print("Error marking LLM budget as exhausted:", e)
+
+    def run(self, fn, prompt, model, max_tokens=None, priority=PARTICIPANT, timeout=None):
+        """Call fn(prompt) once budget for it is reserved. Raises QueueTimeoutError if none frees up in time."""
+        if openai_limits() == (0, 0):
+            # No shared budget: nothing to count tokens or queue for
+            return fn(prompt)
+        cost = estimate_tokens(prompt, model, max_tokens)
+        with span("llm.queue", estimatedTokens=cost):
+            window_id = self._acquire(model, cost, priority, self.timeout if timeout is None else timeout)
+        try:
+            response = fn(prompt)
+        except openai.RateLimitError:
+            # Our estimates drifted from the provider's count: stop every worker until the next window
+            self._saturate(model)
+            raise
+        except Exception:
+            # Failed calls (including ones an open circuit refused) hand their reservation back
+            if window_id:
+                self._adjust(window_id, -cost, requests=-1)
+            raise
+        finally:
+            with self._cond:
+                self._completed += 1
+
+        used = usage_tokens(response)
+        if window_id and used is not None and used != cost:
+            self._adjust(window_id, used - cost)
+        return response
+
+    def snapshot(self):
+        """Queue and budget stats: queue numbers are for this worker, windows are shared."""
+        with self._cond:
+            queued = {}
+            for priority, _ in self._queue:
+                queued[priority] = queued.get(priority, 0) + 1
+            waits = list(self._waits)
+            stats = {
+                "queueDepth": len(self._queue),
+                "queuedByPriority": {str(priority): count for priority, count in sorted(queued.items())},
+                "calls": self._completed,
+                "timeouts": self._timeouts,
+                "averageWaitSeconds": round(sum(waits) / len(waits), 3) if waits else 0,
+                "maxWaitSeconds": round(max(waits), 3) if waits else 0,
+            }
+
+        rpm_limit, tpm_limit = openai_limits()
+        stats["limits"] = {"requestsPerMinute": rpm_limit, "tokensPerMinute": tpm_limit}
+        stats["currentWindow"] = [
+            {"model": doc["model"], "requests": doc["requests"], "tokens": doc["tokens"]}
+            for doc in self.windows.find({"minute": _minute(time.time())}, {"_id": 0})
+        ]
+        return stats
+
+
+llm_scheduler = LLMScheduler(db["llm_budget"])
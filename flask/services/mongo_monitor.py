@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from pymongo import monitoring
+
+from utils.tracing import current_request_id
+
+# How often the top offenders are explained, and how many of them
+EXPLAIN_INTERVAL = 300
+EXPLAIN_TOP = 10
+
+# Bounds on what is kept in memory
+MAX_SHAPES = 500
+RECENT_SLOW = 100
+
+# Driver and server housekeeping that says nothing about our queries
+IGNORED_COMMANDS = {
+    "hello", "ismaster", "isMaster", "ping", "buildinfo", "buildInfo", "endSessions",
+    "saslStart", "saslContinue", "explain", "killCursors", "listIndexes", "createIndexes",
+}
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Command fields that belong to the session or transport, not the query
+TRANSPORT_FIELDS = {
+    "lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "readConcern",
+    "writeConcern", "signature", "ordered", "bypassDocumentValidation", "comment",
+}
+
+
+def monitor_enabled():
+    return os.getenv("MONGO_MONITOR", "true").lower() in ("1", "true", "yes")
+
+
+def slow_query_ms():
+    return float(os.getenv("MONGO_SLOW_QUERY_MS", "100"))
+
+
+def _field_names(query, prefix=""):
+    """Field names a filter touches, with operators but without values."""
+    names = []
+    if not isinstance(query, dict):
+        return names
+    for key, value in query.items():
+        if key in ("$or", "$and", "$nor") and isinstance(value, list):
+            for clause in value:
+                names.extend(_field_names(clause, prefix))
+        elif isinstance(value, dict) and value and all(k.startswith("$") for k in value):
+            names.append(f"{prefix}{key}:" + ",".join(sorted(value)))
+        else:
+            names.append(f"{prefix}{key}")
+    return sorted(set(names))
+
+
+def query_shape(command_name, command):
+    """A value-free description of what a command filters and sorts on."""
+    if command_name == "find":
+        shape = "filter{" + ",".join(_field_names(command.get("filter"))) + "}"
+        if command.get("sort"):
+            shape += " sort{" + ",".join(command["sort"]) + "}"
+        return shape
+    if command_name == "aggregate":
+        stages = [next(iter(stage)) for stage in command.get("pipeline", []) if stage]
+        first_match = next((stage["$match"] for stage in command.get("pipeline", []) if "$match" in stage), None)
+        shape = "pipeline[" + ",".join(stages) + "]"
+        if first_match is not None:
+            shape += " match{" + ",".join(_field_names(first_match)) + "}"
+        return shape
+    if command_name in ("count", "distinct"):
+        return "filter{" + ",".join(_field_names(command.get("query"))) + "}"
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        return "filter{" + ",".join(_field_names(statements[0].get("q"))) + "}"
+    if command_name == "findAndModify":
+        return "filter{" + ",".join(_field_names(command.get("query"))) + "}"
+    return ""
+
+
+def _explain_target(command_name, command):
+    target = {key: value for key, value in command.items() if key not in TRANSPORT_FIELDS}
+    # Explain the first statement of a bulk write
+    if command_name == "update":
+        target["updates"] = target.get("updates", [])[:1]
+    if command_name == "delete":
+        target["deletes"] = target.get("deletes", [])[:1]
+    return target
+
+
+def winning_plan_stages(explain):
+    """Stage names of every winning plan in an explain result (find, aggregate or write)."""
+    stages = []
+
+    def walk_plan(plan):
+        if isinstance(plan, dict):
+            if "stage" in plan:
+                stages.append(plan["stage"])
+            for key in ("inputStage", "queryPlan"):
+                walk_plan(plan.get(key))
+            for child in plan.get("inputStages", []):
+                walk_plan(child)
+
+    def find_plans(doc):
+        if isinstance(doc, dict):
+            for key, value in doc.items():
+                if key == "winningPlan":
+                    walk_plan(value)
+                else:
+                    find_plans(value)
+        elif isinstance(doc, list):
+            for item in doc:
+                find_plans(item)
+
+    find_plans(explain)
+    return stages
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Per-worker statistics of Mongo commands, grouped by collection, command and query shape.
+
+    Durations come from the driver's command events. Commands slower than
+    MONGO_SLOW_QUERY_MS are kept with the request that issued them. Every
+    EXPLAIN_INTERVAL a background thread explains the shapes with the most
+    total time, using the last command seen for each, and flags plans that
+    scan the whole collection. Query values are never exposed, only field
+    names.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._shapes = {}
+        self._recent_slow = deque(maxlen=RECENT_SLOW)
+        self._db = None
+        self._explainer = None
+        self.since = datetime.now(timezone.utc)
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = command.get("collection")
+        if not isinstance(collection, str):
+            collection = None
+        key = (collection, event.command_name, query_shape(event.command_name, command))
+        sample = _explain_target(event.command_name, command) if event.command_name in EXPLAINABLE_COMMANDS else None
+        self._pending[(event.connection_id, event.request_id)] = (key, event.database_name, sample, current_request_id())
+
+    def _finish(self, event, failed):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        key, database, sample, request_id = pending
+        duration_ms = event.duration_micros / 1000
+        slow = duration_ms >= slow_query_ms()
+        with self._lock:
+            stats = self._shapes.get(key)
+            if stats is None:
+                if len(self._shapes) >= MAX_SHAPES:
+                    return
+                stats = self._shapes[key] = {
+                    "count": 0, "totalMs": 0.0, "maxMs": 0.0, "slowCount": 0, "failures": 0,
+                    "database": database, "sample": None, "plan": None,
+                }
+            stats["count"] += 1
+            stats["totalMs"] += duration_ms
+            stats["maxMs"] = max(stats["maxMs"], duration_ms)
+            stats["failures"] += failed
+            if sample is not None:
+                stats["sample"] = sample
+            if slow:
+                stats["slowCount"] += 1
+                self._recent_slow.append({
+                    "collection": key[0],
+                    "command": key[1],
+                    "shape": key[2],
+                    "durationMs": round(duration_ms, 3),
+                    "requestId": request_id,
+                    "at": datetime.now(timezone.utc),
+                })
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+    def explain_top(self, limit=EXPLAIN_TOP):
+        """Explain the explainable shapes with the most total time and record their plans."""
+        if self._db is None:
+            return 0
+        with self._lock:
+            candidates = sorted(
+                ((key, stats) for key, stats in self._shapes.items() if stats["sample"] is not None),
+                key=lambda item: item[1]["totalMs"],
+                reverse=True,
+            )[:limit]
+            candidates = [(key, stats["database"], stats["sample"]) for key, stats in candidates]
+
+        explained = 0
+        for key, database, sample in candidates:
+            try:
+                result = self._db.client[database].command({"explain": sample, "verbosity": "queryPlanner"})
+            except Exception as e:
+                print("Error explaining query:", e)
+                continue
+            stages = winning_plan_stages(result)
+            with self._lock:
+                if key in self._shapes:
+                    self._shapes[key]["plan"] = {
+                        "stages": stages,
+                        "collscan": "COLLSCAN" in stages,
+                        "explainedAt": datetime.now(timezone.utc),
+                    }
+            explained += 1
+        return explained
+
+    def _run_explainer(self):
+        while True:
+            time.sleep(EXPLAIN_INTERVAL)
+            try:
+                self.explain_top()
+            except Exception as e:
+                print("Error in query explainer:", e)
+
+    def start_explainer(self, db):
+        """Start the periodic explain thread for this worker."""
+        self._db = db
+        if self._explainer is None:
+            self._explainer = threading.Thread(target=self._run_explainer, name="mongo-explain", daemon=True)
+            self._explainer.start()
+
+    def summary(self, limit=50):
+        with self._lock:
+            commands = [
+                {
+                    "collection": key[0],
+                    "command": key[1],
+                    "shape": key[2],
+                    "count": stats["count"],
+                    "totalMs": round(stats["totalMs"], 3),
+                    "avgMs": round(stats["totalMs"] / stats["count"], 3),
+                    "maxMs": round(stats["maxMs"], 3),
+                    "slowCount": stats["slowCount"],
+                    "failures": stats["failures"],
+                    "plan": stats["plan"],
+                }
+                for key, stats in self._shapes.items()
+            ]
+            recent_slow = list(self._recent_slow)
+        commands.sort(key=lambda row: row["totalMs"], reverse=True)
+        return {
+            "since": self.since,
+            "slowQueryMs": slow_query_ms(),
+            "commands": commands[:limit],
+            "collectionScans": [row for row in commands if row["plan"] and row["plan"]["collscan"]],
+            "recentSlow": list(reversed(recent_slow)),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+            self._recent_slow.clear()
+            self.since = datetime.now(timezone.utc)
+
+
+command_monitor = CommandMonitor()
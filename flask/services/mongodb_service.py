@@ -1,8 +1,22 @@
 import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone
+from functools import lru_cache
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson.objectid import ObjectId
 
+from services.prompt_templates import MODEL_SETTING_FIELDS, validate_model_settings, validate_prompt
+from services.text_codec import TextCodec
+from services.mongo_monitor import command_monitor, monitor_enabled
+from utils.tracing import traced
+
+# Mongo error code for a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
 def flatten_dict(d, parent_key="", sep="_"):
     """Recursively flattens nested dictionaries for CSV export."""
     items = []
@@ -15,11 +29,179 @@ def flatten_dict(d, parent_key="", sep="_"):
     return dict(items)
 
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
-client = MongoClient(MONGO_URI)
+# Command timings for /api/admin/mongo-stats (MONGO_MONITOR=false turns them off)
+client = MongoClient(MONGO_URI, event_listeners=[command_monitor] if monitor_enabled() else [])
 db = client["cover_letter_app"]
 collection = db["sessions"]
 
+# Optional compression of large session text fields (COMPRESS_SESSION_TEXT)
+text_codec = TextCodec(db["zstd_dictionaries"])
+
+def ensure_indexes():
+    """Create indexes used by the export and admin queries, and backfill updatedAt.
+
+    The blocks are independent, so a failure in one (e.g. an index options
+    conflict) does not keep the others, above all the unique token index,
+    from being created.
+    """
+    ok = True
+
+    try:
+        db["tokens"].create_index("token", unique=True)
+    except Exception as e:
+        # Most likely pre-existing duplicate tokens. Until they are resolved,
+        # new tokens are not protected against collisions.
+        print("Error creating unique token index:", e)
+        ok = False
+
+    try:
+        db["tokens"].create_index("cohort", sparse=True)
+        db["tokens"].create_index([("created_at", -1), ("_id", -1)])
+        db["tokens"].create_index([("used", 1), ("created_at", -1), ("_id", -1)])
+        db["tokens"].create_index("used_at", sparse=True)
+        db["tokens"].create_index("invalidated_at", sparse=True)
+    except Exception as e:
+        print("Error creating token indexes:", e)
+        ok = False
+
+    try:
+        collection.create_index("updatedAt")
+        collection.create_index("completed")
+        db["progress_log"].create_index("timestamp")
+        db["prompts"].create_index([("promptType", 1), ("version", -1)])
+        db["prompts"].create_index([("promptType", 1), ("contentHash", 1)])
+        # Buckets idle for a day have long refilled; let Mongo drop them
+        db["rate_limits"].create_index("updatedAt", expireAfterSeconds=86400)
+        db["llm_budget"].create_index("expiresAt", expireAfterSeconds=0)
+        db["llm_budget"].create_index("minute")
+        db["profiles"].create_index("createdAt", expireAfterSeconds=7 * 86400)
+    except Exception as e:
+        print("Error ensuring indexes:", e)
+        ok = False
+
+    try:
+        # Sessions created before updatedAt existed fall back to their creation time
+        collection.update_many(
+            {"updatedAt": {"$exists": False}},
+            [{"$set": {"updatedAt": {"$toDate": "$_id"}}}]
+        )
+    except Exception as e:
+        print("Error backfilling updatedAt:", e)
+        ok = False
+
+    return ok
+
+def hash_text(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+# Resumes and job descriptions are stored once in the texts collection,
+# keyed by content hash; sessions hold the hash under these fields
+TEXT_REFERENCES = {"resume": "resumeHash", "job_desc": "jobDescHash"}
+
+# Texts kept in process, mostly job descriptions shared across a cohort
+TEXT_CACHE_SIZE = 256
+
+_text_cache = OrderedDict()
+_text_cache_lock = threading.Lock()
+
+def store_text(content):
+    """Store a text once under its hash if it is not there yet. Returns the hash."""
+    text_hash = hash_text(content)
+    db["texts"].update_one(
+        {"_id": text_hash},
+        {"$setOnInsert": {
+            "content": text_codec.compress(content) if text_codec.enabled else content,
+            "size": len(content.encode("utf-8")),
+            "createdAt": datetime.now(timezone.utc)
+        }},
+        upsert=True
+    )
+    return text_hash
+
+def _cached_text(text_hash):
+    with _text_cache_lock:
+        content = _text_cache.get(text_hash)
+        if content is not None:
+            _text_cache.move_to_end(text_hash)
+        return content
+
+def _fetch_texts(text_hashes):
+    found = {}
+    for doc in db["texts"].find({"_id": {"$in": list(text_hashes)}}):
+        found[doc["_id"]] = text_codec.decode_document(doc)["content"]
+    return found
+
+def get_text(text_hash):
+    """Text for a content hash, through the in-process LRU cache. None if it was never stored."""
+    content = _cached_text(text_hash)
+    if content is None:
+        content = _fetch_texts([text_hash]).get(text_hash)
+        if content is None:
+            print(f"No text stored for {text_hash}")
+            return None
+        with _text_cache_lock:
+            _text_cache[text_hash] = content
+            if len(_text_cache) > TEXT_CACHE_SIZE:
+                _text_cache.popitem(last=False)
+    return content
+
+def session_projection(projection):
+    """Extend a session projection so that asking for resume or job_desc also fetches its reference."""
+    if not projection:
+        return projection
+    references = {ref: 1 for field, ref in TEXT_REFERENCES.items() if projection.get(field)}
+    return {**projection, **references} if references else projection
+
+def hydrate_sessions(docs):
+    """Decode and resolve text references, in place, for a batch of session documents.
+
+    Texts missing from the LRU are fetched with one query per batch and are
+    not added to it, so a full export does not evict the hot entries.
+    """
+    wanted = set()
+    for doc in docs:
+        text_codec.decode_document(doc)
+        for ref in TEXT_REFERENCES.values():
+            if ref in doc:
+                wanted.add(doc[ref])
+
+    texts = {}
+    for text_hash in wanted:
+        content = _cached_text(text_hash)
+        if content is not None:
+            texts[text_hash] = content
+    missing = wanted - texts.keys()
+    if missing:
+        texts.update(_fetch_texts(missing))
+        for text_hash in missing - texts.keys():
+            print(f"No text stored for {text_hash}")
+
+    for doc in docs:
+        for field, ref in TEXT_REFERENCES.items():
+            if ref in doc:
+                doc[field] = texts.get(doc.pop(ref))
+    return docs
+
+def hydrate_session(doc):
+    """Decode and resolve text references, in place, for one session document."""
+    if doc is None:
+        return None
+    text_codec.decode_document(doc)
+    for field, ref in TEXT_REFERENCES.items():
+        if ref in doc:
+            doc[field] = get_text(doc.pop(ref))
+    return doc
+
+def _store_session_texts(data):
+    data = dict(data)
+    for field, ref in TEXT_REFERENCES.items():
+        if isinstance(data.get(field), str):
+            data[ref] = store_text(data.pop(field))
+    return data
+
+@traced("mongo.create_session")
 def create_session(data):
+    data = text_codec.encode_fields({**_store_session_texts(data), "updatedAt": datetime.now(timezone.utc)})
     result = collection.insert_one(data)
     print(f"Started session: {result.inserted_id}")
     return str(result.inserted_id)
@@ -42,6 +224,7 @@ def update_session(doc_id, feedback_payload):
         if not update_fields:
             return None
 
+        update_fields["updatedAt"] = datetime.now(timezone.utc)
         result = collection.update_one(
             {"_id": ObjectId(doc_id)},
             {"$set": update_fields}
@@ -52,14 +235,16 @@ def update_session(doc_id, feedback_payload):
         print("Mongo update error:", e)
         return None
 
-def get_session(session_id):
-    return collection.find_one({"_id": ObjectId(session_id)})
+@traced("mongo.get_session")
+def get_session(session_id, projection=None):
+    return hydrate_session(collection.find_one({"_id": ObjectId(session_id)}, session_projection(projection)))
 
+@traced("mongo.set_fields")
 def set_fields(doc_id, fields: dict):
     try:
         result = collection.update_one(
             {"_id": ObjectId(doc_id)},
-            {"$set": fields}
+            {"$set": {**text_codec.encode_fields(_store_session_texts(fields)), "updatedAt": datetime.now(timezone.utc)}}
         )
         return result
     except Exception as e:
@@ -68,7 +253,7 @@ def set_fields(doc_id, fields: dict):
 
 def get_all_sessions():
     try:
-        sessions = list(collection.find())
+        sessions = hydrate_sessions(list(collection.find()))
         flattened_sessions = []
 
         for s in sessions:
@@ -86,13 +271,81 @@ def get_all_sessions():
         print("Mongo fetch error:", e)
         return []
 
-def create_token(token_str):
-    return db["tokens"].insert_one({
+def get_sessions_changed_between(since, until, projection=None):
+    """Sessions created or modified in the window (since, until]; since=None means from the start."""
+    time_filter = {"$lte": until}
+    if since is not None:
+        time_filter["$gt"] = since
+    return collection.find({"updatedAt": time_filter}, session_projection(projection)).sort("updatedAt", 1)
+
+def get_progress_events_between(since, until):
+    """Progress events logged in the window (since, until]; since=None means from the start."""
+    time_filter = {"$lte": until}
+    if since is not None:
+        time_filter["$gt"] = since
+    return db["progress_log"].find({"timestamp": time_filter}).sort("timestamp", 1)
+
+def get_tokens_changed_between(since, until):
+    """Tokens created, used or invalidated in the window (since, until]."""
+    time_filter = {"$gt": since, "$lte": until}
+    return db["tokens"].find({"$or": [
+        {"created_at": time_filter},
+        {"used_at": time_filter},
+        {"invalidated_at": time_filter}
+    ]})
+
+def _new_token_doc(token_str, cohort=None):
+    doc = {
         "token": token_str,
         "used": False,
         "created_at": datetime.now(timezone.utc),
         "session_id": None
-    })
+    }
+    if cohort:
+        doc["cohort"] = cohort
+    return doc
+
+def create_token(token_str, cohort=None):
+    return db["tokens"].insert_one(_new_token_doc(token_str, cohort))
+
+def create_unique_token(generate_fn, cohort=None, max_attempts=5):
+    """Insert a freshly generated token, regenerating on a unique-index collision."""
+    for _ in range(max_attempts):
+        token_str = generate_fn()
+        try:
+            create_token(token_str, cohort)
+            return token_str
+        except DuplicateKeyError:
+            continue
+    return None
+
+def create_tokens(count, generate_fn, cohort=None, max_rounds=5):
+    """Bulk-insert `count` unique tokens with insert_many.
+
+    Tokens rejected by the unique index are regenerated and retried, up to
+    `max_rounds` rounds. Returns the inserted token documents.
+    """
+    created = []
+    for _ in range(max_rounds):
+        remaining = count - len(created)
+        if remaining <= 0:
+            break
+
+        candidates = set()
+        while len(candidates) < remaining:
+            candidates.add(generate_fn())
+        docs = [_new_token_doc(token_str, cohort) for token_str in candidates]
+
+        try:
+            db["tokens"].insert_many(docs, ordered=False)
+            created.extend(docs)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            failed = {error["index"] for error in errors}
+            created.extend(doc for i, doc in enumerate(docs) if i not in failed)
+    return created
 
 def validate_token(token_str):
     return db["tokens"].find_one({"token": token_str, "used": False})
@@ -110,6 +363,10 @@ def mark_token_used(token, session_id=None):
         {"$set": update_fields}
     )
 
+def token_owns_session(token, session_id):
+    """Whether the session was created with this token (see mark_token_used)."""
+    return db["tokens"].find_one({"token": token, "session_id": session_id}, {"_id": 1}) is not None
+
 def is_valid_token(token: str) -> bool:
     entry = db["tokens"].find_one({
         "token": token, 
@@ -121,6 +378,26 @@ def is_valid_token(token: str) -> bool:
     })
     return entry is not None
 
+def invalidate_tokens(tokens=None, cohort=None):
+    """Invalidate many tokens at once, by explicit list and/or cohort tag. Returns the count."""
+    conditions = []
+    if tokens:
+        conditions.append({"token": {"$in": list(tokens)}})
+    if cohort:
+        conditions.append({"cohort": cohort})
+    if not conditions:
+        return 0
+
+    query = {"$or": conditions, "invalidated": {"$ne": True}}
+    result = db["tokens"].update_many(
+        query,
+        {"$set": {
+            "invalidated": True,
+            "invalidated_at": datetime.now(timezone.utc)
+        }}
+    )
+    return result.modified_count
+
 def get_all_progress_events():
     try:
         events = list(db["progress_log"].find().sort("timestamp", -1))
@@ -133,6 +410,15 @@ def get_all_progress_events():
         print("Mongo fetch error:", e)
         return []
 
+def get_progress_log_version():
+    """Change stamp for the progress log view: newest event id and completed count."""
+    latest = db["progress_log"].find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    return (
+        latest["_id"] if latest else None,
+        collection.count_documents({"completed": True})
+    )
+
+@traced("mongo.log_progress_event")
 def log_progress_event(event_name, session_id=None):
     log_entry = {
         "event_name": event_name,
@@ -143,20 +429,89 @@ def log_progress_event(event_name, session_id=None):
 
     return db["progress_log"].insert_one(log_entry)
 
-def get_all_tokens():
-    try:
-        # Only get tokens that haven't been invalidated
-        tokens = list(db["tokens"].find({"invalidated": {"$ne": True}}).sort("created_at", -1))
-        for token in tokens:
-            token["_id"] = str(token["_id"])
-            if isinstance(token.get("created_at"), datetime):
-                token["created_at"] = token["created_at"].isoformat()
-            if isinstance(token.get("used_at"), datetime):
-                token["used_at"] = token["used_at"].isoformat()
-        return tokens
-    except Exception as e:
-        print("Mongo fetch error:", e)
-        return []
+def token_filter(status=None, created_from=None, created_to=None, has_session=None, prefix=None, cohort=None):
+    """Build the Mongo filter for the admin token listing. Invalidated tokens are always excluded."""
+    query = {"invalidated": {"$ne": True}}
+    if status == "used":
+        query["used"] = True
+    elif status == "unused":
+        query["used"] = False
+    if created_from or created_to:
+        query["created_at"] = {}
+        if created_from:
+            query["created_at"]["$gte"] = created_from
+        if created_to:
+            query["created_at"]["$lt"] = created_to
+    if has_session is True:
+        query["session_id"] = {"$ne": None}
+    elif has_session is False:
+        query["session_id"] = None
+    if prefix:
+        query["token"] = {"$regex": "^" + re.escape(prefix)}
+    if cohort:
+        query["cohort"] = cohort
+    return query
+
+def list_tokens(query, limit=None, after=None):
+    """List tokens newest first, keyset-paginated on (created_at, _id).
+
+    `after` is the (created_at, _id) of the last token on the previous page.
+    Returns the page and the key to pass as `after` for the next one, or
+    None when there are no more tokens.
+    """
+    if after is not None:
+        created_at, last_id = after
+        query = {"$and": [query, {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}}
+        ]}]}
+
+    cursor = db["tokens"].find(query).sort([("created_at", -1), ("_id", -1)])
+    if limit:
+        # One extra document tells us whether another page exists
+        cursor = cursor.limit(limit + 1)
+    tokens = list(cursor)
+
+    next_key = None
+    if limit and len(tokens) > limit:
+        tokens = tokens[:limit]
+        next_key = (tokens[-1]["created_at"], tokens[-1]["_id"])
+
+    for token in tokens:
+        token["_id"] = str(token["_id"])
+        if isinstance(token.get("created_at"), datetime):
+            token["created_at"] = token["created_at"].isoformat()
+        if isinstance(token.get("used_at"), datetime):
+            token["used_at"] = token["used_at"].isoformat()
+    return tokens, next_key
+
+def count_tokens_by_status(query):
+    """Total, used and unused counts for a token filter, in a single aggregation."""
+    result = list(db["tokens"].aggregate([
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "used": {"$sum": {"$cond": [{"$eq": ["$used", True]}, 1, 0]}}
+        }}
+    ]))
+    if not result:
+        return {"total": 0, "used": 0, "unused": 0}
+    return {"total": result[0]["total"], "used": result[0]["used"], "unused": result[0]["total"] - result[0]["used"]}
+
+def _latest_value(coll, field):
+    doc = coll.find_one({field: {"$exists": True}}, {field: 1}, sort=[(field, -1)])
+    return doc[field] if doc else None
+
+def get_tokens_version():
+    """Change stamp for the token listing: count, newest token and latest use/invalidation."""
+    tokens = db["tokens"]
+    return (
+        tokens.estimated_document_count(),
+        _latest_value(tokens, "_id"),
+        _latest_value(tokens, "used_at"),
+        _latest_value(tokens, "invalidated_at")
+    )
 
 def invalidate_token(token_str):
     try:
@@ -173,6 +528,54 @@ def invalidate_token(token_str):
         return False
 
 # Prompt Management Functions
+#
+# Prompt bodies live once in prompt_bodies, keyed by the sha256 of their
+# content. Version documents in prompts carry contentHash and size instead
+# of the text, so listing history never moves the templates themselves.
+
+def _store_prompt_body(content):
+    """Store a prompt body under its hash if it is not there yet. Returns (hash, size)."""
+    content_hash = hash_text(content)
+    size = len(content.encode("utf-8"))
+    db["prompt_bodies"].update_one(
+        {"_id": content_hash},
+        {"$setOnInsert": {"content": content, "size": size, "createdAt": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return content_hash, size
+
+@lru_cache(maxsize=256)
+def get_prompt_body(content_hash):
+    """Prompt text for a content hash. Bodies never change, so lookups are cached."""
+    body = db["prompt_bodies"].find_one({"_id": content_hash}, {"content": 1})
+    if not body:
+        raise LookupError(f"No prompt body stored for {content_hash}")
+    return body["content"]
+
+def _prompt_content(prompt):
+    # Versions saved before migrate_prompt_bodies ran still hold their text inline
+    if "content" in prompt:
+        return prompt["content"]
+    return get_prompt_body(prompt["contentHash"])
+
+def migrate_prompt_bodies():
+    """Move inline prompt content into prompt_bodies, leaving contentHash and size behind."""
+    try:
+        migrated = 0
+        for prompt in db["prompts"].find({"content": {"$exists": True}}):
+            content_hash, size = _store_prompt_body(prompt["content"])
+            db["prompts"].update_one(
+                {"_id": prompt["_id"]},
+                {"$set": {"contentHash": content_hash, "size": size}, "$unset": {"content": ""}}
+            )
+            migrated += 1
+        if migrated:
+            print(f"Moved {migrated} prompt versions to content-addressed storage")
+        return True
+    except Exception as e:
+        print("Error migrating prompt bodies:", e)
+        return False
+
 def get_active_prompt(prompt_type):
     """Get the active prompt for a given type."""
     try:
@@ -180,11 +583,14 @@ def get_active_prompt(prompt_type):
             "promptType": prompt_type,
             "isActive": True
         })
+        if prompt:
+            prompt["content"] = _prompt_content(prompt)
         return prompt
     except Exception as e:
         print(f"Error fetching active prompt for {prompt_type}:", e)
         return None
 
+@traced("mongo.get_prompt")
 def get_active_prompt_with_version(prompt_type):
     """Get the active prompt for a given type with version info."""
     try:
@@ -194,17 +600,29 @@ def get_active_prompt_with_version(prompt_type):
         })
         if prompt:
             return {
-                "content": prompt["content"],
+                "content": _prompt_content(prompt),
                 "version": prompt["version"],
-                "prompt_type": prompt["promptType"]
+                "prompt_type": prompt["promptType"],
+                "settings": {field: prompt.get(field) for field in MODEL_SETTING_FIELDS}
             }
         return None
     except Exception as e:
         print(f"Error fetching active prompt for {prompt_type}:", e)
         return None
 
-def create_prompt(prompt_type, content, modified_by="system"):
-    """Create a new prompt version."""
+def create_prompt(prompt_type, content, modified_by="system", settings=None):
+    """Create a new prompt version.
+
+    `settings` holds the version's model settings (model, temperature,
+    maxTokens, timeout); when omitted they are carried over from the
+    latest version. Raises PromptTemplateError if the template does not
+    compile, uses placeholders the prompt type is not rendered with, or
+    the settings are invalid.
+    """
+    validate_prompt(prompt_type, content)
+    if settings is not None:
+        settings = validate_model_settings(settings)
+
     try:
         # Get the current highest version number
         latest = db["prompts"].find_one(
@@ -212,6 +630,8 @@ def create_prompt(prompt_type, content, modified_by="system"):
             sort=[("version", -1)]
         )
         next_version = (latest["version"] + 1) if latest else 1
+        if settings is None:
+            settings = {field: latest[field] for field in MODEL_SETTING_FIELDS if latest and field in latest}
         
         # Deactivate previous versions
         db["prompts"].update_many(
@@ -219,14 +639,18 @@ def create_prompt(prompt_type, content, modified_by="system"):
             {"$set": {"isActive": False}}
         )
         
+        content_hash, size = _store_prompt_body(content)
+        
         # Create new version
         prompt_doc = {
             "promptType": prompt_type,
-            "content": content,
+            "contentHash": content_hash,
+            "size": size,
             "version": next_version,
             "createdAt": datetime.now(timezone.utc),
             "modifiedBy": modified_by,
-            "isActive": True
+            "isActive": True,
+            **settings
         }
         
         result = db["prompts"].insert_one(prompt_doc)
@@ -241,6 +665,7 @@ def get_all_prompts():
         prompts = list(db["prompts"].find({"isActive": True}))
         for prompt in prompts:
             prompt["_id"] = str(prompt["_id"])
+            prompt["content"] = _prompt_content(prompt)
             if isinstance(prompt.get("createdAt"), datetime):
                 prompt["createdAt"] = prompt["createdAt"].isoformat()
         return prompts
@@ -249,10 +674,11 @@ def get_all_prompts():
         return []
 
 def get_prompt_history(prompt_type):
-    """Get version history for a specific prompt type."""
+    """Get version metadata for a specific prompt type, without prompt content."""
     try:
         history = list(db["prompts"].find(
-            {"promptType": prompt_type}
+            {"promptType": prompt_type},
+            {"content": 0}
         ).sort("version", -1))
         
         for prompt in history:
@@ -264,12 +690,55 @@ def get_prompt_history(prompt_type):
         print(f"Error fetching prompt history for {prompt_type}:", e)
         return []
 
-def update_prompt(prompt_type, content, modified_by="admin"):
+def get_prompt_version(prompt_type, version):
+    """Get one prompt version including its content, or None if it does not exist."""
+    try:
+        prompt = db["prompts"].find_one({"promptType": prompt_type, "version": version})
+        if not prompt:
+            return None
+        prompt["_id"] = str(prompt["_id"])
+        prompt["content"] = _prompt_content(prompt)
+        if isinstance(prompt.get("createdAt"), datetime):
+            prompt["createdAt"] = prompt["createdAt"].isoformat()
+        return prompt
+    except Exception as e:
+        print(f"Error fetching prompt {prompt_type} version {version}:", e)
+        return None
+
+def get_prompts_version():
+    """Change stamp for the active prompts: version count plus each active type and version."""
+    active = db["prompts"].find({"isActive": True}, {"_id": 0, "promptType": 1, "version": 1})
+    return (
+        db["prompts"].count_documents({}),
+        sorted((p["promptType"], p["version"]) for p in active)
+    )
+
+def get_prompt_history_version(prompt_type):
+    """Change stamp for one prompt type's history: count, latest and active version."""
+    query = {"promptType": prompt_type}
+    latest = db["prompts"].find_one(query, {"version": 1}, sort=[("version", -1)])
+    active = db["prompts"].find_one({**query, "isActive": True}, {"version": 1})
+    return (
+        db["prompts"].count_documents(query),
+        latest["version"] if latest else None,
+        active["version"] if active else None
+    )
+
+def update_prompt(prompt_type, content, modified_by="admin", settings=None):
     """Update a prompt, creating a new version."""
-    return create_prompt(prompt_type, content, modified_by)
+    return create_prompt(prompt_type, content, modified_by, settings)
 
 def revert_prompt(prompt_type, target_version, modified_by="admin"):
-    """Revert to a specific version by reactivating it."""
+    """Revert to a specific version by reactivating it.
+
+    Raises PromptTemplateError if the target version's template is invalid.
+    """
+    target = db["prompts"].find_one({"promptType": prompt_type, "version": target_version})
+    if not target:
+        print(f"No prompt found with type {prompt_type} and version {target_version}")
+        return False
+    validate_prompt(prompt_type, _prompt_content(target))
+
     try:
         # First, deactivate all versions of this prompt type
         db["prompts"].update_many(
@@ -293,10 +762,9 @@ def revert_prompt(prompt_type, target_version, modified_by="admin"):
         print(f"Error reverting prompt {prompt_type} to version {target_version}:", e)
         return False
 
-def initialize_default_prompts(force_update=False):
-    """Initialize default prompts if they don't exist."""
-    default_prompts = {
-        "control": """Based on the following resume and job description, generate a professional profile statement (1-2 paragraphs) that highlights relevant experience and skills. Focus on creating a compelling narrative that connects the candidate's background to the specific role requirements.
+# Seeded on first start; admins edit later versions from the dashboard
+DEFAULT_PROMPTS = {
+    "control": """Based on the following resume and job description, generate a professional profile statement (1-2 paragraphs) that highlights relevant experience and skills. Focus on creating a compelling narrative that connects the candidate's background to the specific role requirements.
 
 Variables available:
 - {resume} - User's resume content
@@ -304,7 +772,7 @@ Variables available:
 
 Generate a profile that sounds professional and polished, representing how an AI would typically interpret and present this candidate's qualifications.""",
 
-        "bse_generation": """Generate 3 bullet points from this resume that demonstrate self-efficacy experiences relevant to this job. Focus on Bandura's Self-Efficacy theory components:
+    "bse_generation": """Generate 3 bullet points from this resume that demonstrate self-efficacy experiences relevant to this job. Focus on Bandura's Self-Efficacy theory components:
 
 1. Mastery experiences (successful performance accomplishments)
 2. Vicarious experiences (observing others succeed) 
@@ -347,7 +815,7 @@ Resume:
 Job Description:
 {jobDescription}""",
 
-        "regeneration": """The user rated this bullet {rating}/7 and provided this feedback: '{feedback}'. 
+    "regeneration": """The user rated this bullet {rating}/7 and provided this feedback: '{feedback}'. 
 
 Revise the bullet to better represent their self-concept while maintaining BSE theory focus. Consider:
 - User's specific feedback and concerns
@@ -373,7 +841,7 @@ Return your response as JSON in this exact format:
 
 Generate an improved bullet that addresses the user's feedback while staying true to their authentic self-representation.""",
 
-        "final_synthesis": """Create a final professional profile (1-2 paragraphs) using the refined bullets and user feedback from the collaborative alignment process. 
+    "final_synthesis": """Create a final professional profile (1-2 paragraphs) using the refined bullets and user feedback from the collaborative alignment process. 
 
 Synthesize the iterative refinement into an authentic representation that:
 - Incorporates insights from all bullet iterations
@@ -389,25 +857,29 @@ Variables available:
 - {jobDescription} - Target job description
 
 Generate a profile that feels authentic to the user while professionally presenting their qualifications for this role."""
-    }
+}
+
+def initialize_default_prompts(force_update=False):
+    """Initialize default prompts if they don't exist."""
     
     try:
-        for prompt_type, content in default_prompts.items():
+        for prompt_type, content in DEFAULT_PROMPTS.items():
             if force_update:
                 # Force create new version regardless of existing content
                 create_prompt(prompt_type, content, "system_force_update")
                 print(f"Force updated default prompt for {prompt_type}")
             else:
-                existing = db["prompts"].find_one({"promptType": prompt_type})
+                existing = db["prompts"].find_one({"promptType": prompt_type}, {"_id": 1})
                 if not existing:
                     create_prompt(prompt_type, content, "system")
                     print(f"Initialized default prompt for {prompt_type}")
-                else:
-                    # Update existing prompt if content has changed
-                    active_prompt = db["prompts"].find_one({"promptType": prompt_type, "isActive": True})
-                    if active_prompt and active_prompt["content"] != content:
-                        create_prompt(prompt_type, content, "system_update")
-                        print(f"Updated default prompt for {prompt_type}")
+                elif not db["prompts"].find_one(
+                    {"promptType": prompt_type, "contentHash": hash_text(content)},
+                    {"_id": 1}
+                ):
+                    # Only a default that no version has ever had becomes a new version
+                    create_prompt(prompt_type, content, "system_update")
+                    print(f"Updated default prompt for {prompt_type}")
         return True
     except Exception as e:
         print("Error initializing default prompts:", e)
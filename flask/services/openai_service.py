@@ -2,13 +2,71 @@ import langchain_openai as lcai
 import os
 import json
 import re
+import threading
 from services.mongodb_service import get_active_prompt, get_active_prompt_with_version
+from services.prompt_templates import compile_prompt
+from services.llm_scheduler import llm_scheduler, PARTICIPANT, ADMIN, QueueTimeoutError
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.tracing import span, traced
+
+# Model used when a prompt version does not name one
+DEFAULT_MODEL = "gpt-4o"
 
 llmchat = lcai.ChatOpenAI(
     openai_api_key=os.getenv("PLATFORM_OPENAI_KEY"),
-    model_name="gpt-4o",
+    model_name=DEFAULT_MODEL,
 )
 
+# Shared by all generation calls in this worker: after repeated failures or
+# very slow responses, calls fail fast instead of queueing up behind OpenAI
+openai_breaker = CircuitBreaker("OpenAI", window=20, min_calls=5, failure_rate=0.5, slow_call_seconds=45, open_seconds=30)
+
+# Configured clients keyed by (model, temperature, maxTokens, timeout)
+_chat_clients = {(DEFAULT_MODEL, None, None, None): llmchat}
+_chat_clients_lock = threading.Lock()
+
+def generation_settings(prompt_doc):
+    """Effective model settings for an active prompt; unset values use the client defaults."""
+    settings = prompt_doc.get("settings") or {}
+    return {
+        "model": settings.get("model") or DEFAULT_MODEL,
+        "temperature": settings.get("temperature"),
+        "maxTokens": settings.get("maxTokens"),
+        "timeout": settings.get("timeout"),
+    }
+
+def get_chat_client(settings):
+    """Shared chat client for a set of generation settings, created on first use."""
+    key = (settings["model"], settings["temperature"], settings["maxTokens"], settings["timeout"])
+    client = _chat_clients.get(key)
+    if client is None:
+        with _chat_clients_lock:
+            client = _chat_clients.get(key)
+            if client is None:
+                options = {"openai_api_key": os.getenv("PLATFORM_OPENAI_KEY"), "model_name": settings["model"]}
+                if settings["temperature"] is not None:
+                    options["temperature"] = settings["temperature"]
+                if settings["maxTokens"] is not None:
+                    options["max_tokens"] = settings["maxTokens"]
+                if settings["timeout"] is not None:
+                    options["timeout"] = settings["timeout"]
+                client = _chat_clients[key] = lcai.ChatOpenAI(**options)
+    return client
+
+def invoke_chat(settings, prompt, priority=PARTICIPANT):
+    """Send a prompt once the shared OpenAI budget allows it, through the circuit breaker."""
+    # While the circuit is open, refuse before queueing for budget
+    openai_breaker.check()
+    client = get_chat_client(settings)
+    with span("llm.invoke", model=settings["model"]):
+        return llm_scheduler.run(
+            lambda text: openai_breaker.call(client.invoke, text),
+            prompt,
+            settings["model"],
+            max_tokens=settings["maxTokens"],
+            priority=priority
+        )
+
 # Extract and parse JSON from chat completion
 def extract_and_parse(json_string):
     match = re.search(r"```json\n(.*?)\n```", json_string, re.DOTALL)
@@ -25,20 +83,24 @@ def generate_control_profile(resume, job_description):
         if not prompt_doc:
             raise ValueError("No active control prompt found in database")
         
-        prompt_template = prompt_doc["content"]
+        prompt_template = compile_prompt(prompt_doc["content"])
         
         # Substitute variables in the prompt
-        prompt = prompt_template.format(
+        prompt = prompt_template.render(
             resume=resume,
             jobDescription=job_description
         )
         
-        response = llmchat.invoke(prompt)
+        settings = generation_settings(prompt_doc)
+        response = invoke_chat(settings, prompt)
         return {
             "content": response.content.strip(),
             "prompt_version": prompt_doc["version"],
-            "prompt_type": prompt_doc["prompt_type"]
+            "prompt_type": prompt_doc["prompt_type"],
+            "generation_settings": settings
         }
+    except (CircuitOpenError, QueueTimeoutError):
+        raise
     except Exception as e:
         print("Error generating control profile:", e)
         return None
@@ -52,24 +114,29 @@ def generate_bse_bullets(resume, job_description):
         if not prompt_doc:
             raise ValueError("No active BSE generation prompt found in database")
         
-        prompt_template = prompt_doc["content"]
+        prompt_template = compile_prompt(prompt_doc["content"])
         
         # Substitute variables in the prompt
-        prompt = prompt_template.format(
+        prompt = prompt_template.render(
             resume=resume,
             jobDescription=job_description
         )
         
-        response = llmchat.invoke(prompt)
+        settings = generation_settings(prompt_doc)
+        response = invoke_chat(settings, prompt)
         return {
             "content": response.content.strip(),
             "prompt_version": prompt_doc["version"],
-            "prompt_type": prompt_doc["prompt_type"]
+            "prompt_type": prompt_doc["prompt_type"],
+            "generation_settings": settings
         }
+    except (CircuitOpenError, QueueTimeoutError):
+        raise
     except Exception as e:
         print("Error generating BSE bullets:", e)
         return None
 
+@traced("parse.bse_bullets")
 def parse_bse_bullets_response(response_text):
     """Parse BSE bullets response and extract bullets with rationales."""
     try:
@@ -106,7 +173,7 @@ def regenerate_bullet(bullet_text, rationale, user_rating, user_feedback, iterat
         if not prompt_doc:
             raise ValueError("No active regeneration prompt found in database")
         
-        prompt_template = prompt_doc["content"]
+        prompt_template = compile_prompt(prompt_doc["content"])
         
         # Prepare iteration history string
         history_str = ""
@@ -119,7 +186,7 @@ def regenerate_bullet(bullet_text, rationale, user_rating, user_feedback, iterat
             history_str += "\n"
         
         # Substitute variables in the prompt
-        prompt = prompt_template.format(
+        prompt = prompt_template.render(
             bulletText=bullet_text,
             rationale=rationale,
             rating=user_rating,
@@ -127,16 +194,21 @@ def regenerate_bullet(bullet_text, rationale, user_rating, user_feedback, iterat
             iterationHistory=history_str
         )
         
-        response = llmchat.invoke(prompt)
+        settings = generation_settings(prompt_doc)
+        response = invoke_chat(settings, prompt)
         return {
             "content": response.content.strip(),
             "prompt_version": prompt_doc["version"],
-            "prompt_type": prompt_doc["prompt_type"]
+            "prompt_type": prompt_doc["prompt_type"],
+            "generation_settings": settings
         }
+    except (CircuitOpenError, QueueTimeoutError):
+        raise
     except Exception as e:
         print("Error regenerating bullet:", e)
         return None
 
+@traced("parse.regenerated_bullet")
 def parse_regenerated_bullet_response(response_text):
     """Parse regenerated bullet response and extract bullet with rationale."""
     try:
@@ -158,66 +230,35 @@ def parse_regenerated_bullet_response(response_text):
         raise ValueError("Failed to parse regenerated bullet response")
 
 # Aligned Profile Generation for v1.5
-def generate_aligned_profile(resume, job_description, bullet_iterations_data, original_profile=""):
-    """Generate aligned profile using bullet iterations data and configurable prompt from database."""
+def generate_aligned_profile(resume, job_description, feedback_digest, original_profile=""):
+    """Generate aligned profile from the session's feedback digest and configurable prompt from database."""
     try:
         # Get the active final synthesis prompt from the database
         prompt_doc = get_active_prompt_with_version("final_synthesis")
         if not prompt_doc:
             raise ValueError("No active final synthesis prompt found in database")
         
-        prompt_template = prompt_doc["content"]
-        
-        # Prepare final bullets summary
-        final_bullets = ""
-        all_feedback = ""
-        
-        for bullet_data in bullet_iterations_data:
-            bullet_index = bullet_data.get("bulletIndex", 0)
-            iterations = bullet_data.get("iterations", [])
-            final_iteration = bullet_data.get("finalIteration")
-            
-            # Get the final iteration or the last one
-            if final_iteration is not None:
-                final_iter = next((iter for iter in iterations if iter.get('iterationNumber') == final_iteration), None)
-            else:
-                final_iter = iterations[-1] if iterations else None
-            
-            if final_iter:
-                final_bullets += f"Bullet {bullet_index + 1}: {final_iter.get('bulletText', '')}\n"
-                final_bullets += f"Rationale: {final_iter.get('rationale', '')}\n\n"
-        
-        # Prepare all feedback summary
-        for bullet_data in bullet_iterations_data:
-            bullet_index = bullet_data.get("bulletIndex", 0)
-            iterations = bullet_data.get("iterations", [])
-            
-            all_feedback += f"Bullet {bullet_index + 1} feedback:\n"
-            
-            # Show iteration progression with feedback
-            for i, iteration in enumerate(iterations):
-                if iteration.get('userRating') is not None:
-                    all_feedback += f"  Rating: {iteration.get('userRating', 'N/A')}/7\n"
-                if iteration.get('userFeedback'):
-                    all_feedback += f"  Feedback: \"{iteration.get('userFeedback')}\"\n"
-            
-            all_feedback += "\n"
+        prompt_template = compile_prompt(prompt_doc["content"])
         
         # Substitute variables in the prompt
-        prompt = prompt_template.format(
+        prompt = prompt_template.render(
             resume=resume,
             jobDescription=job_description,
-            finalBullets=final_bullets,
-            allFeedback=all_feedback,
+            finalBullets=feedback_digest["finalBullets"],
+            allFeedback=feedback_digest["allFeedback"],
             originalProfile=original_profile
         )
         
-        response = llmchat.invoke(prompt)
+        settings = generation_settings(prompt_doc)
+        response = invoke_chat(settings, prompt)
         return {
             "content": response.content.strip(),
             "prompt_version": prompt_doc["version"],
-            "prompt_type": prompt_doc["prompt_type"]
+            "prompt_type": prompt_doc["prompt_type"],
+            "generation_settings": settings
         }
+    except (CircuitOpenError, QueueTimeoutError):
+        raise
     except Exception as e:
         print("Error generating aligned profile:", e)
         return None
@@ -227,8 +268,10 @@ def check_openai_health():
     Sends a minimal request to the OpenAI model to check availability.
     """
     try:
-        response = llmchat.invoke("ping")
+        response = llm_scheduler.run(llmchat.invoke, "ping", DEFAULT_MODEL, max_tokens=16, priority=ADMIN, timeout=5)
         return "ok" if response.content.strip() else "error"
+    except QueueTimeoutError:
+        return "busy"
     except Exception as e:
         print("OpenAI health check failed:", e)
         return "error"
\ No newline at end of file
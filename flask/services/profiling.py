@@ -0,0 +1,198 @@
+import cProfile
+import marshal
+import pstats
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from bson.binary import Binary
+from flask import g, request
+
+from services.mongodb_service import db
+from utils.tracing import current_request_id
+
+profiler_settings = db["profiler_config"]
+profiles = db["profiles"]
+
+# How long a worker keeps using the profiling settings before re-reading them
+SETTINGS_TTL = 5
+
+# Profiling switches itself off after this long unless told otherwise
+DEFAULT_DURATION_MINUTES = 30
+
+DEFAULT_TOP_N = 30
+MAX_TOP_N = 200
+
+# Only these URL prefixes are profiled
+PROFILED_PREFIXES = ("/lab/", "/api/admin/")
+
+# Never profiled: the profiler's own routes and the long-lived event stream
+EXCLUDED_ENDPOINTS = {
+    "admin.get_profiling",
+    "admin.update_profiling",
+    "admin.delete_profiles_endpoint",
+    "admin.get_profile_endpoint",
+    "admin.download_profile",
+    "admin.event_stream",
+}
+
+_settings = None
+_settings_checked = None
+
+# cProfile cannot run in two threads of a process at once, so one request
+# per worker is profiled at a time and the others are skipped
+_profiler_lock = threading.Lock()
+
+
+def get_profiling_settings():
+    """Current settings, with "enabled" turned off once they have expired."""
+    doc = profiler_settings.find_one({"_id": "settings"}, {"_id": 0}) or {"enabled": False}
+    expires_at = doc.get("expiresAt")
+    if expires_at and expires_at.replace(tzinfo=timezone.utc) <= datetime.now(timezone.utc):
+        doc["enabled"] = False
+    return doc
+
+
+def update_profiling_settings(enabled, sample_rate=1.0, endpoint=None, top_n=DEFAULT_TOP_N,
+                              duration_minutes=DEFAULT_DURATION_MINUTES):
+    """Store new settings. Raises ValueError for out-of-range values."""
+    if not 0 < sample_rate <= 1:
+        raise ValueError("sampleRate must be greater than 0 and at most 1")
+    if not 1 <= top_n <= MAX_TOP_N:
+        raise ValueError(f"topN must be between 1 and {MAX_TOP_N}")
+    if duration_minutes <= 0:
+        raise ValueError("durationMinutes must be positive")
+
+    settings = {
+        "enabled": bool(enabled),
+        "sampleRate": sample_rate,
+        "endpoint": endpoint or None,
+        "topN": top_n,
+        "expiresAt": datetime.now(timezone.utc) + timedelta(minutes=duration_minutes),
+        "updatedAt": datetime.now(timezone.utc),
+    }
+    profiler_settings.replace_one({"_id": "settings"}, settings, upsert=True)
+    _reset_cache()
+    return settings
+
+
+def _reset_cache():
+    global _settings_checked
+    _settings_checked = None
+
+
+def _cached_settings():
+    global _settings, _settings_checked
+    now = time.monotonic()
+    if _settings_checked is None or now - _settings_checked > SETTINGS_TTL:
+        try:
+            _settings = get_profiling_settings()
+        except Exception as e:
+            print("Error loading profiling settings:", e)
+            _settings = {"enabled": False}
+        _settings_checked = now
+    return _settings
+
+
+def _should_profile(settings):
+    if not settings.get("enabled") or not request.path.startswith(PROFILED_PREFIXES):
+        return False
+    if request.endpoint in EXCLUDED_ENDPOINTS:
+        return False
+    endpoint = settings.get("endpoint")
+    # Either the Flask endpoint name or a path prefix
+    if endpoint and request.endpoint != endpoint and not request.path.startswith(endpoint):
+        return False
+    return random.random() < settings.get("sampleRate", 1.0)
+
+
+def top_functions(stats, top_n):
+    """The top_n functions by cumulative time from a pstats.Stats."""
+    rows = []
+    for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": function,
+            "file": filename,
+            "line": line,
+            "calls": calls,
+            "totalTime": round(total, 6),
+            "cumulativeTime": round(cumulative, 6),
+        })
+    rows.sort(key=lambda row: row["cumulativeTime"], reverse=True)
+    return rows[:top_n]
+
+
+def _start_profile():
+    settings = _cached_settings()
+    if not settings.get("enabled") or not _should_profile(settings):
+        return
+    if not _profiler_lock.acquire(blocking=False):
+        return
+    g.profiler = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profile_top_n = settings.get("topN", DEFAULT_TOP_N)
+    g.profiler.enable()
+
+
+def _record_status(response):
+    if "profiler" in g:
+        g.profile_status = response.status_code
+    return response
+
+
+def _finish_profile(error=None):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return
+    try:
+        profiler.disable()
+        duration = time.perf_counter() - g.profile_started
+        stats = pstats.Stats(profiler)
+        profiles.insert_one({
+            "requestId": current_request_id(),
+            "method": request.method,
+            "path": request.path,
+            "endpoint": request.endpoint,
+            "status": g.get("profile_status", 500),
+            "error": repr(error) if error else None,
+            "durationMs": round(duration * 1000, 2),
+            "createdAt": datetime.now(timezone.utc),
+            "top": top_functions(stats, g.profile_top_n),
+            # The full pstats data, as written by Stats.dump_stats
+            "stats": Binary(zlib.compress(marshal.dumps(stats.stats))),
+        })
+    except Exception as e:
+        print("Error saving request profile:", e)
+    finally:
+        _profiler_lock.release()
+
+
+def init_profiling(app):
+    """Profile sampled requests while profiling is enabled from the admin API.
+
+    While disabled each request costs a cached settings lookup. Streamed
+    responses are profiled up to the point the view returns.
+    """
+    app.before_request(_start_profile)
+    app.after_request(_record_status)
+    app.teardown_request(_finish_profile)
+
+
+def list_profiles(limit=50):
+    return list(profiles.find({}, {"stats": 0, "top": 0}).sort("createdAt", -1).limit(limit))
+
+
+def get_profile(profile_id):
+    return profiles.find_one({"_id": profile_id}, {"stats": 0})
+
+
+def get_profile_stats(profile_id):
+    """pstats file contents for a profile, loadable with pstats or snakeviz; None if not found."""
+    doc = profiles.find_one({"_id": profile_id}, {"stats": 1})
+    return zlib.decompress(doc["stats"]) if doc else None
+
+
+def delete_profiles():
+    return profiles.delete_many({}).deleted_count
@@ -0,0 +1,113 @@
+import string
+from functools import lru_cache
+
+# Placeholders each prompt type is rendered with in openai_service.py
+PROMPT_VARIABLES = {
+    "control": {"resume", "jobDescription"},
+    "bse_generation": {"resume", "jobDescription"},
+    "regeneration": {"bulletText", "rationale", "rating", "feedback", "iterationHistory"},
+    "final_synthesis": {"resume", "jobDescription", "finalBullets", "allFeedback", "originalProfile"},
+}
+
+# Per-version model settings stored on prompt documents; unset ones use the defaults
+MODEL_SETTING_FIELDS = ("model", "temperature", "maxTokens", "timeout")
+
+_formatter = string.Formatter()
+
+
+class PromptTemplateError(ValueError):
+    """Raised when a prompt template cannot be parsed or uses unknown placeholders."""
+
+
+class CompiledPrompt:
+    """A prompt template parsed once into literal text and placeholder slots."""
+
+    __slots__ = ("parts", "placeholders")
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.placeholders = frozenset(field for _, field in parts if field is not None)
+
+    def render(self, **values):
+        try:
+            return "".join(
+                literal if field is None else literal + str(values[field])
+                for literal, field in self.parts
+            )
+        except KeyError as e:
+            raise PromptTemplateError(f"No value supplied for placeholder {{{e.args[0]}}}")
+
+
+@lru_cache(maxsize=64)
+def compile_prompt(content):
+    """Parse a str.format-style template into a CompiledPrompt.
+
+    Only plain named placeholders like {resume} are allowed; literal braces
+    must be doubled. Results are cached, so the hot path only parses each
+    distinct template once.
+    """
+    parts = []
+    try:
+        for literal, field, format_spec, conversion in _formatter.parse(content):
+            if field is None:
+                parts.append((literal, None))
+                continue
+            if not field.isidentifier():
+                raise PromptTemplateError(
+                    f"Invalid placeholder {{{field}}}: use a plain name, and double literal braces as {{{{ }}}}"
+                )
+            if format_spec or conversion:
+                raise PromptTemplateError(f"Placeholder {{{field}}} cannot use a conversion or format spec")
+            parts.append((literal, field))
+    except ValueError as e:
+        if isinstance(e, PromptTemplateError):
+            raise
+        raise PromptTemplateError(f"Invalid template syntax: {e}. Literal braces must be doubled as {{{{ }}}}")
+    return CompiledPrompt(tuple(parts))
+
+
+def validate_prompt(prompt_type, content):
+    """Compile a template and check its placeholders against the prompt type's variables.
+
+    Returns the CompiledPrompt, or raises PromptTemplateError describing the
+    problem. Unknown prompt types are only checked for syntax.
+    """
+    compiled = compile_prompt(content)
+    allowed = PROMPT_VARIABLES.get(prompt_type)
+    if allowed is not None:
+        unknown = compiled.placeholders - allowed
+        if unknown:
+            raise PromptTemplateError(
+                f"Unknown placeholders for {prompt_type}: "
+                + ", ".join(f"{{{name}}}" for name in sorted(unknown))
+                + ". Allowed: "
+                + ", ".join(f"{{{name}}}" for name in sorted(allowed))
+            )
+    return compiled
+
+
+def validate_model_settings(settings):
+    """Check per-prompt model settings and return them with unset values dropped.
+
+    Raises PromptTemplateError for unknown fields or out-of-range values.
+    """
+    if not isinstance(settings, dict):
+        raise PromptTemplateError("settings must be an object")
+    unknown = set(settings) - set(MODEL_SETTING_FIELDS)
+    if unknown:
+        raise PromptTemplateError("Unknown settings: " + ", ".join(sorted(unknown)))
+
+    cleaned = {key: value for key, value in settings.items() if value is not None and value != ""}
+    model = cleaned.get("model")
+    if model is not None and (not isinstance(model, str) or not model.strip()):
+        raise PromptTemplateError("model must be a model name")
+    temperature = cleaned.get("temperature")
+    if temperature is not None and (isinstance(temperature, bool) or not isinstance(temperature, (int, float)) or not 0 <= temperature <= 2):
+        raise PromptTemplateError("temperature must be between 0 and 2")
+    max_tokens = cleaned.get("maxTokens")
+    if max_tokens is not None and (isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens < 1):
+        raise PromptTemplateError("maxTokens must be a positive integer")
+    timeout = cleaned.get("timeout")
+    if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0):
+        raise PromptTemplateError("timeout must be a positive number of seconds")
+    return cleaned
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import zstandard as zstd
+from bson.binary import Binary
+
+# BSON binary subtype (user-defined range) marking a zstd frame of UTF-8 text
+COMPRESSED_SUBTYPE = 0x80
+
+COMPRESSION_LEVEL = 3
+
+# Shorter strings are left as plain text; the frame overhead is not worth it
+MIN_COMPRESS_BYTES = 256
+
+# Size of newly trained dictionaries
+DICTIONARY_SIZE = 64 * 1024
+
+# How long a worker keeps using the active dictionary before checking
+# whether it has been rotated
+ACTIVE_DICTIONARY_TTL = 60
+
+# Session fields holding large free text. Lists are walked through, so
+# "bulletIterations" covers every bullet and every iteration in it.
+COMPRESSED_FIELDS = {
+    "resume": True,
+    "job_desc": True,
+    "controlProfile": {"text": True},
+    "alignedProfile": {"text": True},
+    "bulletIterations": {"iterations": {"bulletText": True, "rationale": True}},
+    "feedbackDigest": {"finalBullets": True, "allFeedback": True},
+}
+
+
+def compression_enabled():
+    return os.getenv("COMPRESS_SESSION_TEXT", "false").lower() in ("1", "true", "yes")
+
+
+def field_spec(key):
+    """COMPRESSED_FIELDS entry for a (possibly dotted) field path, or None."""
+    spec = COMPRESSED_FIELDS
+    for part in key.split("."):
+        if part.isdigit():
+            continue
+        spec = spec.get(part) if isinstance(spec, dict) else None
+        if spec is None:
+            return None
+    return spec
+
+
+def iter_texts(value, spec=COMPRESSED_FIELDS):
+    """Yield the plain-text values of the compressible fields in a decoded document."""
+    if spec is True:
+        if isinstance(value, str):
+            yield value
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_texts(item, spec)
+    elif isinstance(value, dict):
+        for key, sub_spec in spec.items():
+            if key in value:
+                yield from iter_texts(value[key], sub_spec)
+
+
+def _decode_in_place(container, decompress):
+    items = container.items() if isinstance(container, dict) else enumerate(container)
+    for key, value in items:
+        if isinstance(value, (dict, list)):
+            _decode_in_place(value, decompress)
+        elif isinstance(value, Binary) and value.subtype == COMPRESSED_SUBTYPE:
+            container[key] = decompress(value)
+
+
+class TextCodec:
+    """Transparent zstd compression of large text fields in session documents.
+
+    Values are compressed with the active trained dictionary, whose id is
+    written into each frame, and stored as Binary subtype 0x80. Reading
+    picks the dictionary from the frame, so documents written before a
+    rotation stay readable. Dictionaries live in `dictionaries` and are
+    never deleted. Compression on write is off unless COMPRESS_SESSION_TEXT
+    is set; decompression on read always happens.
+    """
+
+    def __init__(self, dictionaries, enabled=None):
+        self.dictionaries = dictionaries
+        self.enabled = compression_enabled() if enabled is None else enabled
+        self._dicts = {}
+        self._active_id = None
+        self._active_checked = None
+        # zstd compressors are not safe to share between threads
+        self._local = threading.local()
+
+    def _dictionary(self, dict_id):
+        compression_dict = self._dicts.get(dict_id)
+        if compression_dict is None:
+            doc = self.dictionaries.find_one({"_id": dict_id})
+            if not doc:
+                raise LookupError(f"zstd dictionary {dict_id} not found")
+            compression_dict = zstd.ZstdCompressionDict(bytes(doc["data"]))
+            self._dicts[dict_id] = compression_dict
+        return compression_dict
+
+    def active_dictionary_id(self):
+        """Id of the dictionary new values are compressed with; 0 when none is active."""
+        now = time.monotonic()
+        if self._active_checked is None or now - self._active_checked > ACTIVE_DICTIONARY_TTL:
+            doc = self.dictionaries.find_one({"active": True}, {"_id": 1})
+            self._active_id = doc["_id"] if doc else 0
+            self._active_checked = now
+        return self._active_id
+
+    def _cached(self, kind, dict_id, factory):
+        cache = self._local.__dict__.setdefault(kind, {})
+        if dict_id not in cache:
+            cache[dict_id] = factory(dict_data=self._dictionary(dict_id)) if dict_id else factory()
+        return cache[dict_id]
+
+    def compress(self, text):
+        raw = text.encode("utf-8")
+        if len(raw) < MIN_COMPRESS_BYTES:
+            return text
+        compressor = self._cached(
+            "compressors",
+            self.active_dictionary_id(),
+            lambda **kwargs: zstd.ZstdCompressor(level=COMPRESSION_LEVEL, **kwargs)
+        )
+        frame = compressor.compress(raw)
+        if len(frame) >= len(raw):
+            return text
+        return Binary(frame, COMPRESSED_SUBTYPE)
+
+    def decompress(self, value):
+        frame = bytes(value)
+        dict_id = zstd.get_frame_parameters(frame).dict_id
+        decompressor = self._cached("decompressors", dict_id, zstd.ZstdDecompressor)
+        return decompressor.decompress(frame).decode("utf-8")
+
+    def _encode(self, value, spec):
+        if spec is True:
+            return self.compress(value) if isinstance(value, str) else value
+        if isinstance(value, list):
+            return [self._encode(item, spec) for item in value]
+        if isinstance(value, dict):
+            return {key: self._encode(item, spec[key]) if key in spec else item for key, item in value.items()}
+        return value
+
+    def encode_fields(self, fields, force=False):
+        """Compress the large text values in an insert or $set payload. Keys may be dotted paths."""
+        if not (self.enabled or force):
+            return fields
+        encoded = {}
+        for key, value in fields.items():
+            spec = field_spec(key)
+            encoded[key] = value if spec is None else self._encode(value, spec)
+        return encoded
+
+    def decode_document(self, doc):
+        """Decompress, in place, every compressed value anywhere in a document."""
+        if doc is not None:
+            _decode_in_place(doc, self.decompress)
+        return doc
+
+    def train(self, samples, size=DICTIONARY_SIZE, activate=False):
+        """Train a dictionary on sample texts and store it. Returns the dictionary id."""
+        compression_dict = zstd.train_dictionary(size, [sample.encode("utf-8") for sample in samples])
+        dict_id = compression_dict.dict_id()
+        self.dictionaries.insert_one({
+            "_id": dict_id,
+            "data": Binary(compression_dict.as_bytes()),
+            "size": len(compression_dict.as_bytes()),
+            "sampleCount": len(samples),
+            "createdAt": datetime.now(timezone.utc),
+            "active": False
+        })
+        if activate:
+            self.activate(dict_id)
+        return dict_id
+
+    def activate(self, dict_id):
+        """Make a stored dictionary the one new values are compressed with."""
+        if not self.dictionaries.find_one({"_id": dict_id}, {"_id": 1}):
+            raise LookupError(f"zstd dictionary {dict_id} not found")
+        self.dictionaries.update_many({"active": True}, {"$set": {"active": False}})
+        self.dictionaries.update_one({"_id": dict_id}, {"$set": {"active": True}})
+        self._active_checked = None
@@ -0,0 +1,103 @@
+"""
+Benchmark per-row cost of the wide session export.
+
+Compares the compiled ColumnPlan extractor (tuple rows + csv.writer) with
+the previous hand-walked dict rows + DictWriter approach on synthetic
+sessions held in memory, so no database is needed.
+
+    python -m tests.benchmarks.bench_export_plan --sessions 10000 50000
+"""
+
+import argparse
+import csv
+import io
+import time
+
+from services.export_service import WIDE_BASE_COLUMNS, stream_csv, wide_session_plan
+from tests.benchmarks.synthetic import make_sessions
+
+def iteration_keys(sessions):
+    return {
+        f"bullet_{bullet['bulletIndex'] + 1}_{iteration['iterationNumber']}"
+        for session in sessions
+        for bullet in session["bulletIterations"]
+        for iteration in bullet["iterations"]
+    }
+
+def legacy_rows(sessions):
+    """The pre-ColumnPlan export: one dict per session, then a fieldname union pass."""
+    rows = []
+    for session in sessions:
+        row = {
+            "session_id": str(session["_id"]),
+            "timestamp": session["_id"].generation_time.isoformat(),
+            "resume": session.get("resume"),
+            "job_desc": session.get("job_desc"),
+            "completed": session.get("completed", False),
+        }
+        for prefix, key in (("control", "controlProfile"), ("aligned", "alignedProfile")):
+            profile = session.get(key, {})
+            row[f"{prefix}_profile_text"] = profile.get("text")
+            for item, value in profile.get("likertResponses", {}).items():
+                row[f"{prefix}_likert_{item}"] = value
+            for item, value in profile.get("openResponses", {}).items():
+                row[f"{prefix}_response_{item}"] = value
+        for bullet in session.get("bulletIterations", []):
+            for iteration in bullet.get("iterations", []):
+                key = f"bullet_{bullet.get('bulletIndex', 0) + 1}_{iteration.get('iterationNumber', 1)}"
+                row[f"{key}_text"] = iteration.get("bulletText")
+                row[f"{key}_rationale"] = iteration.get("rationale")
+                row[f"{key}_rating"] = iteration.get("userRating")
+                row[f"{key}_feedback"] = iteration.get("userFeedback")
+        rows.append(row)
+    return rows
+
+def legacy_csv(sessions):
+    rows = legacy_rows(sessions)
+    fieldnames = set()
+    for row in rows:
+        fieldnames.update(row.keys())
+    base = [column.name for column in WIDE_BASE_COLUMNS]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=base + sorted(f for f in fieldnames if f.startswith("bullet_")),
+                            extrasaction="ignore", quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    return len(buffer.getvalue())
+
+def plan_csv(sessions):
+    plan = wide_session_plan(iteration_keys(sessions))
+    return sum(len(chunk) for chunk in stream_csv(plan, (plan.extract(session) for session in sessions)))
+
+def plan_extract_only(sessions):
+    plan = wide_session_plan(iteration_keys(sessions))
+    extract = plan.extract
+    for session in sessions:
+        extract(session)
+
+def time_per_row(fn, sessions, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        # Each run gets fresh copies because the plan annotates records in place
+        batch = [dict(session) for session in sessions]
+        start = time.perf_counter()
+        fn(batch)
+        best = min(best, time.perf_counter() - start)
+    return best / len(sessions) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark wide export row building.")
+    parser.add_argument("--sessions", nargs="+", type=int, default=[10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for count in args.sessions:
+        sessions = make_sessions(count)
+        print(f"{count} sessions (us/row, best of {args.repeat}):")
+        print(f"  plan extract only    {time_per_row(plan_extract_only, sessions, args.repeat):8.2f}")
+        print(f"  legacy dict rows     {time_per_row(legacy_rows, sessions, args.repeat):8.2f}")
+        print(f"  plan + csv.writer    {time_per_row(plan_csv, sessions, args.repeat):8.2f}")
+        print(f"  legacy + DictWriter  {time_per_row(legacy_csv, sessions, args.repeat):8.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Micro-benchmarks for the backend's per-session hot paths.
+
+Each benchmark runs one operation per synthetic session (CSV export row,
+flatten_dict, LLM response parsing, final synthesis prompt rendering, the
+save-iteration merge) and reports microseconds per operation, best of
+--repeat runs. Scales above the pool size cycle through the pool, so 100k
+operations do not need 100k sessions in memory. No database or OpenAI
+calls are made, but the services are imported, so run it where the
+backend's .env is loaded (PLATFORM_OPENAI_KEY set):
+
+    python -m tests.benchmarks.bench_hot_paths --scales 1000 10000 100000
+
+Results are saved to tests/benchmarks/results/<commit>.json. Compare two
+runs with:
+
+    python -m tests.benchmarks.bench_hot_paths --compare tests/benchmarks/results/abc1234.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from services.export_service import stream_csv, wide_session_plan
+from services.mongodb_service import DEFAULT_PROMPTS, flatten_dict
+from services.openai_service import extract_and_parse, parse_bse_bullets_response, parse_regenerated_bullet_response
+from services.prompt_templates import compile_prompt
+from utils.generation_helpers import build_feedback_digest, merge_iteration
+from tests.benchmarks.bench_export_plan import iteration_keys
+from tests.benchmarks.synthetic import bse_response, make_sessions, regenerated_response
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Distinct sessions generated; larger scales cycle through them
+POOL_SIZE = 10000
+
+
+def bench_export_csv_rows(sessions):
+    plan = wide_session_plan(iteration_keys(sessions))
+
+    def run(batch):
+        for _ in stream_csv(plan, map(plan.extract, batch)):
+            pass
+    # Copies, because the plan annotates the records it extracts from
+    return [dict(session) for session in sessions], run
+
+
+def bench_flatten_dict(sessions):
+    def run(batch):
+        for session in batch:
+            flatten_dict(session)
+    return sessions, run
+
+
+def bench_extract_and_parse(sessions):
+    def run(batch):
+        for response in batch:
+            extract_and_parse(response)
+    return [bse_response(session["bulletIterations"]) for session in sessions], run
+
+
+def bench_parse_bse_bullets(sessions):
+    def run(batch):
+        for response in batch:
+            parse_bse_bullets_response(response)
+    return [bse_response(session["bulletIterations"]) for session in sessions], run
+
+
+def bench_parse_regenerated_bullet(sessions):
+    def run(batch):
+        for response in batch:
+            parse_regenerated_bullet_response(response)
+    return [regenerated_response(session["bulletIterations"][0]["iterations"][-1]) for session in sessions], run
+
+
+def bench_render_aligned_prompt(sessions):
+    """The prompt rendering step of generate_aligned_profile."""
+    template = compile_prompt(DEFAULT_PROMPTS["final_synthesis"])
+    inputs = [
+        (session["resume"], session["job_desc"], build_feedback_digest(session["bulletIterations"]), session["controlProfile"]["text"])
+        for session in sessions
+    ]
+
+    def run(batch):
+        for resume, job_desc, digest, profile in batch:
+            template.render(
+                resume=resume,
+                jobDescription=job_desc,
+                finalBullets=digest["finalBullets"],
+                allFeedback=digest["allFeedback"],
+                originalProfile=profile
+            )
+    return inputs, run
+
+
+def bench_save_iteration_merge(sessions):
+    """save_iteration_data_endpoint without I/O: merge a re-saved iteration and rebuild the digest."""
+    inputs = []
+    for session in sessions:
+        latest = session["bulletIterations"][-1]["iterations"][-1]
+        inputs.append((session["bulletIterations"], len(session["bulletIterations"]) - 1, latest))
+
+    def run(batch):
+        for bullet_iterations, bullet_index, iteration in batch:
+            merged = merge_iteration(bullet_iterations, bullet_index, dict(iteration, userRating=5), is_final=True)
+            build_feedback_digest(merged)
+    return inputs, run
+
+
+BENCHMARKS = {
+    "export_csv_rows": bench_export_csv_rows,
+    "flatten_dict": bench_flatten_dict,
+    "extract_and_parse": bench_extract_and_parse,
+    "parse_bse_bullets": bench_parse_bse_bullets,
+    "parse_regenerated_bullet": bench_parse_regenerated_bullet,
+    "render_aligned_prompt": bench_render_aligned_prompt,
+    "save_iteration_merge": bench_save_iteration_merge,
+}
+
+
+def time_per_op(run, items, count, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        batch = itertools.islice(itertools.cycle(items), count)
+        start = time.perf_counter()
+        run(batch)
+        best = min(best, time.perf_counter() - start)
+    return best / count * 1e6
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(baseline_path, results):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline['commit']} (ratio < 1 is faster):")
+    for name, scales in results["benchmarks"].items():
+        for scale, value in scales.items():
+            before = baseline["benchmarks"].get(name, {}).get(scale)
+            if before:
+                print(f"  {name:26} {scale:>7}  {value / before:6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark backend hot paths on synthetic sessions.")
+    parser.add_argument("--scales", nargs="+", type=int, default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--max-iterations", type=int, default=6, help="Iterations per bullet in generated sessions")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--no-save", action="store_true", help="Do not write a results file")
+    args = parser.parse_args()
+
+    sessions = make_sessions(min(max(args.scales), POOL_SIZE), max_iterations=args.max_iterations)
+    results = {
+        "commit": current_commit(),
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "unit": "us/op",
+        "benchmarks": {},
+    }
+
+    print(f"us/op, best of {args.repeat}")
+    for name in args.only or BENCHMARKS:
+        items, run = BENCHMARKS[name](sessions)
+        timings = results["benchmarks"][name] = {}
+        for scale in args.scales:
+            timings[str(scale)] = round(time_per_op(run, items, scale, args.repeat), 3)
+        print(f"  {name:26} " + "  ".join(f"{scale:>7}: {value:8.2f}" for scale, value in timings.items()))
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved {path}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
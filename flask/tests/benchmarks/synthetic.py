@@ -0,0 +1,151 @@
+"""
+Synthetic LetterLab sessions for benchmarks and local load testing.
+
+Sessions have the shape the app stores: resume and job description,
+control and aligned profiles with Likert and open responses, and
+bulletIterations with a configurable number of bullets and iterations.
+Large texts are drawn from a small pool and shared between sessions, so
+100k sessions fit in memory. The docs/ example resume and job description
+are used when present.
+
+    python -m tests.benchmarks.synthetic --sessions 1000 --insert
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timezone
+
+from bson.objectid import ObjectId
+
+DOCS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "docs")
+
+LIKERT_ITEMS = ("accuracy", "control", "expression", "alignment")
+OPEN_ITEMS = ("likes", "dislikes", "changes")
+
+# One shared dict keeps large pools small; nothing modifies it
+GENERATION_SETTINGS = {"model": "gpt-4o", "temperature": None, "maxTokens": None, "timeout": None}
+
+FEEDBACK = (
+    "",
+    "Too generic, mention the data pipeline work.",
+    "I like this one but it undersells the mentoring.",
+    "Please make it sound less formal.",
+    "This is not something I actually did.",
+    "Closer, but drop the part about the award.",
+)
+
+
+def _example_text(filename, fallback, repeat):
+    try:
+        with open(os.path.join(DOCS_DIR, filename), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return fallback * repeat
+
+
+def text_pool(rng, size=20):
+    """Resumes, job descriptions and profile texts shared by the generated sessions."""
+    resume = _example_text("example-resume.txt", "Led a team of engineers building data pipelines. ", 60)
+    job_desc = _example_text("example-job-desc.txt", "We are looking for an analyst who can own reporting. ", 40)
+    return {
+        "resume": [f"{resume}\nReference {n}: {rng.random()}" for n in range(size)],
+        "job_desc": [f"{job_desc}\nPosting {n}" for n in range(size // 4 or 1)],
+        "profile": [f"Profile draft {n}. " + "Experienced professional with a record of delivery. " * 12 for n in range(size)],
+        "bullet": [f"Built and maintained {n} reporting dashboards used by leadership, cutting prep time by {n * 5}%." for n in range(size)],
+        "rationale": [f"Mastery experience {n}: a concrete, measurable accomplishment tied to the posting." * 2 for n in range(size)],
+    }
+
+
+def make_iterations(rng, pool, count):
+    return [{
+        "iterationNumber": number,
+        "bulletText": rng.choice(pool["bullet"]),
+        "rationale": rng.choice(pool["rationale"]),
+        "userRating": rng.randint(1, 7),
+        "userFeedback": rng.choice(FEEDBACK),
+        "timestamp": None,
+        "promptVersion": 1,
+        "promptType": "bse_generation" if number == 1 else "regeneration",
+        "generationSettings": GENERATION_SETTINGS,
+    } for number in range(1, count + 1)]
+
+
+def make_session(rng, pool, created, bullets=3, max_iterations=6):
+    likert = {item: rng.randint(1, 7) for item in LIKERT_ITEMS}
+    open_responses = {item: rng.choice(FEEDBACK) for item in OPEN_ITEMS}
+    bullet_iterations = []
+    for bullet in range(bullets):
+        iterations = make_iterations(rng, pool, rng.randint(1, max_iterations))
+        bullet_iterations.append({
+            "bulletIndex": bullet,
+            "iterations": iterations,
+            "finalIteration": iterations[-1]["iterationNumber"] if rng.random() < 0.8 else None,
+        })
+    return {
+        "_id": ObjectId.from_datetime(created),
+        "resume": rng.choice(pool["resume"]),
+        "job_desc": rng.choice(pool["job_desc"]),
+        "completed": rng.random() < 0.7,
+        "controlProfile": {"text": rng.choice(pool["profile"]), "likertResponses": likert, "openResponses": open_responses},
+        "alignedProfile": {"text": rng.choice(pool["profile"]), "likertResponses": dict(likert), "openResponses": dict(open_responses)},
+        "bulletIterations": bullet_iterations,
+    }
+
+
+def make_sessions(count, bullets=3, max_iterations=6, seed=42):
+    rng = random.Random(seed)
+    pool = text_pool(rng)
+    start = int(datetime(2025, 1, 1, tzinfo=timezone.utc).timestamp())
+    return [
+        make_session(rng, pool, datetime.fromtimestamp(start + n, timezone.utc), bullets, max_iterations)
+        for n in range(count)
+    ]
+
+
+def bse_response(bullets):
+    """LLM output for BSE generation, in the fenced JSON format the parser expects."""
+    payload = {"bullets": [{"text": b["iterations"][0]["bulletText"], "rationale": b["iterations"][0]["rationale"]} for b in bullets]}
+    return "Here are your bullets:\n```json\n" + json.dumps(payload, indent=2) + "\n```"
+
+
+def regenerated_response(iteration):
+    payload = {"bullet": {"text": iteration["bulletText"], "rationale": iteration["rationale"]}}
+    return "```json\n" + json.dumps(payload, indent=2) + "\n```"
+
+
+def insert_sessions(sessions, batch_size=500):
+    """Store sessions the way the app does (shared texts, optional compression)."""
+    from services.mongodb_service import _store_session_texts, collection, text_codec
+
+    inserted = 0
+    for start in range(0, len(sessions), batch_size):
+        docs = []
+        for session in sessions[start:start + batch_size]:
+            # Fresh ids so the same seed can be inserted more than once
+            doc = _store_session_texts({key: value for key, value in session.items() if key != "_id"})
+            doc["updatedAt"] = datetime.now(timezone.utc)
+            docs.append(text_codec.encode_fields(doc))
+        inserted += len(collection.insert_many(docs).inserted_ids)
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic LetterLab sessions.")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--bullets", type=int, default=3)
+    parser.add_argument("--max-iterations", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--insert", action="store_true", help="Insert into the database at MONGO_URI")
+    args = parser.parse_args()
+
+    sessions = make_sessions(args.sessions, args.bullets, args.max_iterations, args.seed)
+    iterations = sum(len(b["iterations"]) for s in sessions for b in s["bulletIterations"])
+    print(f"Generated {len(sessions)} sessions with {iterations} bullet iterations")
+    if args.insert:
+        print(f"Inserted {insert_sessions(sessions)} sessions")
+
+
+if __name__ == "__main__":
+    main()
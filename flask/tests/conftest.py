@@ -0,0 +1,14 @@
+import pytest
+
+class Clock:
+    """A monotonic clock that tests move forward by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return Clock()
@@ -0,0 +1,91 @@
+import queue
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import AutoReconnect
+
+from services import change_feed
+from services.change_feed import ChangeFeed, SUBSCRIBER_QUEUE_SIZE, _summarize_change
+
+def test_session_changes_do_not_carry_document_contents():
+    """A session change only reports the id and completion flag."""
+    session_id = ObjectId()
+    event = _summarize_change({
+        "ns": {"coll": "sessions"},
+        "operationType": "update",
+        "documentKey": {"_id": session_id},
+        "updateDescription": {"updatedFields": {"completed": True}},
+    })
+    assert event == {"collection": "sessions", "id": session_id, "completed": True}
+
+def test_progress_event_timestamp_matches_listing_format():
+    """Progress events use the same naive ISO timestamp as /progress-log."""
+    event = _summarize_change({
+        "ns": {"coll": "progress_log"},
+        "operationType": "insert",
+        "documentKey": {"_id": ObjectId()},
+        "fullDocument": {"event_name": "session_completed", "timestamp": datetime(2025, 1, 2, 3, 4, 5)},
+    })
+    assert event["timestamp"] == "2025-01-02T03:04:05"
+
+def test_stalled_subscriber_is_told_to_resync():
+    """A full queue is drained and replaced by a single resync marker."""
+    feed = ChangeFeed()
+    subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    feed._subscribers.add(subscriber)
+    for i in range(SUBSCRIBER_QUEUE_SIZE + 1):
+        feed.publish({"collection": "tokens", "id": i})
+    assert subscriber.qsize() == 1
+    assert subscriber.get_nowait() == {"collection": "resync"}
+
+class Stream:
+    """A change stream that drops its connection after the given changes."""
+
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.resume_token = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def try_next(self):
+        if not self.changes:
+            raise AutoReconnect("connection reset")
+        change = self.changes.pop(0)
+        self.resume_token = {"_data": str(change["documentKey"]["_id"])}
+        return change
+
+class WatchableDatabase:
+    """Just enough of a database to open change streams and see where they resume."""
+
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.resumed_after = []
+
+    def watch(self, pipeline, max_await_time_ms=None, resume_after=None):
+        self.resumed_after.append(resume_after)
+        return self.streams.pop(0)
+
+def test_reopened_stream_resumes_after_the_last_event(monkeypatch):
+    """A dropped change stream is reopened from its resume token, so no events are lost."""
+    first, second = ObjectId(), ObjectId()
+    database = WatchableDatabase(
+        Stream([{"ns": {"coll": "tokens"}, "operationType": "insert", "documentKey": {"_id": first}}]),
+        Stream([{"ns": {"coll": "tokens"}, "operationType": "update", "documentKey": {"_id": second}}]),
+    )
+    monkeypatch.setattr(change_feed, "db", database)
+    feed = ChangeFeed()
+    subscriber = queue.Queue()
+    feed._subscribers.add(subscriber)
+    feed._has_subscribers.set()
+
+    for _ in range(2):
+        with pytest.raises(AutoReconnect):
+            feed._watch()
+
+    assert database.resumed_after == [None, {"_data": str(first)}]
+    assert [subscriber.get_nowait()["id"] for _ in range(2)] == [str(first), str(second)]
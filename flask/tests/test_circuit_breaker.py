@@ -0,0 +1,73 @@
+import pytest
+
+import utils.circuit_breaker as circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.generation_helpers import retry_generation
+
+def fail():
+    raise TimeoutError("upstream timed out")
+
+def test_circuit_opens_on_failure_rate_and_recovers_after_trial(monkeypatch, clock):
+    """Failures open the circuit, and one successful trial call closes it again."""
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    breaker = CircuitBreaker("test", min_calls=4, failure_rate=0.5, open_seconds=30)
+
+    breaker.call(lambda: "ok")
+    breaker.call(lambda: "ok")
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            breaker.call(fail)
+    with pytest.raises(CircuitOpenError) as excinfo:
+        breaker.call(lambda: "ok")
+    assert excinfo.value.retry_after == 30
+    assert breaker.snapshot()["state"] == "open"
+
+    clock.now += 30
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.snapshot()["state"] == "closed"
+
+def test_slow_calls_count_as_failures(monkeypatch, clock):
+    """Calls slower than the threshold trip the circuit even when they succeed."""
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    breaker = CircuitBreaker("test", min_calls=2, failure_rate=1.0, slow_call_seconds=10)
+
+    def slow():
+        clock.now += 11
+        return "late"
+
+    breaker.call(slow)
+    breaker.call(slow)
+    assert breaker.snapshot()["state"] == "open"
+
+def test_retry_generation_does_not_retry_open_circuit():
+    """An open circuit is raised straight away rather than retried with sleeps."""
+    calls = []
+
+    def generate():
+        calls.append(1)
+        raise CircuitOpenError("test", 5)
+
+    with pytest.raises(CircuitOpenError):
+        retry_generation(generate, validator_fn=lambda x: True, retries=2, delay=0)
+    assert len(calls) == 1
+
+def test_open_circuit_refuses_before_queueing_for_budget(monkeypatch, clock):
+    """invoke_chat raises CircuitOpenError without estimating tokens or joining the scheduler queue."""
+    monkeypatch.setenv("PLATFORM_OPENAI_KEY", "sk-test")
+    from services import openai_service
+
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock)
+    breaker = CircuitBreaker("OpenAI", min_calls=1, failure_rate=1.0, open_seconds=30)
+    with pytest.raises(TimeoutError):
+        breaker.call(fail)
+    monkeypatch.setattr(openai_service, "openai_breaker", breaker)
+    monkeypatch.setattr(openai_service.llm_scheduler, "run", lambda *args, **kwargs: pytest.fail("queued while open"))
+
+    settings = {"model": "gpt-4o", "temperature": None, "maxTokens": None, "timeout": None}
+    with pytest.raises(CircuitOpenError):
+        openai_service.invoke_chat(settings, "hello")
+
+    # The check does not take the half-open trial call
+    clock.now += 30
+    breaker.check()
+    assert breaker.call(lambda: "ok") == "ok"
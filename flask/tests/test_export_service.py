@@ -0,0 +1,95 @@
+import csv
+import io
+from datetime import datetime, timezone
+
+from bson.objectid import ObjectId
+
+from services.export_service import Column, ColumnPlan, stream_csv, wide_session_plan
+from services.text_codec import TextCodec
+
+def make_session():
+    return {
+        "_id": ObjectId.from_datetime(datetime(2025, 3, 1, tzinfo=timezone.utc)),
+        "resume": "Resume",
+        "job_desc": "Job",
+        "controlProfile": {"text": "Control", "likertResponses": {"accuracy": 6}},
+        "bulletIterations": [
+            {"bulletIndex": 0, "iterations": [
+                {"iterationNumber": 1, "bulletText": "First", "userRating": 3},
+                {"iterationNumber": 2, "bulletText": "Second", "userRating": 6},
+            ]},
+        ],
+    }
+
+def test_column_plan_reads_nested_paths_and_missing_values():
+    """Nested paths resolve, and absent or non-dict intermediates give None."""
+    plan = ColumnPlan([
+        Column("text", ("controlProfile", "text"), "string"),
+        Column("accuracy", ("controlProfile", "likertResponses", "accuracy"), "int8"),
+        Column("missing", ("alignedProfile", "likertResponses", "accuracy"), "int8"),
+        Column("not_a_dict", ("resume", "text"), "string"),
+        Column("computed", lambda record: record["resume"].upper(), "string"),
+    ])
+    assert plan.extract(make_session()) == ("Control", 6, None, None, "RESUME")
+
+def test_wide_plan_orders_and_fills_iteration_columns():
+    """Iteration columns follow the export's sorted naming and blank out when absent."""
+    plan = wide_session_plan({"bullet_1_1", "bullet_1_2", "bullet_2_1"})
+    row = plan.as_dict(plan.extract(make_session()))
+
+    bullet_names = [name for name in plan.names if name.startswith("bullet_")]
+    assert bullet_names == sorted(bullet_names)
+    assert row["session_id"] == str(make_session()["_id"])
+    assert row["completed"] is False
+    assert row["bullet_1_2_text"] == "Second"
+    assert row["bullet_1_2_rating"] == 6
+    assert row["bullet_2_1_text"] is None
+
+def test_stream_csv_writes_header_and_rows():
+    """Chunked CSV output round-trips through the csv module."""
+    plan = ColumnPlan([Column("a", ("a",), "string"), Column("b", ("b",), "int8")])
+    rows = (plan.extract({"a": f"x,{n}", "b": n}) for n in range(5))
+    parsed = list(csv.reader(io.StringIO("".join(stream_csv(plan, rows, chunk_rows=2)))))
+    assert parsed[0] == ["a", "b"]
+    assert parsed[1:] == [[f"x,{n}", str(n)] for n in range(5)]
+
+class NoDictionaries:
+    """A dictionary store with no trained dictionaries, so the codec uses plain zstd."""
+
+    def find_one(self, query, projection=None):
+        return None
+
+class AggregateOnly:
+    """Just enough of a collection for iter_aggregate_rows."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipelines = []
+
+    def aggregate(self, pipeline, batchSize=None):
+        self.pipelines.append(pipeline)
+        return iter(self.docs)
+
+def test_long_export_projects_every_plan_column(monkeypatch):
+    """The pipeline's final $project outputs exactly the long plan's columns, and rows decode compressed text."""
+    from services import export_service
+
+    codec = TextCodec(NoDictionaries(), enabled=True)
+    long_text = "Built reporting dashboards used by leadership every week. " * 10
+    sessions = AggregateOnly([
+        {"session_id": "a", "bullet_index": 0, "iteration_number": 1, "bullet_text": codec.compress(long_text),
+         "user_rating": 4, "is_final": False},
+        {"session_id": "a", "bullet_index": 0, "iteration_number": 2, "bullet_text": "Short", "is_final": True},
+    ])
+    monkeypatch.setattr(export_service, "db", {"sessions": sessions})
+    monkeypatch.setattr(export_service, "text_codec", codec)
+
+    plan = export_service.LONG_ITERATION_PLAN
+    rows = [plan.as_dict(row) for row in export_service.long_iteration_rows()]
+
+    final_project = sessions.pipelines[0][-1]["$project"]
+    assert [name for name in final_project if name != "_id"] == list(plan.names)
+    assert rows[0]["bullet_text"] == long_text
+    assert rows[0]["user_rating"] == 4
+    assert rows[1]["user_feedback"] is None
+    assert [row["is_final"] for row in rows] == [False, True]
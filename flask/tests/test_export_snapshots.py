@@ -0,0 +1,94 @@
+import csv
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson.objectid import ObjectId
+
+from services import export_snapshots
+
+class Sessions:
+    """Just enough of the sessions collection for a snapshot refresh."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def changed_between(self, since, until, projection=None):
+        return iter([dict(doc) for doc in self.docs if (since is None or doc["updatedAt"] > since) and doc["updatedAt"] <= until])
+
+    def long_rows(self, match=None):
+        ids = set(match["_id"]["$in"])
+        for doc in self.docs:
+            if doc["_id"] in ids:
+                for iteration in doc["bulletIterations"][0]["iterations"]:
+                    yield (str(doc["_id"]), 0, iteration["iterationNumber"], iteration["bulletText"],
+                           None, None, None, None, None, None, False)
+
+    def count_documents(self, query):
+        return len(self.docs)
+
+    def find(self, query, projection=None):
+        return [{"_id": doc["_id"]} for doc in self.docs]
+
+def make_session(n, updated_at, iterations=1):
+    return {
+        "_id": ObjectId.from_datetime(datetime(2025, 3, 1, tzinfo=timezone.utc) + timedelta(minutes=n)),
+        "resume": f"Resume {n}",
+        "job_desc": "Job",
+        "updatedAt": updated_at,
+        "bulletIterations": [{"bulletIndex": 0, "iterations": [
+            {"iterationNumber": i, "bulletText": f"Bullet {n}.{i}"} for i in range(1, iterations + 1)
+        ]}],
+    }
+
+def read_csv(layout):
+    with open(export_snapshots.snapshot_path(layout), newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+def test_refresh_rerenders_only_changed_sessions(monkeypatch, tmp_path):
+    """Later refreshes read only sessions updated past the watermark, and the files reflect them."""
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    sessions = Sessions([make_session(1, old), make_session(2, old)])
+    monkeypatch.setenv("EXPORT_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_snapshots, "collection", sessions)
+    monkeypatch.setattr(export_snapshots, "get_sessions_changed_between", sessions.changed_between)
+    monkeypatch.setattr(export_snapshots, "hydrate_sessions", lambda docs: docs)
+    monkeypatch.setattr(export_snapshots, "long_iteration_rows", sessions.long_rows)
+    monkeypatch.setattr(export_snapshots, "INCREMENTAL_SAFETY_LAG", timedelta(0))
+
+    first = export_snapshots.refresh_snapshots()
+    assert first["lastRefresh"]["changed"] == 2
+    assert read_csv("wide")[0][-4:] == ["bullet_1_1_feedback", "bullet_1_1_rating", "bullet_1_1_rationale", "bullet_1_1_text"]
+    assert len(read_csv("long")) == 3
+
+    unchanged = export_snapshots.refresh_snapshots()
+    assert unchanged["lastRefresh"]["changed"] == 0
+    assert unchanged["files"] == first["files"]
+
+    sessions.docs[1] = make_session(2, datetime.now(timezone.utc), iterations=2)
+    updated = export_snapshots.refresh_snapshots()
+    assert updated["lastRefresh"]["changed"] == 1
+    assert updated["files"]["long"]["etag"] != first["files"]["long"]["etag"]
+    wide = read_csv("wide")
+    assert "bullet_1_2_text" in wide[0]
+    assert [row[wide[0].index("bullet_1_2_text")] for row in wide[1:]] == ["", "Bullet 2.2"]
+    assert [row[3] for row in read_csv("long")[1:]] == ["Bullet 1.1", "Bullet 2.1", "Bullet 2.2"]
+
+def test_refresh_skips_while_another_holds_the_lock(monkeypatch, tmp_path):
+    """A second refresher on the same directory backs off instead of waiting."""
+    import fcntl
+
+    monkeypatch.setenv("EXPORT_SNAPSHOT_DIR", str(tmp_path))
+    with open(tmp_path / export_snapshots.LOCK_FILE, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert export_snapshots.refresh_snapshots() is None
+
+def test_request_refresh_only_signals_the_refresher(monkeypatch, tmp_path):
+    """Web workers leave a marker for the refresher process instead of refreshing themselves."""
+    monkeypatch.setenv("EXPORT_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_snapshots, "REQUEST_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(export_snapshots, "refresh_snapshots", lambda full=False: pytest.fail("refreshed in the worker"))
+
+    assert export_snapshots._wait_for_request(0.05) is False
+    export_snapshots.request_refresh()
+    assert export_snapshots._wait_for_request(5) is True
+    assert not (tmp_path / export_snapshots.REQUEST_FILE).exists()
@@ -0,0 +1,111 @@
+from utils.generation_helpers import DIGEST_FEEDBACK_PER_BULLET, build_feedback_digest, split_bullet_history
+from utils.generation_helpers import merge_iteration, pending_iteration, session_stage, session_state
+
+def make_iteration(number, rating=None, feedback=""):
+    return {
+        "iterationNumber": number,
+        "bulletText": f"Bullet v{number}",
+        "rationale": f"Why v{number}",
+        "userRating": rating,
+        "userFeedback": feedback,
+    }
+
+def test_feedback_digest_renders_final_bullets_and_feedback():
+    """The digest uses the final iteration and lists each rating and comment."""
+    digest = build_feedback_digest([{
+        "bulletIndex": 0,
+        "iterations": [make_iteration(1, 3, "Too vague"), make_iteration(2, 6), make_iteration(3)],
+        "finalIteration": 2,
+    }])
+    assert digest["finalBullets"] == "Bullet 1: Bullet v2\nRationale: Why v2\n\n"
+    assert digest["allFeedback"] == (
+        "Bullet 1 feedback:\n"
+        "  Rating: 3/7\n"
+        "  Feedback: \"Too vague\"\n"
+        "  Rating: 6/7\n"
+        "\n"
+    )
+
+def test_feedback_digest_is_bounded():
+    """Long regeneration histories keep only the most recent feedback."""
+    iterations = [make_iteration(n, 4, f"note {n}") for n in range(1, 41)]
+    digest = build_feedback_digest([{"bulletIndex": 0, "iterations": iterations, "finalIteration": None}])
+
+    assert digest["allFeedback"].count("Rating:") == DIGEST_FEEDBACK_PER_BULLET
+    assert "note 40" in digest["allFeedback"]
+    assert "note 1\"" not in digest["allFeedback"]
+    assert digest["finalBullets"].startswith("Bullet 1: Bullet v40")
+
+def test_split_bullet_history_uses_latest_saved_iteration():
+    """The newest iteration is the current bullet and earlier ones are its history."""
+    bullet_iterations = [
+        {"bulletIndex": 0, "iterations": [make_iteration(1)]},
+        {"bulletIndex": 1, "iterations": [make_iteration(2, 5), make_iteration(1, 3)]},
+        {"bulletIndex": 2, "iterations": []},
+    ]
+    current, history = split_bullet_history(bullet_iterations, 1)
+    assert current["bulletText"] == "Bullet v2"
+    assert [i["iterationNumber"] for i in history] == [1]
+    assert split_bullet_history(bullet_iterations, 2) == (None, [])
+
+def test_merge_iteration_replaces_and_keeps_server_details():
+    """Re-saving an iteration replaces it but keeps the recorded prompt version."""
+    stored = dict(make_iteration(1), promptVersion=3, promptType="bse_generation")
+    bullet_iterations = merge_iteration([], 1, stored)
+    assert [bullet["bulletIndex"] for bullet in bullet_iterations] == [0, 1]
+
+    merge_iteration(bullet_iterations, 1, dict(make_iteration(1, rating=6), promptVersion=None), is_final=True)
+    saved = bullet_iterations[1]["iterations"]
+    assert len(saved) == 1
+    assert (saved[0]["userRating"], saved[0]["promptVersion"]) == (6, 3)
+    assert bullet_iterations[1]["finalIteration"] == 1
+
+def test_session_stage_follows_the_study_flow():
+    """Each stored step moves the session to the next participant view."""
+    session_doc = {}
+    assert session_stage(session_doc) == "input"
+    session_doc["controlProfile"] = {"text": "Control"}
+    assert session_stage(session_doc) == "control_profile"
+    session_doc["controlProfile"]["likertResponses"] = {"accuracy": 5}
+    session_doc["bulletIterations"] = [{"bulletIndex": 0, "iterations": [{"iterationNumber": 1}], "finalIteration": None}]
+    assert session_stage(session_doc) == "bullet_refinement"
+    session_doc["bulletIterations"][0]["finalIteration"] = 1
+    assert session_stage(session_doc) == "aligned_profile"
+    session_doc["alignedProfile"] = {"text": "Aligned", "likertResponses": {"accuracy": 6}}
+    assert session_stage(session_doc) == "comparison"
+    session_doc["completed"] = True
+    assert session_stage(session_doc) == "completed"
+
+def test_session_state_reports_latest_iteration_per_bullet():
+    """Bullets carry their latest saved iteration whatever the stored order."""
+    state = session_state({
+        "controlProfile": {"text": "Control"},
+        "bulletIterations": [{"bulletIndex": 0, "finalIteration": None, "iterations": [
+            {"iterationNumber": 2, "bulletText": "Second", "rationale": "R2", "userRating": 5},
+            {"iterationNumber": 1, "bulletText": "First", "rationale": "R1", "userRating": 2},
+        ]}],
+    })
+    assert state["stage"] == "control_profile"
+    assert state["control_profile"] == {"text": "Control", "survey_completed": False}
+    assert state["aligned_profile"] is None
+    assert state["bullets"] == [{
+        "index": 0, "text": "Second", "rationale": "R2", "iteration_number": 2, "iteration_count": 2,
+        "user_rating": 5, "user_feedback": "", "final_iteration": None,
+    }]
+
+def test_pending_regeneration_survives_a_reload_until_rated():
+    """A regenerated bullet stored before rating is what a reload shows and a retry reuses."""
+    bullet_iterations = [{"bulletIndex": 0, "finalIteration": None, "iterations": [make_iteration(1, 3, "Too vague")]}]
+    merge_iteration(bullet_iterations, 0, {**make_iteration(2), "promptVersion": 4, "pending": True, "sourceIteration": 1})
+
+    # The reloaded page resumes on the unrated bullet
+    assert session_state({"bulletIterations": bullet_iterations})["bullets"][0]["text"] == "Bullet v2"
+    # A repeated regenerate from iteration 1 finds it; the prompt still sees iteration 1 as current
+    assert pending_iteration(bullet_iterations, 0, 1)["bulletText"] == "Bullet v2"
+    assert split_bullet_history(bullet_iterations, 0, skip_pending=True)[0]["iterationNumber"] == 1
+
+    # Once rated it is an ordinary iteration and the next regenerate starts from it
+    merge_iteration(bullet_iterations, 0, make_iteration(2, 6))
+    assert pending_iteration(bullet_iterations, 0, 1) is None
+    latest, _ = split_bullet_history(bullet_iterations, 0, skip_pending=True)
+    assert (latest["iterationNumber"], latest["promptVersion"]) == (2, 4)
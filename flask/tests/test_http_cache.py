@@ -0,0 +1,38 @@
+from flask import Flask, jsonify
+
+from utils.http_cache import conditional_get
+
+def make_app(state):
+    app = Flask(__name__)
+
+    @app.route("/items")
+    @conditional_get(lambda: state["version"])
+    def items():
+        state["built"] += 1
+        return jsonify({"version": state["version"]})
+
+    return app
+
+def test_conditional_get_returns_304_until_version_changes():
+    """A matching If-None-Match skips the view until the version stamp moves."""
+    state = {"version": 1, "built": 0}
+    client = make_app(state).test_client()
+
+    first = client.get("/items")
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+
+    cached = client.get("/items", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert state["built"] == 1
+
+    state["version"] = 2
+    changed = client.get("/items", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+def test_etag_depends_on_query_string():
+    """Different filters of the same resource get different ETags."""
+    state = {"version": 1, "built": 0}
+    client = make_app(state).test_client()
+    assert client.get("/items?page=1").headers["ETag"] != client.get("/items?page=2").headers["ETag"]
@@ -0,0 +1,124 @@
+import heapq
+import threading
+import time
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import services.llm_scheduler as llm_scheduler
+from services.llm_scheduler import ADMIN, PARTICIPANT, LLMScheduler, QueueTimeoutError
+
+class BudgetWindows:
+    """Just enough of a collection for the scheduler's window reservations."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def _matches(self, doc, query):
+        for field, condition in query.items():
+            if field == "_id":
+                continue
+            value = doc.get(field, 0)
+            if "$lt" in condition and not value < condition["$lt"]:
+                return False
+            if "$lte" in condition and not value <= condition["$lte"]:
+                return False
+        return True
+
+    def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            doc = self.docs[query["_id"]] = {"_id": query["_id"], **update["$setOnInsert"]}
+        elif not self._matches(doc, query):
+            raise DuplicateKeyError("duplicate key")
+        self.update_one(query, update)
+        return doc
+
+    def update_one(self, query, update, upsert=False):
+        doc = self.docs[query["_id"]]
+        for field, delta in update["$inc"].items():
+            doc[field] = doc.get(field, 0) + delta
+
+    def find(self, query, projection=None):
+        return [doc for doc in self.docs.values() if doc["minute"] == query["minute"]]
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setenv("OPENAI_RPM_LIMIT", "2")
+    monkeypatch.setenv("OPENAI_TPM_LIMIT", "0")
+    # Mid-minute, so a test never straddles two budget windows
+    monkeypatch.setattr(llm_scheduler.time, "time", lambda: 60 * 1000 + 10.0)
+    return LLMScheduler(BudgetWindows(), timeout=0.2)
+
+def test_calls_beyond_the_shared_budget_time_out(scheduler):
+    """Reservations are shared through the window document; a full window makes callers wait."""
+    other_worker = LLMScheduler(scheduler.windows, timeout=0.2)
+    assert scheduler.run(lambda prompt: "first", "hello", "gpt-4o") == "first"
+    assert other_worker.run(lambda prompt: "second", "hello", "gpt-4o") == "second"
+
+    with pytest.raises(QueueTimeoutError):
+        scheduler.run(lambda prompt: "third", "hello", "gpt-4o")
+    stats = scheduler.snapshot()
+    assert stats["timeouts"] == 1
+    assert stats["currentWindow"][0]["requests"] == 2
+
+def test_failed_calls_return_their_reservation(scheduler):
+    """A call that raises gives its request and tokens back to the window."""
+    def fail(prompt):
+        raise TimeoutError("upstream timed out")
+
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            scheduler.run(fail, "hello", "gpt-4o")
+    assert scheduler.snapshot()["currentWindow"][0]["requests"] == 0
+
+def test_participant_calls_are_served_before_admin_probes(monkeypatch):
+    """While callers queue, a higher-priority call goes ahead of an earlier low-priority one."""
+    monkeypatch.setenv("OPENAI_RPM_LIMIT", "100")
+    scheduler = LLMScheduler(BudgetWindows(), timeout=5)
+    order = []
+
+    # Hold the queue head so later callers line up behind it
+    heapq.heappush(scheduler._queue, (-1, -1))
+    threads = [
+        threading.Thread(target=scheduler.run, args=(order.append, "admin", "gpt-4o"), kwargs={"priority": ADMIN}),
+        threading.Thread(target=scheduler.run, args=(order.append, "participant", "gpt-4o"), kwargs={"priority": PARTICIPANT}),
+    ]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    with scheduler._cond:
+        heapq.heappop(scheduler._queue)
+        scheduler._cond.notify_all()
+    for thread in threads:
+        thread.join()
+    assert order == ["participant", "admin"]
+
+def test_disabled_budget_calls_straight_through(monkeypatch):
+    """With no shared budget the prompt is neither token-counted nor queued."""
+    monkeypatch.setenv("OPENAI_RPM_LIMIT", "0")
+    monkeypatch.setenv("OPENAI_TPM_LIMIT", "0")
+    monkeypatch.setattr(llm_scheduler, "estimate_tokens", lambda *args: pytest.fail("counted tokens"))
+    scheduler = LLMScheduler(BudgetWindows(), timeout=0.2)
+    monkeypatch.setattr(scheduler, "_acquire", lambda *args: pytest.fail("queued"))
+    assert scheduler.run(lambda prompt: prompt.upper(), "hello", "gpt-4o") == "HELLO"
+
+def test_reservation_round_trip_does_not_hold_the_queue_lock(scheduler):
+    """Other threads can use the scheduler while the head of the queue talks to Mongo."""
+    lock_free = []
+    reserve = scheduler.windows.find_one_and_update
+
+    def find_one_and_update(*args, **kwargs):
+        def try_lock():
+            acquired = scheduler._cond.acquire(blocking=False)
+            if acquired:
+                scheduler._cond.release()
+            lock_free.append(acquired)
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return reserve(*args, **kwargs)
+
+    scheduler.windows.find_one_and_update = find_one_and_update
+    assert scheduler.run(lambda prompt: "done", "hello", "gpt-4o") == "done"
+    assert lock_free == [True]
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+from services.mongo_monitor import CommandMonitor, query_shape, winning_plan_stages
+
+def test_query_shape_keeps_fields_not_values():
+    """Shapes group queries by the fields and operators they use, never by values."""
+    shape = query_shape("find", {
+        "find": "tokens",
+        "filter": {"token": "secret-token", "created_at": {"$gte": 1, "$lt": 2}},
+        "sort": {"created_at": -1},
+    })
+    assert shape == "filter{created_at:$gte,$lt,token} sort{created_at}"
+    assert "secret" not in shape
+
+def test_slow_commands_are_counted_per_shape(monkeypatch):
+    """Durations from command events accumulate per collection, command and shape."""
+    monkeypatch.setenv("MONGO_SLOW_QUERY_MS", "50")
+    monitor = CommandMonitor()
+    for request_id, duration in ((1, 10_000), (2, 80_000)):
+        monitor.started(SimpleNamespace(
+            command_name="find", command={"find": "sessions", "filter": {"_id": request_id}},
+            connection_id=("localhost", 27017), request_id=request_id, database_name="cover_letter_app",
+        ))
+        monitor.succeeded(SimpleNamespace(connection_id=("localhost", 27017), request_id=request_id, duration_micros=duration))
+
+    summary = monitor.summary()
+    row = summary["commands"][0]
+    assert (row["collection"], row["command"], row["shape"]) == ("sessions", "find", "filter{_id}")
+    assert (row["count"], row["slowCount"], row["maxMs"]) == (2, 1, 80.0)
+    assert summary["recentSlow"][0]["durationMs"] == 80.0
+
+def test_winning_plan_stages_finds_collection_scans():
+    """Stages are collected from nested winning plans, as in aggregate explains."""
+    explain = {"stages": [{"$cursor": {"queryPlanner": {"winningPlan": {
+        "stage": "SORT", "inputStage": {"stage": "COLLSCAN"},
+    }}}}]}
+    assert winning_plan_stages(explain) == ["SORT", "COLLSCAN"]
@@ -0,0 +1,39 @@
+import cProfile
+import pstats
+from datetime import datetime, timedelta, timezone
+
+import services.profiling as profiling
+from services.profiling import top_functions
+
+class SettingsStore:
+    """Just enough of a collection for the profiling settings document."""
+
+    def __init__(self, doc=None):
+        self.doc = doc
+
+    def find_one(self, query, projection=None):
+        return dict(self.doc) if self.doc else None
+
+def slow_sum():
+    return sum(i * i for i in range(20000))
+
+def test_top_functions_sorted_by_cumulative_time():
+    """The top-N table is ordered by cumulative time and truncated."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    slow_sum()
+    profiler.disable()
+
+    rows = top_functions(pstats.Stats(profiler), 3)
+    assert len(rows) == 3
+    assert rows == sorted(rows, key=lambda row: row["cumulativeTime"], reverse=True)
+    assert "slow_sum" in [row["function"] for row in rows]
+
+def test_expired_settings_are_reported_disabled(monkeypatch):
+    """Profiling switches itself off once its duration has passed."""
+    expired = datetime.now(timezone.utc) - timedelta(minutes=1)
+    monkeypatch.setattr(profiling, "profiler_settings", SettingsStore({"enabled": True, "expiresAt": expired}))
+    assert profiling.get_profiling_settings()["enabled"] is False
+
+    monkeypatch.setattr(profiling, "profiler_settings", SettingsStore())
+    assert profiling.get_profiling_settings() == {"enabled": False}
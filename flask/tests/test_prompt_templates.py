@@ -0,0 +1,59 @@
+import pytest
+
+from services.prompt_templates import PromptTemplateError, compile_prompt, validate_model_settings, validate_prompt
+
+def test_compiled_prompt_matches_str_format():
+    """Rendering a compiled template gives the same text as str.format."""
+    template = 'Rated {rating}/7: "{feedback}"\n```json\n{{"bullet": {{"text": "..."}}}}\n```'
+    values = {"rating": 5, "feedback": "More concrete"}
+    assert compile_prompt(template).render(**values) == template.format(**values)
+
+def test_validate_prompt_rejects_unknown_placeholders():
+    """Placeholders outside the prompt type's variables are rejected at save time."""
+    with pytest.raises(PromptTemplateError, match="bulletData"):
+        validate_prompt("final_synthesis", "Data: {bulletData}")
+    assert validate_prompt("control", "{resume} / {jobDescription}").placeholders == {"resume", "jobDescription"}
+
+@pytest.mark.parametrize("template", [
+    "Unbalanced { brace",
+    "Stray } brace",
+    "Positional {}",
+    "Attribute {resume.text}",
+    "Format spec {resume:>10}",
+])
+def test_validate_prompt_rejects_bad_syntax(template):
+    """Malformed or non-plain placeholders fail to compile."""
+    with pytest.raises(PromptTemplateError):
+        validate_prompt("control", template)
+
+def test_default_prompts_are_valid(monkeypatch):
+    """The built-in default prompts pass validation for their types."""
+    from services import mongodb_service
+
+    captured = {}
+    monkeypatch.setattr(
+        mongodb_service, "create_prompt",
+        lambda prompt_type, content, modified_by: captured.setdefault(prompt_type, content)
+    )
+    mongodb_service.initialize_default_prompts(force_update=True)
+
+    assert set(captured) == {"control", "bse_generation", "regeneration", "final_synthesis"}
+    for prompt_type, content in captured.items():
+        validate_prompt(prompt_type, content)
+
+def test_model_settings_drop_unset_values():
+    """Blank settings fall back to the defaults and valid ones are kept."""
+    settings = {"model": "gpt-4o-mini", "temperature": 0, "maxTokens": None, "timeout": ""}
+    assert validate_model_settings(settings) == {"model": "gpt-4o-mini", "temperature": 0}
+
+@pytest.mark.parametrize("settings", [
+    {"temperature": 3},
+    {"maxTokens": 0},
+    {"timeout": -1},
+    {"model": "  "},
+    {"top_p": 0.5},
+])
+def test_model_settings_reject_invalid_values(settings):
+    """Out-of-range or unknown settings are rejected at save time."""
+    with pytest.raises(PromptTemplateError):
+        validate_model_settings(settings)
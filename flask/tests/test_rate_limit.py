@@ -0,0 +1,31 @@
+import utils.rate_limit as rate_limit
+from utils.rate_limit import MemoryBuckets, take_token
+
+def test_memory_bucket_allows_burst_then_refills(monkeypatch, clock):
+    """A full bucket allows `capacity` calls, then one per refill interval."""
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    buckets = MemoryBuckets()
+    key = ("token-1", "letter_lab_bp.regenerate_bullet_endpoint")
+
+    assert [buckets.take(key, 3, 0.5) for _ in range(3)] == [0, 0, 0]
+    assert buckets.take(key, 3, 0.5) == 2
+    # Other participants and endpoints have their own buckets
+    assert buckets.take(("token-2", key[1]), 3, 0.5) == 0
+
+    clock.now += 2
+    assert buckets.take(key, 3, 0.5) == 0
+    assert buckets.take(key, 3, 0.5) > 0
+
+def test_shared_bucket_refusal_refunds_memory_bucket(monkeypatch):
+    """With the Mongo backend, a call refused by the shared bucket is not counted locally."""
+    class FullSharedBuckets:
+        def take(self, key, capacity, rate):
+            return 4
+
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "mongo")
+    monkeypatch.setattr(rate_limit, "memory_buckets", MemoryBuckets())
+    monkeypatch.setattr(rate_limit, "mongo_buckets", FullSharedBuckets())
+    key = ("token-1", "letter_lab_bp.generate_bse_bullets_endpoint")
+
+    assert take_token(key, 1, 0.1) == 4
+    assert take_token(key, 1, 0.1) == 4
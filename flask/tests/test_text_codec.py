@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+from bson.binary import Binary
+
+from services.text_codec import COMPRESSED_SUBTYPE, TextCodec
+
+class DictionaryStore:
+    """Just enough of a collection for the codec's dictionary lookups."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find_one(self, query, projection=None):
+        if "_id" in query:
+            return self.docs.get(query["_id"])
+        return next((doc for doc in self.docs.values() if doc["active"] == query["active"]), None)
+
+    def insert_one(self, doc):
+        self.docs[doc["_id"]] = doc
+
+    def update_many(self, query, update):
+        for doc in self.docs.values():
+            if doc["active"] == query["active"]:
+                doc.update(update["$set"])
+
+    def update_one(self, query, update):
+        self.docs[query["_id"]].update(update["$set"])
+
+RESUME = "Led a team of engineers building data pipelines for analytics. " * 20
+
+def sample_texts(count=300):
+    return [f"Participant {i} managed projects, mentored students and shipped software on time. " * 4 for i in range(count)]
+
+def test_large_text_fields_round_trip():
+    """Configured fields are stored compressed and come back as the same text."""
+    codec = TextCodec(DictionaryStore(), enabled=True)
+    fields = codec.encode_fields({
+        "resume": RESUME,
+        "completed": False,
+        "bulletIterations": [{"bulletIndex": 0, "iterations": [{"bulletText": RESUME, "userRating": 5}]}],
+    })
+
+    assert isinstance(fields["resume"], Binary) and fields["resume"].subtype == COMPRESSED_SUBTYPE
+    assert isinstance(fields["bulletIterations"][0]["iterations"][0]["bulletText"], Binary)
+    assert fields["completed"] is False
+
+    doc = codec.decode_document(fields)
+    assert doc["resume"] == RESUME
+    assert doc["bulletIterations"][0]["iterations"][0]["bulletText"] == RESUME
+
+def test_short_text_and_disabled_codec_stay_plain():
+    """Short strings are not compressed, and nothing is when the codec is disabled."""
+    codec = TextCodec(DictionaryStore(), enabled=True)
+    assert codec.encode_fields({"controlProfile.text": "short"}) == {"controlProfile.text": "short"}
+    assert TextCodec(DictionaryStore(), enabled=False).encode_fields({"resume": RESUME}) == {"resume": RESUME}
+
+def test_values_stay_readable_after_dictionary_rotation():
+    """Frames name their dictionary, so older values decode after a new one is activated."""
+    store = DictionaryStore()
+    codec = TextCodec(store, enabled=True)
+    first = codec.train(sample_texts(), size=4096, activate=True)
+    old_value = codec.compress(RESUME)
+
+    second = codec.train([text.upper() for text in sample_texts()], size=4096, activate=True)
+    assert first != second
+    assert codec.active_dictionary_id() == second
+    assert codec.decompress(old_value) == RESUME
+    assert codec.decompress(codec.compress(RESUME)) == RESUME
+
+class RacingSessions:
+    """Sessions where a participant saves one session while the first bulk write is in flight."""
+
+    def __init__(self, docs, write):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.write = write
+        self.bulk_writes = 0
+
+    def find(self, query, projection=None):
+        return [dict(self.docs[doc_id]) for doc_id in query["_id"]["$in"]]
+
+    def bulk_write(self, updates, ordered=True):
+        self.bulk_writes += 1
+        if self.write:
+            self.write(self.docs)
+            self.write = None
+        matched = 0
+        for query, update in updates:
+            doc = self.docs[query["_id"]]
+            if doc.get("updatedAt") == query["updatedAt"]:
+                doc.update(update["$set"])
+                matched += 1
+        return SimpleNamespace(matched_count=matched, modified_count=matched)
+
+def test_migrate_does_not_revert_concurrent_writes(monkeypatch):
+    """A session saved between the read and the write is read again, keeping the new rating."""
+    import manage_text_codec
+
+    def rate(docs):
+        docs[2]["bulletIterations"] = [{"iterations": [{"bulletText": RESUME, "userRating": 6}]}]
+        docs[2]["updatedAt"] = 2
+
+    read = [{"_id": n, "updatedAt": 1, "bulletIterations": [{"iterations": [{"bulletText": RESUME}]}]} for n in (1, 2)]
+    sessions = RacingSessions([dict(doc) for doc in read], rate)
+    codec = TextCodec(DictionaryStore(), enabled=True)
+    monkeypatch.setattr(manage_text_codec, "collection", sessions)
+    monkeypatch.setattr(manage_text_codec, "text_codec", codec)
+    monkeypatch.setattr(manage_text_codec, "UpdateOne", lambda query, update: (query, update))
+
+    assert manage_text_codec._recompress_sessions(read) == (2, 0)
+    assert sessions.bulk_writes == 2
+    rated = codec.decode_document(sessions.docs[2])["bulletIterations"][0]["iterations"][0]
+    assert rated == {"bulletText": RESUME, "userRating": 6}
+    assert isinstance(sessions.docs[1]["bulletIterations"][0]["iterations"][0]["bulletText"], Binary)
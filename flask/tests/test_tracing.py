@@ -0,0 +1,58 @@
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+from utils.tracing import init_tracing, span, trace_logger, traced
+
+@traced("work.inner")
+def inner():
+    return 42
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    init_tracing(app)
+
+    @app.route("/lab/ok")
+    def ok():
+        with span("work.outer", step="a"):
+            inner()
+        return jsonify({"ok": True})
+
+    @app.route("/lab/fail")
+    def fail():
+        with span("work.failing"):
+            raise ValueError("boom")
+
+    return app
+
+@pytest.fixture
+def trace_lines(monkeypatch):
+    lines = []
+    monkeypatch.setattr(trace_logger, "info", lines.append)
+    return lines
+
+def test_request_logs_nested_spans_with_request_id(app, trace_lines):
+    """Each request logs one JSON line whose spans keep their nesting."""
+    response = app.test_client().get("/lab/ok", headers={"X-Request-ID": "req-1"})
+    assert response.headers["X-Request-ID"] == "req-1"
+
+    entry = json.loads(trace_lines[0])
+    assert entry["requestId"] == "req-1"
+    assert entry["status"] == 200
+    names = [(s["name"], s["parent"]) for s in entry["spans"]]
+    assert names == [("work.outer", None), ("work.inner", 0), ("json.serialize", None)]
+    assert entry["spans"][0]["attributes"] == {"step": "a"}
+
+def test_failing_span_records_error(app, trace_lines):
+    """An exception inside a span is recorded on it and the request logs as a 500."""
+    app.test_client().get("/lab/fail")
+    entry = json.loads(trace_lines[0])
+    assert entry["status"] == 500
+    assert entry["spans"][0]["error"] == "ValueError('boom')"
+
+def test_span_outside_request_is_a_no_op():
+    """Spans used from background threads or scripts just run the block."""
+    with span("work.background"):
+        assert inner() == 42
@@ -1,6 +1,7 @@
 from functools import wraps
-from flask import jsonify, session
-from services.mongodb_service import db
+from bson.objectid import ObjectId
+from flask import jsonify, request, session
+from services.mongodb_service import db, token_owns_session
 
 def token_required(f):
     @wraps(f)
@@ -18,3 +19,24 @@ def token_required(f):
             
         return f(*args, **kwargs)
     return decorated_function
+
+def session_owner_required(f):
+    """Answer 404 unless the session_id in the URL or JSON body belongs to the participant's token.
+
+    Use below @token_required. Session ids are guessable, so any other
+    session looks the same as one that does not exist. A missing or
+    malformed id is left for the view to reject, so an endpoint that
+    creates the session can still be called without one.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        session_id = kwargs.get("session_id")
+        if session_id is None:
+            data = request.get_json(silent=True)
+            session_id = data.get("session_id") if isinstance(data, dict) else None
+
+        if isinstance(session_id, str) and ObjectId.is_valid(session_id):
+            if not token_owns_session(session["token"], session_id):
+                return jsonify({"error": "Session not found"}), 404
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,119 @@
+import math
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while its circuit is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} is temporarily unavailable; retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """Fail fast while a dependency is failing or too slow.
+
+    The outcome of the last `window` calls is kept; a call that raises or
+    takes longer than `slow_call_seconds` counts as a failure. Once at
+    least `min_calls` are recorded and the failure rate reaches
+    `failure_rate`, the circuit opens and calls raise CircuitOpenError for
+    `open_seconds`. After that a single trial call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name, window=20, min_calls=5, failure_rate=0.5, slow_call_seconds=30, open_seconds=30):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self._outcomes = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _retry_after(self, now):
+        return max(1, math.ceil(self._opened_at + self.open_seconds - now))
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go ahead now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(self.name, self._retry_after(now) if self._state == OPEN else 1)
+
+    def check(self):
+        """Raise CircuitOpenError if a call would be refused now, without taking the half-open trial.
+
+        Lets callers skip work they would do before the call (queueing for
+        budget, say) while the circuit is open.
+        """
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at < self.open_seconds:
+                raise CircuitOpenError(self.name, self._retry_after(now))
+            if self._state == HALF_OPEN and self._trial_in_flight:
+                raise CircuitOpenError(self.name, 1)
+
+    def record(self, succeeded, duration):
+        """Record the outcome of a call that before_call let through."""
+        failed = not succeeded or duration > self.slow_call_seconds
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+                if failed:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append(failed)
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker."""
+        self.before_call()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+        return result
+
+    def snapshot(self):
+        with self._lock:
+            state = self._state
+            if state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                state = HALF_OPEN
+            return {
+                "state": state,
+                "recentCalls": len(self._outcomes),
+                "recentFailures": sum(self._outcomes),
+                "retryAfter": self._retry_after(time.monotonic()) if state == OPEN else 0,
+            }
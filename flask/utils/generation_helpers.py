@@ -1,6 +1,10 @@
 import time
 import sys
 
+from utils.circuit_breaker import CircuitOpenError
+from services.llm_scheduler import QueueTimeoutError
+from utils.tracing import span
+
 def retry_generation(
     generation_fn,
     validator_fn,
@@ -15,15 +19,20 @@ def retry_generation(
 
     for attempt in range(1, retries + 2):  # includes initial try
         try:
-            result = generation_fn(*args, **kwargs)
+            with span("generation.attempt", label=debug_label, attempt=attempt):
+                result = generation_fn(*args, **kwargs)
+                valid = validator_fn(result)
 
-            if validator_fn(result):
+            if valid:
                 if debug_label:
                     print(f"[{debug_label}] Success on attempt {attempt}")
                     sys.stdout.flush()
                 return result
             else:
                 print(f"[{debug_label}] Validation failed on attempt {attempt}")
+        except (CircuitOpenError, QueueTimeoutError):
+            # Retrying cannot help until the circuit closes or budget frees up
+            raise
         except Exception as e:
             print(f"[{debug_label}] Exception on attempt {attempt}: {e}")
 
@@ -31,3 +40,192 @@ def retry_generation(
 
     print(f"[{debug_label}] All {retries + 1} attempts failed.")
     return None
+
+
+# Bounds on the feedback history carried into the final synthesis prompt
+DIGEST_FEEDBACK_PER_BULLET = 5
+DIGEST_FEEDBACK_MAX_CHARS = 500
+
+
+def _final_iteration(bullet_data):
+    iterations = bullet_data.get("iterations", [])
+    final_iteration = bullet_data.get("finalIteration")
+    if final_iteration is None:
+        return iterations[-1] if iterations else None
+    for iteration in reversed(iterations):
+        if iteration.get("iterationNumber") == final_iteration:
+            return iteration
+    return None
+
+
+def split_bullet_history(bullet_iterations, bullet_index, skip_pending=False):
+    """Return (latest iteration, earlier iterations) for one bullet.
+
+    The latest iteration is None when nothing has been saved for the bullet.
+    With skip_pending, regenerated iterations the participant has not rated
+    yet are left out.
+    """
+    for bullet_data in bullet_iterations:
+        if bullet_data.get("bulletIndex") == bullet_index:
+            iterations = sorted(
+                (iteration for iteration in bullet_data.get("iterations", [])
+                 if not (skip_pending and iteration.get("pending"))),
+                key=lambda iteration: iteration.get("iterationNumber") or 0
+            )
+            if iterations:
+                return iterations[-1], iterations[:-1]
+            break
+    return None, []
+
+
+def pending_iteration(bullet_iterations, bullet_index, source_iteration):
+    """The regenerated iteration stored for `source_iteration` that is not rated yet, or None.
+
+    regenerate-bullet stores its result as pending straight away, so a reload
+    or retry before the participant rates it gets the same bullet back
+    instead of paying for another generation.
+    """
+    for bullet_data in bullet_iterations:
+        if bullet_data.get("bulletIndex") == bullet_index:
+            for iteration in bullet_data.get("iterations", []):
+                if iteration.get("pending") and iteration.get("sourceIteration") == source_iteration:
+                    return iteration
+    return None
+
+
+def build_feedback_digest(bullet_iterations):
+    """Pre-render the finalBullets and allFeedback text used by final synthesis.
+
+    Only the most recent DIGEST_FEEDBACK_PER_BULLET rated or commented
+    iterations per bullet are kept, each truncated to
+    DIGEST_FEEDBACK_MAX_CHARS, so the prompt stays bounded however many
+    times a participant regenerated.
+    """
+    final_bullets = ""
+    all_feedback = ""
+
+    for bullet_data in bullet_iterations:
+        bullet_index = bullet_data.get("bulletIndex", 0)
+
+        final_iter = _final_iteration(bullet_data)
+        if final_iter:
+            final_bullets += f"Bullet {bullet_index + 1}: {final_iter.get('bulletText', '')}\n"
+            final_bullets += f"Rationale: {final_iter.get('rationale', '')}\n\n"
+
+        all_feedback += f"Bullet {bullet_index + 1} feedback:\n"
+        with_feedback = [
+            iteration for iteration in bullet_data.get("iterations", [])
+            if iteration.get("userRating") is not None or iteration.get("userFeedback")
+        ]
+        omitted = len(with_feedback) - DIGEST_FEEDBACK_PER_BULLET
+        if omitted > 0:
+            all_feedback += f"  ({omitted} earlier rounds of feedback omitted)\n"
+            with_feedback = with_feedback[omitted:]
+        for iteration in with_feedback:
+            if iteration.get("userRating") is not None:
+                all_feedback += f"  Rating: {iteration.get('userRating')}/7\n"
+            if iteration.get("userFeedback"):
+                all_feedback += f"  Feedback: \"{iteration.get('userFeedback')[:DIGEST_FEEDBACK_MAX_CHARS]}\"\n"
+        all_feedback += "\n"
+
+    return {"finalBullets": final_bullets, "allFeedback": all_feedback}
+
+
+# Generation details kept from the stored iteration when a save omits them
+SERVER_RECORDED_FIELDS = ("promptVersion", "promptType", "generationSettings")
+
+
+def merge_iteration(bullet_iterations, bullet_index, iteration_data, is_final=False):
+    """Add or replace one iteration in a session's bulletIterations and return the list.
+
+    Missing bullets up to bullet_index are created. An iteration with the
+    same iterationNumber is replaced, keeping the generation details recorded
+    server-side when the new data does not carry them. With is_final the
+    bullet's finalIteration points at this iteration.
+    """
+    while len(bullet_iterations) <= bullet_index:
+        bullet_iterations.append({
+            "bulletIndex": len(bullet_iterations),
+            "iterations": [],
+            "finalIteration": None
+        })
+
+    bullet_data = bullet_iterations[bullet_index]
+    iteration_number = iteration_data["iterationNumber"]
+    for i, iteration in enumerate(bullet_data["iterations"]):
+        if iteration.get("iterationNumber") == iteration_number:
+            for field in SERVER_RECORDED_FIELDS:
+                if iteration_data.get(field) is None and iteration.get(field) is not None:
+                    iteration_data[field] = iteration[field]
+            bullet_data["iterations"][i] = iteration_data
+            break
+    else:
+        bullet_data["iterations"].append(iteration_data)
+
+    if is_final:
+        bullet_data["finalIteration"] = iteration_number
+    return bullet_iterations
+
+
+def session_stage(session_doc):
+    """The study step a session has reached, from what it has stored.
+
+    One of "input", "control_profile", "bullet_refinement",
+    "aligned_profile", "comparison" or "completed", matching the
+    participant views.
+    """
+    control_profile = session_doc.get("controlProfile") or {}
+    aligned_profile = session_doc.get("alignedProfile") or {}
+    bullet_iterations = session_doc.get("bulletIterations") or []
+
+    if session_doc.get("completed"):
+        return "completed"
+    if aligned_profile.get("likertResponses"):
+        return "comparison"
+    if aligned_profile.get("text") or (
+        bullet_iterations and all(bullet.get("finalIteration") is not None for bullet in bullet_iterations)
+    ):
+        return "aligned_profile"
+    if control_profile.get("likertResponses"):
+        return "bullet_refinement"
+    if control_profile.get("text"):
+        return "control_profile"
+    return "input"
+
+
+def session_state(session_doc):
+    """What a participant's client needs to resume a session without generating anything."""
+    control_profile = session_doc.get("controlProfile") or {}
+    aligned_profile = session_doc.get("alignedProfile") or {}
+    bullet_iterations = session_doc.get("bulletIterations") or []
+
+    bullets = []
+    for bullet_data in bullet_iterations:
+        bullet_index = bullet_data.get("bulletIndex", len(bullets))
+        latest, history = split_bullet_history(bullet_iterations, bullet_index)
+        if latest is None:
+            continue
+        bullets.append({
+            "index": bullet_index,
+            "text": latest.get("bulletText", ""),
+            "rationale": latest.get("rationale", ""),
+            "iteration_number": latest.get("iterationNumber"),
+            "iteration_count": len(history) + 1,
+            "user_rating": latest.get("userRating"),
+            "user_feedback": latest.get("userFeedback", ""),
+            "final_iteration": bullet_data.get("finalIteration"),
+        })
+
+    return {
+        "stage": session_stage(session_doc),
+        "completed": bool(session_doc.get("completed")),
+        "control_profile": {
+            "text": control_profile["text"],
+            "survey_completed": bool(control_profile.get("likertResponses")),
+        } if control_profile.get("text") else None,
+        "bullets": bullets,
+        "aligned_profile": {
+            "text": aligned_profile["text"],
+            "survey_completed": bool(aligned_profile.get("likertResponses")),
+        } if aligned_profile.get("text") else None,
+    }
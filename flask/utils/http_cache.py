@@ -0,0 +1,38 @@
+import hashlib
+from functools import wraps
+from flask import request, make_response
+
+def make_etag(stamp):
+    """ETag for a version stamp, scoped to the request path and query string."""
+    key = repr((request.path, request.query_string, stamp)).encode("utf-8")
+    return hashlib.sha1(key).hexdigest()
+
+def conditional_get(version_fn):
+    """Answer If-None-Match with 304 when the view's data has not changed.
+
+    `version_fn` receives the view's arguments and returns a cheap stamp
+    (counts, latest ids, timestamps) that changes whenever the response
+    would. The stamp is taken before the view runs, so a write that lands
+    in between only makes the next poll refetch.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                etag = make_etag(version_fn(*args, **kwargs))
+            except Exception as e:
+                print("Error computing ETag:", e)
+                return f(*args, **kwargs)
+
+            if request.if_none_match.contains(etag):
+                response = make_response("", 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Let browsers keep the body but revalidate on every poll
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return decorated_function
+    return decorator
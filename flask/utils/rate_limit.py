@@ -0,0 +1,148 @@
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify, request, session
+from pymongo import ReturnDocument
+
+from services.mongodb_service import db
+
+# Memory buckets idle this long have refilled completely and can be dropped
+IDLE_BUCKET_SECONDS = 3600
+MAX_MEMORY_BUCKETS = 10000
+
+
+def rate_limit_enabled():
+    return os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def rate_limit_backend():
+    """"memory" (per worker process) or "mongo" (shared by every worker)."""
+    return os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+
+
+class MemoryBuckets:
+    """Token buckets kept in this process."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Take one token from the bucket. Returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                if len(self._buckets) > MAX_MEMORY_BUCKETS:
+                    self._prune(now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def refund(self, key, capacity):
+        """Give back a token taken for a request that was refused elsewhere."""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + 1), updated)
+
+    def _prune(self, now):
+        for key, (_, updated) in list(self._buckets.items()):
+            if now - updated > IDLE_BUCKET_SECONDS:
+                del self._buckets[key]
+
+
+class MongoBuckets:
+    """Token buckets shared by all workers, refilled atomically on the server.
+
+    Each take is a single upserting pipeline update that refills the bucket
+    from the server clock ($$NOW) and takes a token if one is available, so
+    concurrent requests from different workers cannot both take the last one.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def take(self, key, capacity, rate):
+        elapsed_seconds = {"$divide": [
+            {"$subtract": ["$$NOW", {"$ifNull": ["$updatedAt", "$$NOW"]}]}, 1000
+        ]}
+        bucket = self.collection.find_one_and_update(
+            {"_id": "|".join(key)},
+            [
+                {"$set": {
+                    "tokens": {"$min": [capacity, {"$add": [
+                        {"$ifNull": ["$tokens", capacity]},
+                        {"$multiply": [elapsed_seconds, rate]},
+                    ]}]},
+                    "updatedAt": "$$NOW",
+                }},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if bucket["allowed"]:
+            return 0
+        return (1 - bucket["tokens"]) / rate
+
+
+memory_buckets = MemoryBuckets()
+mongo_buckets = MongoBuckets(db["rate_limits"])
+
+
+def take_token(key, capacity, rate):
+    """Seconds until the caller may retry, or 0 when the request is allowed.
+
+    The memory bucket is checked first. A worker only sees part of a
+    participant's requests, so when it is already empty the shared bucket
+    would be too and Mongo is skipped. If Mongo cannot be reached the
+    memory decision stands.
+    """
+    wait = memory_buckets.take(key, capacity, rate)
+    if wait or rate_limit_backend() != "mongo":
+        return wait
+    try:
+        wait = mongo_buckets.take(key, capacity, rate)
+    except Exception as e:
+        print("Error checking rate limit:", e)
+        return 0
+    if wait:
+        # Keep the memory bucket a lower bound of what this participant used
+        memory_buckets.refund(key, capacity)
+    return wait
+
+
+def rate_limited(capacity, refill_seconds):
+    """Limit each participant to `capacity` calls in a burst, with one more every `refill_seconds`.
+
+    Buckets are keyed by the session token and the endpoint, so use this
+    below @token_required. Over the limit the view is not called and a 429
+    with Retry-After is returned.
+    """
+    rate = 1 / refill_seconds
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not rate_limit_enabled():
+                return f(*args, **kwargs)
+
+            wait = take_token((session.get("token", ""), request.endpoint), capacity, rate)
+            if wait:
+                retry_after = max(1, math.ceil(wait))
+                response = jsonify({
+                    "error": "Too many requests. Please wait a moment and try again.",
+                    "retry_after": retry_after
+                })
+                response.headers["Retry-After"] = str(retry_after)
+                return response, 429
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+# Only requests under these prefixes are logged
+TRACED_PREFIXES = ("/lab/", "/api/admin/")
+
+trace_logger = logging.getLogger("letterlab.trace")
+
+# OpenTelemetry tracer when OTLP export is configured and the SDK is installed
+_otel_tracer = None
+
+
+def trace_log_threshold_ms():
+    """Requests faster than this are not logged; 0 logs every traced request."""
+    return float(os.getenv("TRACE_LOG_THRESHOLD_MS", "0"))
+
+
+def current_request_id():
+    if has_request_context():
+        return g.get("request_id")
+    return None
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block as a span of the current request. Outside a request it only runs the block."""
+    if not has_request_context() or "trace_spans" not in g:
+        yield
+        return
+
+    record = {
+        "name": name,
+        "parent": g.trace_stack[-1] if g.trace_stack else None,
+        "startNs": time.time_ns(),
+    }
+    if attributes:
+        record["attributes"] = attributes
+    g.trace_spans.append(record)
+    g.trace_stack.append(len(g.trace_spans) - 1)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record["error"] = repr(e)
+        raise
+    finally:
+        record["durationMs"] = round((time.perf_counter() - started) * 1000, 3)
+        record["endNs"] = record["startNs"] + int(record["durationMs"] * 1e6)
+        g.trace_stack.pop()
+
+
+def traced(name):
+    """Decorator recording every call of a function as a span."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            with span(name):
+                return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+class TracedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with response serialization recorded as a span."""
+
+    def dumps(self, obj, **kwargs):
+        with span("json.serialize"):
+            return super().dumps(obj, **kwargs)
+
+
+def _start_trace():
+    # Keep an id set by a proxy so its logs and ours line up
+    incoming = request.headers.get("X-Request-ID", "")
+    g.request_id = incoming if 0 < len(incoming) <= 128 and incoming.isprintable() else uuid.uuid4().hex
+    g.trace_started = time.perf_counter()
+    g.trace_start_ns = time.time_ns()
+    g.trace_spans = []
+    g.trace_stack = []
+
+
+def _add_request_id(response):
+    if "request_id" in g:
+        response.headers["X-Request-ID"] = g.request_id
+        g.trace_status = response.status_code
+    return response
+
+
+def _public_span(record):
+    return {key: value for key, value in record.items() if key not in ("startNs", "endNs")}
+
+
+def _finish_trace(error=None):
+    if "trace_spans" not in g or not request.path.startswith(TRACED_PREFIXES):
+        return
+    duration_ms = round((time.perf_counter() - g.trace_started) * 1000, 3)
+    entry = {
+        "type": "request_trace",
+        "requestId": g.request_id,
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": g.get("trace_status", 500),
+        "durationMs": duration_ms,
+        "spans": [
+            dict(_public_span(record), offsetMs=round((record["startNs"] - g.trace_start_ns) / 1e6, 3))
+            for record in g.trace_spans
+        ],
+    }
+    if error is not None:
+        entry["error"] = repr(error)
+
+    try:
+        if duration_ms >= trace_log_threshold_ms():
+            trace_logger.info(json.dumps(entry, default=str))
+        if _otel_tracer is not None:
+            _export_otel(entry, g.trace_spans, g.trace_start_ns, g.trace_start_ns + int(duration_ms * 1e6))
+    except Exception as e:
+        print("Error writing request trace:", e)
+
+
+def _export_otel(entry, records, start_ns, end_ns):
+    from opentelemetry import trace
+
+    root = _otel_tracer.start_span(
+        f"{entry['method']} {entry['endpoint'] or entry['path']}",
+        start_time=start_ns,
+        attributes={
+            "http.method": entry["method"],
+            "http.route": entry["path"],
+            "http.status_code": entry["status"],
+            "request.id": entry["requestId"],
+        },
+    )
+    spans = []
+    for record in records:
+        parent = root if record["parent"] is None else spans[record["parent"]]
+        attributes = {key: str(value) for key, value in record.get("attributes", {}).items()}
+        if "error" in record:
+            attributes["error"] = record["error"]
+        child = _otel_tracer.start_span(
+            record["name"],
+            context=trace.set_span_in_context(parent),
+            start_time=record["startNs"],
+            attributes=attributes,
+        )
+        spans.append(child)
+    # Children end before their parents
+    for child, record in reversed(list(zip(spans, records))):
+        child.end(end_time=record.get("endNs", end_ns))
+    root.end(end_time=end_ns)
+
+
+def _init_otel():
+    """Export spans over OTLP/HTTP when OTEL_EXPORTER_OTLP_ENDPOINT is set and the SDK is installed."""
+    global _otel_tracer
+    if not os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk and "
+              "opentelemetry-exporter-otlp-proto-http are not installed; logging traces only")
+        return
+
+    service_name = os.getenv("OTEL_SERVICE_NAME", "letterlab-backend")
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    _otel_tracer = provider.get_tracer("letterlab")
+
+
+def init_tracing(app):
+    """Give every request an id (X-Request-ID) and log its spans as one JSON line.
+
+    Spans are recorded with `span` and `traced`. The log line goes to the
+    letterlab.trace logger on stdout; with OTLP configured the same spans
+    are also exported to the collector.
+    """
+    if not trace_logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.propagate = False
+    _init_otel()
+
+    app.json = TracedJSONProvider(app)
+    app.before_request(_start_trace)
+    app.after_request(_add_request_id)
+    app.teardown_request(_finish_trace)
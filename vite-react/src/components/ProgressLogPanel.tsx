@@ -38,6 +38,24 @@ export function ProgressLogPanel() {
 
   useEffect(() => {
     fetchProgressLog();
+
+    // Live updates pushed by the server instead of polling
+    const source = new EventSource(
+      `${import.meta.env.VITE_API_BASE_URL}/api/admin/events/stream`,
+      { withCredentials: true }
+    );
+    source.addEventListener("progress_log", (e) => {
+      const event: ProgressEvent = JSON.parse((e as MessageEvent).data);
+      setEvents((prev) => [event, ...prev]);
+    });
+    source.addEventListener("sessions", (e) => {
+      if (JSON.parse((e as MessageEvent).data).completed) {
+        fetchProgressLog();
+      }
+    });
+    source.addEventListener("resync", () => fetchProgressLog());
+
+    return () => source.close();
   }, []);
 
   return (
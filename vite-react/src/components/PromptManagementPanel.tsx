@@ -15,12 +15,41 @@ interface Prompt {
   createdAt: string;
   modifiedBy: string;
   isActive: boolean;
+  model?: string;
+  temperature?: number;
+  maxTokens?: number;
+  timeout?: number;
 }
 
+// Model settings as edited in the form; empty strings mean "use the default"
+interface SettingsForm {
+  model: string;
+  temperature: string;
+  maxTokens: string;
+  timeout: string;
+}
+
+const emptySettings: SettingsForm = { model: "", temperature: "", maxTokens: "", timeout: "" };
+
+const settingsFromPrompt = (prompt: Prompt): SettingsForm => ({
+  model: prompt.model ?? "",
+  temperature: prompt.temperature?.toString() ?? "",
+  maxTokens: prompt.maxTokens?.toString() ?? "",
+  timeout: prompt.timeout?.toString() ?? "",
+});
+
+const settingsPayload = (form: SettingsForm) => ({
+  model: form.model.trim() || null,
+  temperature: form.temperature === "" ? null : Number(form.temperature),
+  maxTokens: form.maxTokens === "" ? null : Number(form.maxTokens),
+  timeout: form.timeout === "" ? null : Number(form.timeout),
+});
+
 interface PromptHistory {
   _id: string;
   promptType: string;
-  content: string;
+  contentHash: string;
+  size: number;
   version: number;
   createdAt: string;
   modifiedBy: string;
@@ -32,6 +61,8 @@ export function PromptManagementPanel() {
   const [editingPrompt, setEditingPrompt] = useState<string | null>(null);
   const [editContent, setEditContent] = useState("");
   const [originalContent, setOriginalContent] = useState("");
+  const [editSettings, setEditSettings] = useState<SettingsForm>(emptySettings);
+  const [originalSettings, setOriginalSettings] = useState<SettingsForm>(emptySettings);
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [error, setError] = useState("");
@@ -39,6 +70,9 @@ export function PromptManagementPanel() {
   const [showHistory, setShowHistory] = useState<string | null>(null);
   const [history, setHistory] = useState<PromptHistory[]>([]);
   const [reverting, setReverting] = useState<string | null>(null);
+  // Version content keyed by content hash, fetched only when expanded
+  const [historyContent, setHistoryContent] = useState<Record<string, string>>({});
+  const [loadingContent, setLoadingContent] = useState<string | null>(null);
 
   const promptTypeLabels: Record<string, string> = {
     control: "Control Profile Generation",
@@ -93,10 +127,37 @@ export function PromptManagementPanel() {
     }
   };
 
+  const fetchVersionContent = async (historyItem: PromptHistory) => {
+    if (historyContent[historyItem.contentHash] !== undefined) {
+      return;
+    }
+
+    setLoadingContent(historyItem._id);
+    try {
+      const response = await fetch(
+        `${apiBase}/api/admin/prompts/${historyItem.promptType}/versions/${historyItem.version}`,
+        { credentials: "include" }
+      );
+
+      if (response.ok) {
+        const data = await response.json();
+        setHistoryContent((prev) => ({ ...prev, [historyItem.contentHash]: data.prompt.content }));
+      } else {
+        setError("Failed to fetch prompt version");
+      }
+    } catch (err) {
+      setError("Error fetching prompt version");
+    } finally {
+      setLoadingContent(null);
+    }
+  };
+
   const handleEdit = (prompt: Prompt) => {
     setEditingPrompt(prompt.promptType);
     setEditContent(prompt.content);
     setOriginalContent(prompt.content);
+    setEditSettings(settingsFromPrompt(prompt));
+    setOriginalSettings(settingsFromPrompt(prompt));
     setError("");
     setSuccess("");
   };
@@ -119,6 +180,7 @@ export function PromptManagementPanel() {
         credentials: "include",
         body: JSON.stringify({
           content: editContent,
+          settings: settingsPayload(editSettings),
         }),
       });
 
@@ -142,12 +204,17 @@ export function PromptManagementPanel() {
     setEditingPrompt(null);
     setEditContent("");
     setOriginalContent("");
+    setEditSettings(emptySettings);
+    setOriginalSettings(emptySettings);
     setError("");
     setSuccess("");
   };
 
   const hasContentChanged = () => {
-    return editContent.trim() !== originalContent.trim();
+    return (
+      editContent.trim() !== originalContent.trim() ||
+      JSON.stringify(editSettings) !== JSON.stringify(originalSettings)
+    );
   };
 
   const handleShowHistory = async (promptType: string) => {
@@ -324,6 +391,29 @@ export function PromptManagementPanel() {
                 </div>
               )}
 
+              {/* Model Settings */}
+              {editingPrompt === prompt.promptType && (
+                <div className="mt-3 grid grid-cols-4 gap-2">
+                  {([
+                    ["model", "Model", "gpt-4o"],
+                    ["temperature", "Temperature", "default"],
+                    ["maxTokens", "Max tokens", "default"],
+                    ["timeout", "Timeout (s)", "default"],
+                  ] as [keyof SettingsForm, string, string][]).map(([field, label, placeholder]) => (
+                    <label key={field} className="text-xs text-gray-600">
+                      {label}
+                      <input
+                        type={field === "model" ? "text" : "number"}
+                        value={editSettings[field]}
+                        placeholder={placeholder}
+                        onChange={(e) => setEditSettings({ ...editSettings, [field]: e.target.value })}
+                        className="mt-1 w-full rounded border px-2 py-1 text-sm"
+                      />
+                    </label>
+                  ))}
+                </div>
+              )}
+
               {/* Available Variables Panel */}
               {editingPrompt === prompt.promptType && (
                 <div className="mt-3 p-3 bg-blue-50 border border-blue-200 rounded">
@@ -360,7 +450,7 @@ export function PromptManagementPanel() {
               <div className="flex items-center justify-between mt-3 text-xs text-gray-500">
                 <div className="flex items-center">
                   <User className="h-3 w-3 mr-1" />
-                  {prompt.modifiedBy} • v{prompt.version}
+                  {prompt.modifiedBy} • v{prompt.version} • {prompt.model || "gpt-4o"}
                 </div>
                 <div>{formatDate(prompt.createdAt)}</div>
               </div>
@@ -396,9 +486,25 @@ export function PromptManagementPanel() {
                             )}
                           </div>
                         </div>
-                        <div className="text-gray-600 font-mono text-xs bg-white p-2 rounded border whitespace-pre-wrap">
-                          {historyItem.content}
-                        </div>
+                        {historyContent[historyItem.contentHash] !== undefined ? (
+                          <div className="text-gray-600 font-mono text-xs bg-white p-2 rounded border whitespace-pre-wrap">
+                            {historyContent[historyItem.contentHash]}
+                          </div>
+                        ) : (
+                          <Button
+                            onClick={() => fetchVersionContent(historyItem)}
+                            disabled={loadingContent === historyItem._id}
+                            size="sm"
+                            variant="ghost"
+                            className="h-6 px-2 text-xs"
+                          >
+                            {loadingContent === historyItem._id ? (
+                              <RefreshCw className="h-3 w-3 animate-spin" />
+                            ) : (
+                              `Show content (${historyItem.size} bytes)`
+                            )}
+                          </Button>
+                        )}
                         <div className="text-gray-500 mt-2 text-xs">
                           Modified by: {historyItem.modifiedBy}
                         </div>
@@ -1,5 +1,7 @@
 import { Button } from "@/components/ui/button";
-import { useEffect, useState } from "react";
+import { Input } from "@/components/ui/input";
+import { Tabs, TabsList, TabsTrigger } from "@/components/ui/tabs";
+import { useEffect, useRef, useState } from "react";
 import { useAdminContext } from "@/context/useAdminContext";
 import { Navigate, useNavigate } from "react-router-dom";
 import { RefreshCw } from "lucide-react";
@@ -49,30 +51,92 @@ interface Token {
   created_at: string;
   used_at?: string;
   session_id?: string;
+  cohort?: string;
+}
+
+type TokenStatus = "all" | "used" | "unused";
+
+interface TokenFilters {
+  prefix: string;
+  cohort: string;
+  createdFrom: string;
+  createdTo: string;
+  hasSession: "" | "true" | "false";
+}
+
+interface TokenCounts {
+  total: number;
+  used: number;
+  unused: number;
+}
+
+const TOKEN_PAGE_SIZE = 50;
+
+const emptyFilters: TokenFilters = {
+  prefix: "",
+  cohort: "",
+  createdFrom: "",
+  createdTo: "",
+  hasSession: "",
+};
+
+// Query string for one page of /api/admin/tokens; dates are whole UTC days
+function tokenQuery(status: TokenStatus, filters: TokenFilters, cursor?: string) {
+  const params = new URLSearchParams({ limit: String(TOKEN_PAGE_SIZE) });
+  if (status !== "all") params.set("status", status);
+  if (filters.prefix.trim()) params.set("prefix", filters.prefix.trim());
+  if (filters.cohort.trim()) params.set("cohort", filters.cohort.trim());
+  if (filters.createdFrom) params.set("created_from", `${filters.createdFrom}T00:00:00Z`);
+  if (filters.createdTo) {
+    const end = new Date(`${filters.createdTo}T00:00:00Z`);
+    end.setUTCDate(end.getUTCDate() + 1);
+    params.set("created_to", `${end.toISOString().slice(0, 10)}T00:00:00Z`);
+  }
+  if (filters.hasSession) params.set("has_session", filters.hasSession);
+  if (cursor) params.set("cursor", cursor);
+  return params.toString();
 }
 
 // Main admin dashboard layout
 export function AdminDashboardView() {
   const [newToken, setNewToken] = useState<string | null>(null);
   const [tokens, setTokens] = useState<Token[]>([]);
+  const [tokenCounts, setTokenCounts] = useState<TokenCounts | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [tokenStatus, setTokenStatus] = useState<TokenStatus>("all");
+  const [tokenFilters, setTokenFilters] = useState<TokenFilters>(emptyFilters);
   const [isRefreshing, setIsRefreshing] = useState(false);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+  // Only the latest request may update the list, so slow responses to old filters are dropped
+  const tokenRequest = useRef(0);
   const { isAdmin, setIsAdmin } = useAdminContext();
   const navigate = useNavigate();
 
   useEffect(() => {
-    fetchTokens();
-  }, []);
+    // Wait for typing in the filter inputs to pause before querying
+    const timer = setTimeout(() => fetchTokens(), 300);
+    return () => clearTimeout(timer);
+  }, [tokenStatus, tokenFilters]);
+
+  const fetchTokenPage = async (cursor?: string) => {
+    const request = ++tokenRequest.current;
+    const res = await fetch(
+      `${apiBase}/api/admin/tokens?${tokenQuery(tokenStatus, tokenFilters, cursor)}`,
+      { credentials: "include" }
+    );
+    if (!res.ok || request !== tokenRequest.current) {
+      return;
+    }
+    const data = await res.json();
+    setTokens((current) => (cursor ? [...current, ...data.tokens] : data.tokens));
+    setTokenCounts(data.counts);
+    setNextCursor(data.next_cursor);
+  };
 
   const fetchTokens = async () => {
     setIsRefreshing(true);
     try {
-      const res = await fetch(`${apiBase}/api/admin/tokens`, {
-        credentials: "include",
-      });
-      if (res.ok) {
-        const data = await res.json();
-        setTokens(data.tokens);
-      }
+      await fetchTokenPage();
     } catch (error) {
       console.error("Error fetching tokens:", error);
     } finally {
@@ -80,6 +144,22 @@ export function AdminDashboardView() {
     }
   };
 
+  const loadMoreTokens = async () => {
+    if (!nextCursor) return;
+    setIsLoadingMore(true);
+    try {
+      await fetchTokenPage(nextCursor);
+    } catch (error) {
+      console.error("Error fetching tokens:", error);
+    } finally {
+      setIsLoadingMore(false);
+    }
+  };
+
+  const updateFilter = (field: keyof TokenFilters, value: string) => {
+    setTokenFilters((current) => ({ ...current, [field]: value }));
+  };
+
   const handleInvalidateToken = async (token: string) => {
     try {
       const res = await fetch(`${apiBase}/api/admin/tokens/invalidate`, {
@@ -172,10 +252,56 @@ export function AdminDashboardView() {
                 </div>
               )}
 
+              {/* Token Filters */}
+              <Tabs value={tokenStatus} onValueChange={(value) => setTokenStatus(value as TokenStatus)}>
+                <TabsList className="mb-2">
+                  <TabsTrigger value="all">All ({tokenCounts?.total ?? 0})</TabsTrigger>
+                  <TabsTrigger value="unused">Unused ({tokenCounts?.unused ?? 0})</TabsTrigger>
+                  <TabsTrigger value="used">Used ({tokenCounts?.used ?? 0})</TabsTrigger>
+                </TabsList>
+              </Tabs>
+              <div className="grid grid-cols-2 lg:grid-cols-5 gap-2 text-xs text-gray-600">
+                <Input
+                  placeholder="Token prefix"
+                  value={tokenFilters.prefix}
+                  onChange={(e) => updateFilter("prefix", e.target.value)}
+                  className="h-8 text-xs"
+                />
+                <Input
+                  placeholder="Cohort"
+                  value={tokenFilters.cohort}
+                  onChange={(e) => updateFilter("cohort", e.target.value)}
+                  className="h-8 text-xs"
+                />
+                <Input
+                  type="date"
+                  title="Created from (UTC)"
+                  value={tokenFilters.createdFrom}
+                  onChange={(e) => updateFilter("createdFrom", e.target.value)}
+                  className="h-8 text-xs"
+                />
+                <Input
+                  type="date"
+                  title="Created up to and including (UTC)"
+                  value={tokenFilters.createdTo}
+                  onChange={(e) => updateFilter("createdTo", e.target.value)}
+                  className="h-8 text-xs"
+                />
+                <select
+                  value={tokenFilters.hasSession}
+                  onChange={(e) => updateFilter("hasSession", e.target.value)}
+                  className="h-8 rounded-md border px-2"
+                >
+                  <option value="">Any session</option>
+                  <option value="true">Has session</option>
+                  <option value="false">No session</option>
+                </select>
+              </div>
+
               {/* Token List */}
               <div className="flex-1 overflow-y-auto min-h-0 border-t pt-4 mt-4">
                 {tokens.length === 0 ? (
-                  <p className="text-gray-500 text-center py-8">No active tokens</p>
+                  <p className="text-gray-500 text-center py-8">No matching tokens</p>
                 ) : (
                   <div className="space-y-2 pr-2">
                     {tokens.map((token) => (
@@ -191,6 +317,7 @@ export function AdminDashboardView() {
                             ) : (
                               "Unused"
                             )}
+                            {token.cohort && <> • Cohort: {token.cohort}</>}
                           </div>
                         </div>
                         <Button
@@ -202,6 +329,17 @@ export function AdminDashboardView() {
                         </Button>
                       </div>
                     ))}
+                    {nextCursor && (
+                      <Button
+                        onClick={loadMoreTokens}
+                        variant="outline"
+                        size="sm"
+                        className="w-full"
+                        disabled={isLoadingMore}
+                      >
+                        {isLoadingMore ? "Loading..." : "Load more"}
+                      </Button>
+                    )}
                   </div>
                 )}
               </div>
@@ -227,14 +365,28 @@ export function AdminDashboardView() {
                 <br />• All bullet iterations with numbering (bullet_1_1, bullet_1_2, bullet_2_1, etc.)
                 <br />• Final bullet text, rationale, ratings, and feedback for each iteration
               </p>
-              <Button
-                onClick={() =>
-                  window.open(`${apiBase}/api/admin/sessions/export`, "_blank")
-                }
-                className=""
-              >
-                Download Research Data (CSV)
-              </Button>
+              <p className="text-sm text-gray-600 mb-4">
+                The iterations CSV is in long format instead: one row per participant, bullet and iteration.
+                Both files are refreshed from the database about once a minute.
+              </p>
+              <div className="flex gap-2">
+                <Button
+                  onClick={() =>
+                    window.open(`${apiBase}/api/admin/sessions/export/snapshot`, "_blank")
+                  }
+                  className=""
+                >
+                  Download Research Data (CSV)
+                </Button>
+                <Button
+                  onClick={() =>
+                    window.open(`${apiBase}/api/admin/sessions/export/snapshot?layout=long`, "_blank")
+                  }
+                  variant="outline"
+                >
+                  Download Iterations (CSV)
+                </Button>
+              </div>
             </div>
           </div>
 
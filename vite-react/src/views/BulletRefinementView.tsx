@@ -10,10 +10,35 @@ import { Textarea } from "@/components/ui/textarea";
 import { Label } from "@/components/ui/label";
 import { Skeleton } from "@/components/ui/skeleton";
 
+interface GenerationSettings {
+  model: string;
+  temperature: number | null;
+  maxTokens: number | null;
+  timeout: number | null;
+}
+
 interface Bullet {
   index: number;
   text: string;
   rationale: string;
+  promptVersion?: number;
+  promptType?: string;
+  generationSettings?: GenerationSettings;
+}
+
+
+interface SessionState {
+  stage: string;
+  bullets: {
+    index: number;
+    text: string;
+    rationale: string;
+    iteration_number: number;
+    iteration_count: number;
+    user_rating: number | null;
+    user_feedback: string;
+    final_iteration: number | null;
+  }[];
 }
 
 
@@ -21,8 +46,6 @@ export function BulletRefinementView() {
   const navigate = useNavigate();
   const { 
     letterLabData, 
-    resumeText,
-    jobDescription,
     generationError 
   } = useAppContext();
 
@@ -36,10 +59,10 @@ export function BulletRefinementView() {
   const [isLoadingBullets, setIsLoadingBullets] = useState(false);
   const [bulletLoadError, setBulletLoadError] = useState("");
 
-  // Generate bullets on component mount if not already generated
+  // Restore saved bullets on mount, generating them only for a new session
   useEffect(() => {
     if (!bullets.length && letterLabData?.document_id && !isLoadingBullets) {
-      generateBullets();
+      restoreOrGenerateBullets();
     }
   }, [letterLabData?.document_id, bullets.length]);
 
@@ -50,9 +73,39 @@ export function BulletRefinementView() {
     }
   }, [letterLabData, navigate]);
 
+  const restoreOrGenerateBullets = async () => {
+    setIsLoadingBullets(true);
+    try {
+      const apiBase = import.meta.env.VITE_API_BASE_URL;
+      const response = await fetch(
+        `${apiBase}/lab/session/${letterLabData?.document_id}`,
+        { credentials: "include" }
+      );
+      if (response.ok) {
+        const state: SessionState = await response.json();
+        if (state.bullets.length) {
+          // Resume at the first bullet not yet marked final, on its latest saved iteration
+          const resumeIndex = state.bullets.findIndex(
+            (bullet) => bullet.final_iteration === null
+          );
+          const bulletIndex = resumeIndex === -1 ? state.bullets.length - 1 : resumeIndex;
+          setBullets(state.bullets.map(({ index, text, rationale }) => ({ index, text, rationale })));
+          setCurrentBulletIndex(bulletIndex);
+          setCurrentIteration(state.bullets[bulletIndex].iteration_number);
+          setIsLoadingBullets(false);
+          return;
+        }
+      }
+    } catch (error) {
+      console.error("Error restoring session state:", error);
+    }
+    setIsLoadingBullets(false);
+    await generateBullets();
+  };
+
   const generateBullets = async () => {
-    if (!letterLabData?.document_id || !resumeText || !jobDescription) {
-      setBulletLoadError("Missing session or input data. Please start over.");
+    if (!letterLabData?.document_id) {
+      setBulletLoadError("Missing session data. Please start over.");
       return;
     }
 
@@ -69,8 +122,6 @@ export function BulletRefinementView() {
         credentials: "include",
         body: JSON.stringify({
           session_id: letterLabData.document_id,
-          resume: resumeText,
-          job_description: jobDescription,
         }),
       });
 
@@ -116,6 +167,9 @@ export function BulletRefinementView() {
             iteration_number: currentIteration,
             bullet_text: bullets[currentBulletIndex].text,
             rationale: bullets[currentBulletIndex].rationale,
+            prompt_version: bullets[currentBulletIndex].promptVersion,
+            prompt_type: bullets[currentBulletIndex].promptType,
+            generation_settings: bullets[currentBulletIndex].generationSettings,
             user_rating: currentRating,
             user_feedback: currentFeedback,
             is_final: false,
@@ -143,13 +197,8 @@ export function BulletRefinementView() {
           body: JSON.stringify({
             session_id: letterLabData?.document_id,
             bullet_index: currentBulletIndex,
-            current_bullet: {
-              text: bullets[currentBulletIndex].text,
-              rationale: bullets[currentBulletIndex].rationale,
-            },
             user_rating: currentRating,
             user_feedback: currentFeedback,
-            iteration_history: [], // TODO: Include actual iteration history if needed
           }),
         });
 
@@ -158,6 +207,9 @@ export function BulletRefinementView() {
         }
 
         const regeneratedData = await regenerateResponse.json();
+        // The server stores the new bullet as the next iteration; a retry
+        // after a lost response gets the same one back
+        setCurrentIteration(regeneratedData.iteration_number ?? currentIteration + 1);
         
         // Update the bullet with the regenerated content
         const updatedBullets = [...bullets];
@@ -165,6 +217,9 @@ export function BulletRefinementView() {
           ...updatedBullets[currentBulletIndex],
           text: regeneratedData.bullet.text,
           rationale: regeneratedData.bullet.rationale,
+          promptVersion: regeneratedData.bullet.promptVersion,
+          promptType: regeneratedData.bullet.promptType,
+          generationSettings: regeneratedData.bullet.generationSettings,
         };
 
         setBullets(updatedBullets);
@@ -174,7 +229,6 @@ export function BulletRefinementView() {
         setIsRegenerating(false);
         return;
       }
-      setCurrentIteration(prev => prev + 1);
       setCurrentRating(null);
       setCurrentFeedback("");
     } catch (error) {
@@ -204,6 +258,9 @@ export function BulletRefinementView() {
             iteration_number: currentIteration,
             bullet_text: bullets[currentBulletIndex].text,
             rationale: bullets[currentBulletIndex].rationale,
+            prompt_version: bullets[currentBulletIndex].promptVersion,
+            prompt_type: bullets[currentBulletIndex].promptType,
+            generation_settings: bullets[currentBulletIndex].generationSettings,
             user_rating: currentRating,
             user_feedback: currentFeedback,
             is_final: true,